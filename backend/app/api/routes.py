@@ -1,52 +1,93 @@
+import json
+import asyncio
+from typing import Optional
 from fastapi import APIRouter, HTTPException, BackgroundTasks
+from fastapi.responses import StreamingResponse
 from langchain_core.messages import HumanMessage
 from langgraph.graph import END
 
-from app.schemas import IntegrationCreate, IntegrationResponse, ChatRequest, ChatResponse
-from app.services.security import save_credential
+from app.schemas import (
+    IntegrationCreate, IntegrationResponse, IngestionJob, ChatRequest, ChatResponse,
+    ChatHistoryMessage, ChatHistoryPage, BatchRequest, BatchJob
+)
+from app.services.security import save_credential, get_auth_cache_stats
 from app.services.mcp_bridge import OpenAPIMCPBridge
 from app.services.tool_registry import ToolRegistry
 from app.services.security import save_credential
-from app.core.agent import agent_app, registry as global_registry
-from sqlmodel import Session
-from app.core.database import engine, ChatMessage
+from app.services.chat_store import save_chat_turn, get_chat_history, CHAT_HISTORY_MAX_PAGE
+from app.services.ingestion import get_integration, get_job, start_ingestion
+from app.services.response_cache import response_cache
+from app.services.resilience import upstream_guards
+from app.services.batch import start_batch, get_batch, load_batch
+from app.core.history import collect_tool_calls
+from app.core.agent import agent_app, registry as global_registry, plan_cache
+from app.utils.metrics import span
 
 router = APIRouter()
 
 
-@router.post("/integrations", response_model=IntegrationResponse)
+@router.post("/integrations", response_model=IntegrationResponse, status_code=202)
 async def add_integration(data: IntegrationCreate):
     '''
-        creates tools when given name, spec url and the credentials
-        also updates the global registry (adds new tools there)
+        saves the credentials and starts a background job that creates tools
+        from the spec and adds them to the global registry.
+        poll GET /integrations/jobs/{job_id} for progress
     '''
 
     try:
         connection_id = data.name.lower().replace(" ", "-")
 
-        save_credential(
+        await asyncio.to_thread(
+            save_credential,
             connection_id=connection_id,
             api_key=data.api_key,
             name=data.name,
-            spec_url=data.spec_url
+            spec_url=data.spec_url,
+            response_cache_ttl=data.response_cache_ttl
         )
+        integration = await asyncio.to_thread(get_integration, connection_id)
 
-        bridge = OpenAPIMCPBridge(data.name, data.spec_url, connection_id)
-
-        bridge.register_tools()
-        tools = bridge.get_tools()
-
-        global_registry.register_tools(tools)
+        job = await start_ingestion(integration, global_registry)
 
         return IntegrationResponse(
-            message=f"Successfully connected {data.name}",
-            tools_count=len(tools)
+            message=f"Started connecting {data.name}",
+            tools_count=0,
+            job_id=job.id
         )
 
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
 
 
+@router.get("/integrations/jobs/{job_id}", response_model=IngestionJob)
+async def get_integration_job(job_id: str):
+    """
+    Progress of an ingestion job: phase, operations parsed, tools embedded.
+    Any worker can answer, jobs run elsewhere report their last saved state.
+    """
+    job = await get_job(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
+
+
+@router.get("/integrations/upstream")
+async def upstream_state():
+    """
+    Per-integration upstream health: circuit state, adaptive concurrency
+    limit, in-flight calls, Retry-After pauses and call counters.
+    """
+    return upstream_guards.state()
+
+
+@router.get("/integrations/{connection_id}/upstream")
+async def integration_upstream_state(connection_id: str):
+    state = upstream_guards.state(connection_id)
+    if not state:
+        raise HTTPException(status_code=404, detail="No upstream calls recorded for this integration")
+    return state[connection_id]
+
+
 @router.post("/chat", response_model=ChatResponse)
 async def chat_endpoint(request: ChatRequest):
     """
@@ -63,27 +104,203 @@ async def chat_endpoint(request: ChatRequest):
         final_response = ""
         tool_logs = []
 
-        result = agent_app.invoke(input_state, config=config)
+        with span("chat.request", thread_id=request.thread_id):
+            result = await agent_app.ainvoke(input_state, config=config)
 
-        last_msg = result["messages"][-1]
-        final_response = last_msg.content
+            last_msg = result["messages"][-1]
+            final_response = last_msg.content
 
-        # extracting tool calls debugging
-        for msg in result["messages"]:
-            if hasattr(msg, "tool_calls") and msg.tool_calls:
-                tool_logs.extend(msg.tool_calls)
+            # extracting tool calls debugging
+            tool_logs = collect_tool_calls(result["messages"])
 
-        with Session(engine) as session:
-            session.add(ChatMessage(thread_id=request.thread_id,
-                        role="user", content=request.message))
-            session.add(ChatMessage(thread_id=request.thread_id,
-                        role="assistant", content=str(final_response)))
-            session.commit()
+            await save_chat_turn(request.thread_id, request.message, str(final_response), tool_logs)
 
         return ChatResponse(
             response=str(final_response),
-            tool_calls=tool_logs
+            tool_calls=tool_logs,
+            thread_id=request.thread_id
         )
 
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.get("/chat/{thread_id}/history", response_model=ChatHistoryPage)
+async def chat_history(thread_id: str, before: Optional[int] = None, limit: int = 50):
+    """
+    Persisted messages of a thread, newest first. Pass 'next_before' of a
+    page as 'before' to get the next one. Recent turns show up once the
+    write-behind queue has flushed them.
+    """
+    limit = max(1, min(limit, CHAT_HISTORY_MAX_PAGE))
+    rows = await asyncio.to_thread(get_chat_history, thread_id, before, limit)
+    messages = [
+        ChatHistoryMessage(
+            id=row.id,
+            role=row.role,
+            content=row.content,
+            tool_calls=json.loads(row.tool_calls) if row.tool_calls else []
+        )
+        for row in rows
+    ]
+    next_before = rows[-1].id if len(rows) == limit else None
+    return ChatHistoryPage(messages=messages, next_before=next_before)
+
+
+@router.post("/chat/batch")
+async def chat_batch(request: BatchRequest):
+    """
+    Runs many chat turns on a bounded worker pool; turns of the same thread
+    run in input order. New threads opening with the same prompt run it once (see 'dedupe').
+    With stream=true the answer is NDJSON: the job first, one result per
+    line as items finish, the final job last; otherwise the job is returned
+    right away and results are read from /chat/batch/{job_id}/results.
+    """
+    try:
+        run = await start_batch(request.items, request.dedupe)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    if not request.stream:
+        return run.job
+    return _ndjson_response(run)
+
+
+@router.get("/chat/batch/{job_id}", response_model=BatchJob)
+async def chat_batch_status(job_id: str):
+    run = get_batch(job_id)
+    if run:
+        return run.job
+    # run by another worker: its last saved progress
+    job, _ = await load_batch(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Batch not found")
+    return job
+
+
+@router.get("/chat/batch/{job_id}/results")
+async def chat_batch_results(job_id: str, start: int = 0):
+    """
+    NDJSON stream of a batch's results in completion order, from position
+    'start'; stays open until the batch is done. Only the worker running a
+    batch streams it live, the others serve its results once it finished.
+    """
+    run = get_batch(job_id)
+    if run:
+        return _ndjson_response(run, start, include_job=False)
+
+    job, results = await load_batch(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Batch not found")
+    if results is None:
+        raise HTTPException(
+            status_code=409, detail="Batch is still running on another worker, poll its status until it finished")
+
+    async def lines():
+        for result in results[max(0, start):]:
+            yield result.model_dump_json() + "\n"
+        yield json.dumps({"job": job.model_dump()}) + "\n"
+
+    return StreamingResponse(lines(), media_type="application/x-ndjson")
+
+
+def _ndjson_response(run, start: int = 0, include_job: bool = True) -> StreamingResponse:
+    async def lines():
+        if include_job:
+            yield json.dumps({"job": run.job.model_dump()}) + "\n"
+        async for result in run.stream(max(0, start)):
+            yield json.dumps(result.model_dump(), default=str) + "\n"
+        yield json.dumps({"job": run.job.model_dump()}) + "\n"
+
+    return StreamingResponse(
+        lines(),
+        media_type="application/x-ndjson",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
+@router.get("/cache/stats")
+async def cache_stats():
+    """
+    Hit/miss counters of the in-process caches on the hot path.
+    """
+    return {
+        "auth_headers": get_auth_cache_stats(),
+        "query_embeddings": global_registry.embeddings.stats(),
+        "responses": response_cache.stats(),
+        "plans": plan_cache.stats(),
+    }
+
+
+@router.post("/chat/stream")
+async def chat_stream_endpoint(request: ChatRequest):
+    """
+    Talk to the Agent over Server-Sent Events.
+    Streams LLM tokens and tool events as they happen, then a final 'done'
+    frame. The exchange is persisted once the stream completes.
+    """
+    input_state = {
+        "messages": [HumanMessage(content=request.message)],
+    }
+    config = {"configurable": {"thread_id": request.thread_id}}
+
+    async def event_stream():
+        final_state = None
+
+        try:
+            with span("chat.stream", thread_id=request.thread_id):
+                async for event in agent_app.astream_events(input_state, config=config, version="v2"):
+                    kind = event["event"]
+
+                    # only the reasoner talks to the user (not the history summarizer)
+                    if kind == "on_chat_model_stream" and event.get("metadata", {}).get("langgraph_node") == "reasoner":
+                        text = _chunk_text(event["data"]["chunk"])
+                        if text:
+                            yield _sse("token", {"content": text})
+
+                    elif kind == "on_custom_event" and event["name"] in ("tool_started", "tool_finished"):
+                        yield _sse(event["name"], event["data"])
+
+                    # the root graph run has no parents, its output is the final state
+                    elif kind == "on_chain_end" and not event.get("parent_ids"):
+                        final_state = event["data"].get("output")
+
+                if not final_state or not final_state.get("messages"):
+                    raise RuntimeError("Agent finished without producing a response.")
+
+                final_response = str(final_state["messages"][-1].content)
+                tool_logs = collect_tool_calls(final_state["messages"])
+
+                await save_chat_turn(request.thread_id, request.message, final_response, tool_logs)
+
+                yield _sse("done", ChatResponse(
+                    response=final_response,
+                    tool_calls=tool_logs,
+                    thread_id=request.thread_id
+                ).model_dump())
+
+        except Exception as e:
+            yield _sse("error", {"detail": str(e)})
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
+def _chunk_text(chunk) -> str:
+    """Extracts plain text from a streamed chat model chunk."""
+    content = chunk.content
+    if isinstance(content, str):
+        return content
+    # Gemini can stream a list of content parts
+    return "".join(
+        part.get("text", "") if isinstance(part, dict) else str(part)
+        for part in content
+    )
+
+
+def _sse(event: str, data: dict) -> str:
+    """Formats one Server-Sent Events frame."""
+    return f"event: {event}\ndata: {json.dumps(data, default=str)}\n\n"
@@ -1,16 +1,32 @@
 import os
-from typing import Annotated, TypedDict, List
+import time
+import asyncio
+from collections import OrderedDict
+from contextlib import nullcontext
+from typing import Annotated, TypedDict, List, Dict, Any
 from dotenv import load_dotenv
 
 from langchain_google_genai import ChatGoogleGenerativeAI
 from langgraph.graph import StateGraph, START, END
 from langgraph.graph.message import add_messages
-from langchain_core.messages import SystemMessage, HumanMessage, BaseMessage, ToolMessage
+from langchain_core.messages import SystemMessage, HumanMessage, BaseMessage, ToolMessage, AIMessage
 from langchain_core.tools import StructuredTool
+from langchain_core.runnables import RunnableConfig
+from langchain_core.callbacks.manager import adispatch_custom_event
 
 from app.utils.logger import get_logger
+from app.utils.metrics import NODE_DURATION, timed, record_token_usage
+from app.core.database import engine
+from app.core.checkpointer import SQLModelCheckpointSaver
+from app.core.history import (
+    HISTORY_KEEP_TURNS, HISTORY_SUMMARY_BATCH_TURNS, HISTORY_SUMMARY_MAX_CHARS,
+    split_turns, truncate_tool_messages, build_summary_request, removals
+)
 from app.services.tool_registry import ToolRegistry
 from app.services.mcp_bridge import OpenAPIMCPBridge
+from app.services.result_shaper import ToolError, format_tool_output
+from app.services.plan_cache import PlanCache, PLAN_CACHE_ENABLED, replayable
+from app.services.ingestion import maybe_sync_registry
 
 load_dotenv()
 logger = get_logger("Agent_Brain")
@@ -18,93 +34,323 @@ logger = get_logger("Agent_Brain")
 # global tools
 registry = ToolRegistry()
 
+# request template -> tool calls, lets recurring requests skip the LLM
+plan_cache = PlanCache(registry.embeddings)
+# strong references to fire-and-forget tasks (plan learning)
+_background_tasks = set()
+
+# caps for parallel tool calls coming from a single AIMessage
+TOOL_CONCURRENCY_PER_TURN = int(os.getenv("TOOL_CONCURRENCY_PER_TURN", "8"))
+TOOL_CONCURRENCY_PER_INTEGRATION = int(
+    os.getenv("TOOL_CONCURRENCY_PER_INTEGRATION", "4"))
+_integration_limits: Dict[str, asyncio.Semaphore] = {}
+
+LLM_MODEL = os.getenv("LLM_MODEL", "gemini-2.5-flash")
+BOUND_MODEL_CACHE_SIZE = int(os.getenv("BOUND_MODEL_CACHE_SIZE", "64"))
+
+# shared chat model and its tool-bound variants, see get_llm/get_bound_llm
+_llm = None
+_bound_models: "OrderedDict[frozenset, Any]" = OrderedDict()
+
+SYSTEM_PROMPT = SystemMessage(content="""
+    You are an autonomous AI Integration Agent.
+    Your goal is to satisfy the user's request using the available tools.
+    
+    RULES:
+    1. If a tool seems relevant, USE IT immediately. Do not ask for permission for read-only operations (GET).
+    2. If the user asks for a specific field (like 'status') and you have a tool that returns the full object (like 'getPetById'), CALL THE TOOL first, then extract the field from the result.
+    3. Only ask the user for clarification if you are missing required arguments (like an ID).
+    """)
+
 
 class AgentState(TypedDict):
     messages: Annotated[list[BaseMessage], add_messages]
-    available_tools: List[StructuredTool]
+    # tool names only, the tools themselves live in the registry
+    # (the state is checkpointed, tool objects are not serializable)
+    available_tools: List[str]
+    # rolling summary of the turns dropped from 'messages'
+    summary: str
+    # True when the current turn's tool calls came from the plan cache
+    planned: bool
+
+
+async def history_node(state: AgentState):
+    """
+    Keeps the thread's prompt bounded: the last HISTORY_KEEP_TURNS turns stay
+    verbatim, older ones are folded into the running summary in batches, and
+    tool payloads of previous turns are truncated.
+    """
+    with timed(NODE_DURATION, "agent.history", node="history"):
+        return await _compact_history(state)
+
+
+async def _compact_history(state: AgentState) -> Dict[str, Any]:
+    turns = split_turns(state["messages"])
+    previous = [m for turn in turns[:-1] for m in turn]
+    if not previous:
+        return {}
+
+    updates: List[BaseMessage] = []
+    result: Dict[str, Any] = {}
 
+    if len(turns) - 1 > HISTORY_KEEP_TURNS + HISTORY_SUMMARY_BATCH_TURNS:
+        # everything except the current turn and the last N completed ones
+        old = [m for turn in turns[:-(HISTORY_KEEP_TURNS + 1)] for m in turn]
+        logger.info(f"Summarizing {len(old)} older messages")
 
-def tool_retriever_node(state: AgentState):
+        summary = await get_llm().ainvoke(
+            build_summary_request(state.get("summary", ""), old))
+        record_token_usage("history", summary)
+        result["summary"] = str(summary.content)[:HISTORY_SUMMARY_MAX_CHARS]
+
+        updates.extend(removals(old))
+        kept = previous[len(old):]
+    else:
+        kept = previous
+
+    updates.extend(truncate_tool_messages(kept))
+    if updates:
+        result["messages"] = updates
+    return result
+
+
+async def planner_node(state: AgentState):
+    """
+    Looks the request up in the plan cache. On a hit the cached tool calls
+    go straight to the executor, skipping retrieval and the LLM.
+    """
+    # first node that reads the registry: pick up integrations added by other workers
+    await maybe_sync_registry(registry)
+
+    if not PLAN_CACHE_ENABLED or not _is_first_turn(state):
+        return {"planned": False}
+
+    with timed(NODE_DURATION, "agent.planner", node="planner"):
+        decision = await plan_cache.lookup(str(state["messages"][-1].content))
+
+    if decision is None:
+        return {"planned": False}
+
+    names = [call["name"] for call in decision.tool_calls]
+    tools = registry.get_tools(names)
+    if len(tools) != len(names) or not all(replayable(t) for t in tools):
+        # a planned tool is gone or changed (integration removed or re-ingested)
+        plan_cache.forget(decision.additional_kwargs["plan_template"])
+        return {"planned": False}
+
+    return {
+        "messages": [decision],
+        "available_tools": names + registry.builtin_tool_names(),
+        "planned": True
+    }
+
+
+def _is_first_turn(state: AgentState) -> bool:
+    """No earlier messages and no summary: the request stands on its own."""
+    return not state.get("summary") and len(split_turns(state["messages"])) == 1
+
+
+async def tool_retriever_node(state: AgentState):
     """
     Analyzes the last user message and fetches relevant tools from the Registry.
     """
     last_message = state["messages"][-1]
     query = last_message.content
 
-    logger.info(f"Retrieving tools for query: '{query}'")
-    tools = registry.search_tools(query, k=5)
+    logger.info("Retrieving tools for query: '%s'", query)
+    with timed(NODE_DURATION, "agent.retriever", node="retriever"):
+        tools = await registry.asearch_tools(query, k=5)
 
     # Store these tools in the state so the next node can use them
-    return {"available_tools": tools}
+    # (plus the builtins, e.g. paging through truncated results)
+    return {"available_tools": [t.name for t in tools] + registry.builtin_tool_names()}
 
 
-def reasoner_node(state: AgentState):
+async def reasoner_node(state: AgentState):
     """
     Binds the retrieved tools to the LLM and asks for a decision.
     """
-    system_prompt = SystemMessage(content="""
-    You are an autonomous AI Integration Agent.
-    Your goal is to satisfy the user's request using the available tools.
-    
-    RULES:
-    1. If a tool seems relevant, USE IT immediately. Do not ask for permission for read-only operations (GET).
-    2. If the user asks for a specific field (like 'status') and you have a tool that returns the full object (like 'getPetById'), CALL THE TOOL first, then extract the field from the result.
-    3. Only ask the user for clarification if you are missing required arguments (like an ID).
-    """)
-
-    tools = state["available_tools"]
+    tools = registry.get_tools(state["available_tools"])
     messages = state["messages"]
-    full_history = [system_prompt] + messages
 
-    llm = ChatGoogleGenerativeAI(
-        model="gemini-2.5-flash",
-        temperature=0,
-        api_key=os.getenv("GOOGLE_API_KEY")
-    )
+    system_prompt = SYSTEM_PROMPT
+    if state.get("summary"):
+        system_prompt = SystemMessage(
+            content=f"{SYSTEM_PROMPT.content}\n    Summary of the earlier conversation:\n{state['summary']}")
 
-    if tools:
-        llm_with_tools = llm.bind_tools(tools)
-        response = llm_with_tools.invoke(full_history)
-    else:
-        response = llm.invoke(full_history)
+    full_history = [system_prompt] + messages
+
+    with timed(NODE_DURATION, "agent.reasoner", node="reasoner"):
+        llm = get_bound_llm(tools)
+        start = time.perf_counter()
+        response = await llm.ainvoke(full_history)
+        plan_cache.observe_llm_latency(time.perf_counter() - start)
+    record_token_usage("reasoner", response)
+
+    if PLAN_CACHE_ENABLED and not response.tool_calls and not state.get("planned") \
+            and _is_first_turn(state):
+        # learn in the background, the answer doesn't wait for the embedding
+        turn = split_turns(messages)[-1] + [response]
+        safe_tools = {t.name for t in tools if replayable(t)}
+        task = asyncio.create_task(plan_cache.learn(turn, safe_tools))
+        _background_tasks.add(task)
+        task.add_done_callback(_background_tasks.discard)
 
     return {"messages": [response]}
 
 
-def tool_executor_node(state: AgentState):
+def get_llm():
+    """Returns the process-wide chat model, created on first use."""
+    global _llm
+    if _llm is None:
+        _llm = ChatGoogleGenerativeAI(
+            model=LLM_MODEL,
+            temperature=0,
+            api_key=os.getenv("GOOGLE_API_KEY")
+        )
+    return _llm
+
+
+def set_llm(llm):
+    """Replaces the process-wide chat model (used by benchmarks and offline runs)."""
+    global _llm
+    _llm = llm
+    _bound_models.clear()
+
+
+def get_bound_llm(tools: List[StructuredTool]):
+    """
+    Returns the shared LLM with the given tools bound.
+    Bound models are cached by tool name + content hash (LRU), so the tool
+    schemas are only converted once per distinct tool set.
+    """
+    llm = get_llm()
+    if not tools:
+        return llm
+
+    key = frozenset(
+        (t.name, (t.metadata or {}).get("content_hash") or id(t)) for t in tools)
+
+    bound = _bound_models.get(key)
+    if bound is not None:
+        _bound_models.move_to_end(key)
+        return bound
+
+    bound = llm.bind_tools(tools)
+    _bound_models[key] = bound
+    if len(_bound_models) > BOUND_MODEL_CACHE_SIZE:
+        _bound_models.popitem(last=False)
+    return bound
+
+
+async def tool_executor_node(state: AgentState, config: RunnableConfig):
     """
     Executes the tool calls generated by the LLM.
+    Independent calls run concurrently (bounded per turn and per integration);
+    results keep the order of the tool calls and one failure never cancels the others.
+    Emits 'tool_started'/'tool_finished' custom events for streaming clients.
     """
     last_message = state["messages"][-1]
-    tools = state["available_tools"]
+    tools = registry.get_tools(state["available_tools"])
     tool_map = {t.name: t for t in tools}
 
-    outputs = []
+    calls = getattr(last_message, "tool_calls", None) or []
+    if not calls:
+        return {"messages": []}
 
-    if hasattr(last_message, "tool_calls"):
-        for call in last_message.tool_calls:
-            tool_name = call["name"]
-            args = call["args"]
+    turn_limit = asyncio.Semaphore(TOOL_CONCURRENCY_PER_TURN)
 
-            logger.info(f"Executing Tool: {tool_name} with args: {args}")
+    # gather returns results in call order, so ToolMessage ordering is deterministic
+    with timed(NODE_DURATION, "agent.executor", node="executor"):
+        outputs = await asyncio.gather(*(
+            _execute_tool_call(call, tool_map, turn_limit, config) for call in calls
+        ))
 
-            if tool_name in tool_map:
-                try:
-                    result = tool_map[tool_name].invoke(args)
-                    output_content = str(result)
-                except Exception as e:
-                    output_content = f"Error: {str(e)}"
-            else:
-                output_content = "Error: Tool not found in available tools."
+    return {"messages": list(outputs)}
 
-            # this ToolMessage output is feeded back to llm
-            outputs.append(ToolMessage(
-                content=output_content,
-                tool_call_id=call["id"],
-                name=tool_name
-            ))
 
-    return {"messages": outputs}
+async def _execute_tool_call(call: dict, tool_map: Dict[str, StructuredTool],
+                             turn_limit: asyncio.Semaphore, config: RunnableConfig) -> ToolMessage:
+    """Runs a single tool call and always returns a ToolMessage, even on failure."""
+    tool_name = call["name"]
+    args = call["args"]
+    tool = tool_map.get(tool_name)
+
+    status = "success"
+    if tool is None:
+        status = "error"
+        output_content = "Error: Tool not found in available tools."
+    else:
+        connection_id = (tool.metadata or {}).get("connection_id", "default")
+        integration_limit = _integration_semaphore(connection_id)
+        # callers like batch jobs can add their own, stricter per-integration cap
+        extra_limit = (config.get("configurable") or {}).get("integration_limit")
+        caller_limit = extra_limit(connection_id) if extra_limit else nullcontext()
+
+        async with turn_limit, integration_limit, caller_limit:
+            logger.info("Executing Tool: %s with args: %s", tool_name, args)
+            await adispatch_custom_event(
+                "tool_started",
+                {"id": call["id"], "name": tool_name, "args": args},
+                config=config
+            )
+
+            try:
+                result = await tool.ainvoke(args)
+                output_content = format_tool_output(result)
+                if isinstance(result, ToolError):
+                    status = "error"
+            except Exception as e:
+                status = "error"
+                output_content = f"Error: {str(e)}"
+
+    await adispatch_custom_event(
+        "tool_finished",
+        {"id": call["id"], "name": tool_name, "status": status},
+        config=config
+    )
+
+    # this ToolMessage output is feeded back to llm
+    return ToolMessage(
+        content=output_content,
+        tool_call_id=call["id"],
+        name=tool_name,
+        status=status
+    )
+
+
+async def formatter_node(state: AgentState):
+    """
+    Final step of a plan cache hit: renders the tool results as the answer
+    without an LLM call. If a planned call failed, the plan is dropped and
+    the reasoner takes over.
+    """
+    results = []
+    for message in reversed(state["messages"]):
+        if not isinstance(message, ToolMessage):
+            decision = message
+            break
+        results.insert(0, message)
+
+    failed = any(m.status == "error" for m in results)
+    if failed:
+        plan_cache.forget(decision.additional_kwargs.get("plan_template", ""))
+        return {"planned": False}
+
+    if len(results) == 1:
+        content = f"Result of {results[0].name}:\n{results[0].content}"
+    else:
+        content = "\n\n".join(f"Result of {m.name}:\n{m.content}" for m in results)
+    return {"messages": [AIMessage(content=content)]}
+
+
+def _integration_semaphore(connection_id: str) -> asyncio.Semaphore:
+    """Process-wide cap on in-flight tool calls per integration."""
+    semaphore = _integration_limits.get(connection_id)
+    if semaphore is None:
+        semaphore = asyncio.Semaphore(TOOL_CONCURRENCY_PER_INTEGRATION)
+        _integration_limits[connection_id] = semaphore
+    return semaphore
 
 
 def should_continue(state: AgentState):
@@ -121,11 +367,22 @@ def should_continue(state: AgentState):
 # building the graph
 workflow = StateGraph(AgentState)
 
+workflow.add_node("history", history_node)
+workflow.add_node("planner", planner_node)
 workflow.add_node("retriever", tool_retriever_node)
 workflow.add_node("reasoner", reasoner_node)
 workflow.add_node("executor", tool_executor_node)
+workflow.add_node("formatter", formatter_node)
+
+workflow.add_edge(START, "history")
+workflow.add_edge("history", "planner")
 
-workflow.add_edge(START, "retriever")
+# plan cache hit -> execute the cached tool calls right away
+workflow.add_conditional_edges(
+    "planner",
+    lambda state: "executor" if state.get("planned") else "retriever",
+    {"executor": "executor", "retriever": "retriever"}
+)
 workflow.add_edge("retriever", "reasoner")
 
 # conditional to decide between replying or executing
@@ -138,6 +395,19 @@ workflow.add_conditional_edges(
     }
 )
 
-workflow.add_edge("executor", "reasoner")
+workflow.add_conditional_edges(
+    "executor",
+    lambda state: "formatter" if state.get("planned") else "reasoner",
+    {"formatter": "formatter", "reasoner": "reasoner"}
+)
+
+# the formatter answers, or hands a failed plan back to the reasoner
+workflow.add_conditional_edges(
+    "formatter",
+    lambda state: END if state.get("planned") else "reasoner",
+    {END: END, "reasoner": "reasoner"}
+)
 
-agent_app = workflow.compile()
+# threads are checkpointed in the app database so conversations resume
+checkpointer = SQLModelCheckpointSaver(engine)
+agent_app = workflow.compile(checkpointer=checkpointer)
@@ -0,0 +1,264 @@
+import asyncio
+import random
+from typing import Any, AsyncIterator, Dict, Iterator, Optional, Sequence, Tuple
+
+from langchain_core.runnables import RunnableConfig
+from langgraph.checkpoint.base import (
+    WRITES_IDX_MAP,
+    BaseCheckpointSaver,
+    ChannelVersions,
+    Checkpoint,
+    CheckpointMetadata,
+    CheckpointTuple,
+    get_checkpoint_id,
+)
+from sqlalchemy.engine import Engine
+from sqlmodel import Session, col, delete, select
+
+from app.core.database import GraphCheckpoint, GraphCheckpointWrite
+
+
+class SQLModelCheckpointSaver(BaseCheckpointSaver):
+    """
+    LangGraph checkpointer stored in the application database (Postgres or
+    SQLite) through the existing SQLModel engine, so threads resume after a
+    restart and across workers.
+    Checkpoints and writes are serialized with the saver's serde.
+    """
+
+    def __init__(self, engine: Engine):
+        super().__init__()
+        self.engine = engine
+
+    # ---- sync API ----
+
+    def get_tuple(self, config: RunnableConfig) -> Optional[CheckpointTuple]:
+        thread_id = config["configurable"]["thread_id"]
+        checkpoint_ns = config["configurable"].get("checkpoint_ns", "")
+        checkpoint_id = get_checkpoint_id(config)
+
+        with Session(self.engine) as session:
+            statement = select(GraphCheckpoint).where(
+                GraphCheckpoint.thread_id == thread_id,
+                GraphCheckpoint.checkpoint_ns == checkpoint_ns)
+            if checkpoint_id:
+                statement = statement.where(
+                    GraphCheckpoint.checkpoint_id == checkpoint_id)
+            else:
+                # checkpoint ids are time-ordered, so the max id is the latest
+                statement = statement.order_by(
+                    col(GraphCheckpoint.checkpoint_id).desc()).limit(1)
+
+            row = session.exec(statement).first()
+            if row is None:
+                return None
+
+            return self._to_tuple(session, row)
+
+    def list(
+        self,
+        config: Optional[RunnableConfig],
+        *,
+        filter: Optional[Dict[str, Any]] = None,
+        before: Optional[RunnableConfig] = None,
+        limit: Optional[int] = None,
+    ) -> Iterator[CheckpointTuple]:
+        with Session(self.engine) as session:
+            statement = select(GraphCheckpoint)
+            if config:
+                statement = statement.where(
+                    GraphCheckpoint.thread_id == config["configurable"]["thread_id"])
+                checkpoint_ns = config["configurable"].get("checkpoint_ns")
+                if checkpoint_ns is not None:
+                    statement = statement.where(
+                        GraphCheckpoint.checkpoint_ns == checkpoint_ns)
+                checkpoint_id = get_checkpoint_id(config)
+                if checkpoint_id:
+                    statement = statement.where(
+                        GraphCheckpoint.checkpoint_id == checkpoint_id)
+            if before and get_checkpoint_id(before):
+                statement = statement.where(
+                    GraphCheckpoint.checkpoint_id < get_checkpoint_id(before))
+            statement = statement.order_by(
+                col(GraphCheckpoint.checkpoint_id).desc())
+
+            returned = 0
+            for row in session.exec(statement):
+                if limit is not None and returned >= limit:
+                    break
+
+                checkpoint_tuple = self._to_tuple(session, row)
+                # metadata is serialized, so the filter is applied here
+                if filter and any(checkpoint_tuple.metadata.get(k) != v for k, v in filter.items()):
+                    continue
+
+                returned += 1
+                yield checkpoint_tuple
+
+    def put(
+        self,
+        config: RunnableConfig,
+        checkpoint: Checkpoint,
+        metadata: CheckpointMetadata,
+        new_versions: ChannelVersions,
+    ) -> RunnableConfig:
+        thread_id = config["configurable"]["thread_id"]
+        checkpoint_ns = config["configurable"].get("checkpoint_ns", "")
+
+        checkpoint_type, checkpoint_blob = self.serde.dumps_typed(checkpoint)
+        metadata_type, metadata_blob = self.serde.dumps_typed(
+            dict(metadata or {}))
+
+        with Session(self.engine) as session:
+            session.merge(GraphCheckpoint(
+                thread_id=thread_id,
+                checkpoint_ns=checkpoint_ns,
+                checkpoint_id=checkpoint["id"],
+                parent_checkpoint_id=config["configurable"].get(
+                    "checkpoint_id"),
+                checkpoint_type=checkpoint_type,
+                checkpoint=checkpoint_blob,
+                metadata_type=metadata_type,
+                metadata_blob=metadata_blob
+            ))
+            session.commit()
+
+        return {
+            "configurable": {
+                "thread_id": thread_id,
+                "checkpoint_ns": checkpoint_ns,
+                "checkpoint_id": checkpoint["id"],
+            }
+        }
+
+    def put_writes(
+        self,
+        config: RunnableConfig,
+        writes: Sequence[Tuple[str, Any]],
+        task_id: str,
+        task_path: str = "",
+    ) -> None:
+        thread_id = config["configurable"]["thread_id"]
+        checkpoint_ns = config["configurable"].get("checkpoint_ns", "")
+        checkpoint_id = config["configurable"]["checkpoint_id"]
+
+        with Session(self.engine) as session:
+            for i, (channel, value) in enumerate(writes):
+                idx = WRITES_IDX_MAP.get(channel, i)
+                key = (thread_id, checkpoint_ns, checkpoint_id, task_id, idx)
+
+                # regular writes are write-once, special channels (errors,
+                # interrupts) overwrite the previous value
+                if idx >= 0 and session.get(GraphCheckpointWrite, key) is not None:
+                    continue
+
+                value_type, value_blob = self.serde.dumps_typed(value)
+                session.merge(GraphCheckpointWrite(
+                    thread_id=thread_id,
+                    checkpoint_ns=checkpoint_ns,
+                    checkpoint_id=checkpoint_id,
+                    task_id=task_id,
+                    idx=idx,
+                    channel=channel,
+                    value_type=value_type,
+                    value=value_blob,
+                    task_path=task_path
+                ))
+            session.commit()
+
+    def delete_thread(self, thread_id: str) -> None:
+        with Session(self.engine) as session:
+            session.exec(delete(GraphCheckpointWrite).where(
+                GraphCheckpointWrite.thread_id == thread_id))
+            session.exec(delete(GraphCheckpoint).where(
+                GraphCheckpoint.thread_id == thread_id))
+            session.commit()
+
+    def get_next_version(self, current: Optional[str], channel: Any = None) -> str:
+        if current is None:
+            current_v = 0
+        elif isinstance(current, int):
+            current_v = current
+        else:
+            current_v = int(current.split(".")[0])
+        return f"{current_v + 1:032}.{random.random():016}"
+
+    # ---- async API (the DB driver is sync, so run in worker threads) ----
+
+    async def aget_tuple(self, config: RunnableConfig) -> Optional[CheckpointTuple]:
+        return await asyncio.to_thread(self.get_tuple, config)
+
+    async def alist(
+        self,
+        config: Optional[RunnableConfig],
+        *,
+        filter: Optional[Dict[str, Any]] = None,
+        before: Optional[RunnableConfig] = None,
+        limit: Optional[int] = None,
+    ) -> AsyncIterator[CheckpointTuple]:
+        items = await asyncio.to_thread(
+            lambda: list(self.list(config, filter=filter, before=before, limit=limit)))
+        for item in items:
+            yield item
+
+    async def aput(
+        self,
+        config: RunnableConfig,
+        checkpoint: Checkpoint,
+        metadata: CheckpointMetadata,
+        new_versions: ChannelVersions,
+    ) -> RunnableConfig:
+        return await asyncio.to_thread(self.put, config, checkpoint, metadata, new_versions)
+
+    async def aput_writes(
+        self,
+        config: RunnableConfig,
+        writes: Sequence[Tuple[str, Any]],
+        task_id: str,
+        task_path: str = "",
+    ) -> None:
+        await asyncio.to_thread(self.put_writes, config, writes, task_id, task_path)
+
+    async def adelete_thread(self, thread_id: str) -> None:
+        await asyncio.to_thread(self.delete_thread, thread_id)
+
+    # ---- helpers ----
+
+    def _to_tuple(self, session: Session, row: GraphCheckpoint) -> CheckpointTuple:
+        writes = session.exec(
+            select(GraphCheckpointWrite).where(
+                GraphCheckpointWrite.thread_id == row.thread_id,
+                GraphCheckpointWrite.checkpoint_ns == row.checkpoint_ns,
+                GraphCheckpointWrite.checkpoint_id == row.checkpoint_id
+            ).order_by(GraphCheckpointWrite.task_id, GraphCheckpointWrite.idx)
+        ).all()
+
+        parent_config = None
+        if row.parent_checkpoint_id:
+            parent_config = {
+                "configurable": {
+                    "thread_id": row.thread_id,
+                    "checkpoint_ns": row.checkpoint_ns,
+                    "checkpoint_id": row.parent_checkpoint_id,
+                }
+            }
+
+        return CheckpointTuple(
+            config={
+                "configurable": {
+                    "thread_id": row.thread_id,
+                    "checkpoint_ns": row.checkpoint_ns,
+                    "checkpoint_id": row.checkpoint_id,
+                }
+            },
+            checkpoint=self.serde.loads_typed(
+                (row.checkpoint_type, row.checkpoint)),
+            metadata=self.serde.loads_typed(
+                (row.metadata_type, row.metadata_blob)),
+            parent_config=parent_config,
+            pending_writes=[
+                (w.task_id, w.channel, self.serde.loads_typed(
+                    (w.value_type, w.value)))
+                for w in writes
+            ],
+        )
@@ -1,5 +1,6 @@
 from sqlmodel import SQLModel, create_engine, Session, Field
 from typing import Optional
+from sqlalchemy import Index, inspect, text
 import os
 from dotenv import load_dotenv
 
@@ -8,7 +9,36 @@ load_dotenv()
 DATABASE_URL = os.getenv("DATABASE_URL")
 if not DATABASE_URL:
     raise RuntimeError("DATABASE_URL is not set")
-engine = create_engine(DATABASE_URL, echo=True)
+
+# statement logging is synchronous and very chatty, only for debugging
+DB_ECHO = os.getenv("DB_ECHO", "false").lower() == "true"
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "10"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "20"))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "30"))
+# seconds after which pooled connections are replaced (-1 = never)
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "1800"))
+DB_POOL_PRE_PING = os.getenv("DB_POOL_PRE_PING", "true").lower() == "true"
+
+
+def _engine_options(url: str) -> dict:
+    options = {"echo": DB_ECHO, "pool_pre_ping": DB_POOL_PRE_PING}
+
+    if url.startswith("sqlite"):
+        # sessions are used from worker threads (asyncio.to_thread);
+        # SQLite picks its own pool class, so no sizing options here
+        options["connect_args"] = {"check_same_thread": False}
+        return options
+
+    options.update(
+        pool_size=DB_POOL_SIZE,
+        max_overflow=DB_MAX_OVERFLOW,
+        pool_timeout=DB_POOL_TIMEOUT,
+        pool_recycle=DB_POOL_RECYCLE,
+    )
+    return options
+
+
+engine = create_engine(DATABASE_URL, **_engine_options(DATABASE_URL))
 
 
 def get_session():
@@ -24,15 +54,109 @@ class Integration(SQLModel, table=True):
     auth_header_type: str = "Bearer"
     connection_id: str = Field(
         unique=True, index=True)
+    # seconds GET tool results may be cached, 0 disables the response cache
+    response_cache_ttl: int = 0
+    # bumped whenever the integration's operations change, workers compare it
+    # with what they have loaded (see app/services/ingestion.py sync_registry)
+    version: int = 0
+
+
+class IntegrationSpec(SQLModel, table=True):
+    """Compiled operations of an integration (spec_loader IR as JSON), shared by all workers."""
+    connection_id: str = Field(primary_key=True)
+    version: int = 0
+    compiled: str
+
+
+class JobRecord(SQLModel, table=True):
+    """State of a background job (ingestion, batch), so every worker can report it."""
+    id: str = Field(primary_key=True)
+    kind: str = Field(index=True)
+    # JSON of the job model (IngestionJob, BatchJob)
+    state: str
+    # JSON list of the results of a finished batch
+    results: Optional[str] = None
+    updated_at: float = Field(index=True)
+
+
+class StoredResult(SQLModel, table=True):
+    """Full payload of a shaped tool result (see app/services/result_shaper.py), shared by all workers."""
+    id: str = Field(primary_key=True)
+    # JSON of the payload, None when the body stays in a spool file at 'path'
+    payload: Optional[str] = None
+    path: Optional[str] = None
+    field: Optional[str] = None
+    total: int = 0
+    created_at: float = Field(index=True)
 
 
 class ChatMessage(SQLModel, table=True):
+    # history is read newest first per thread, keyset-paginated on id
+    __table_args__ = (Index("ix_chatmessage_thread_id_id", "thread_id", "id"),)
+
     id: Optional[int] = Field(default=None, primary_key=True)
     thread_id: str = Field(index=True)
     role: str
     content: str
+    # JSON list of the tool calls made while producing an assistant message
     tool_calls: Optional[str] = None
 
 
+class GraphCheckpoint(SQLModel, table=True):
+    """LangGraph checkpoint of a thread, see app/core/checkpointer.py"""
+    thread_id: str = Field(primary_key=True)
+    checkpoint_ns: str = Field(default="", primary_key=True)
+    checkpoint_id: str = Field(primary_key=True)
+    parent_checkpoint_id: Optional[str] = None
+    checkpoint_type: str
+    checkpoint: bytes
+    metadata_type: str
+    metadata_blob: bytes
+
+
+class GraphCheckpointWrite(SQLModel, table=True):
+    """Pending writes of a LangGraph task attached to a checkpoint."""
+    thread_id: str = Field(primary_key=True)
+    checkpoint_ns: str = Field(default="", primary_key=True)
+    checkpoint_id: str = Field(primary_key=True)
+    task_id: str = Field(primary_key=True)
+    idx: int = Field(primary_key=True)
+    channel: str
+    value_type: str
+    value: bytes
+    task_path: str = ""
+
+
+# columns added to existing tables; create_all only creates missing tables,
+# so databases created by an older release get them from _migrate
+ADDED_COLUMNS = {
+    "integration": {
+        "response_cache_ttl": "INTEGER NOT NULL DEFAULT 0",
+        "version": "INTEGER NOT NULL DEFAULT 0",
+    },
+}
+
+
+def _migrate():
+    """Adds missing columns and indexes to tables that already existed."""
+    inspector = inspect(engine)
+    # several workers may start at once; Postgres can skip existing columns itself
+    if_not_exists = "IF NOT EXISTS " if engine.dialect.name == "postgresql" else ""
+
+    with engine.begin() as conn:
+        for table, columns in ADDED_COLUMNS.items():
+            if not inspector.has_table(table):
+                continue
+            existing = {column["name"] for column in inspector.get_columns(table)}
+            for name, ddl in columns.items():
+                if name not in existing:
+                    conn.execute(text(
+                        f"ALTER TABLE {table} ADD COLUMN {if_not_exists}{name} {ddl}"))
+
+        for index in ChatMessage.__table__.indexes:
+            index.create(conn, checkfirst=True)
+
+
 def create_db_and_tables():
     SQLModel.metadata.create_all(engine)
+    _migrate()
@@ -0,0 +1,102 @@
+import os
+from typing import List
+
+from langchain_core.messages import (
+    BaseMessage, HumanMessage, SystemMessage, ToolMessage, RemoveMessage
+)
+
+# turns (a user message and everything the agent did for it) kept verbatim
+HISTORY_KEEP_TURNS = int(os.getenv("HISTORY_KEEP_TURNS", "6"))
+# older turns are folded into the summary in batches of this many turns,
+# so the summarizer runs once every few turns instead of on every turn
+HISTORY_SUMMARY_BATCH_TURNS = int(os.getenv("HISTORY_SUMMARY_BATCH_TURNS", "4"))
+HISTORY_SUMMARY_MAX_CHARS = int(os.getenv("HISTORY_SUMMARY_MAX_CHARS", "4000"))
+# ToolMessage payloads of previous turns are cut to this size
+HISTORY_TOOL_MESSAGE_CHARS = int(os.getenv("HISTORY_TOOL_MESSAGE_CHARS", "2000"))
+# additional_kwargs key of ToolMessages already cut by truncate_tool_messages
+TRUNCATED_FLAG = "history_truncated"
+
+SUMMARY_PROMPT = SystemMessage(content="""
+    You maintain the running summary of a conversation between a user and an API integration agent.
+    Merge the existing summary with the new messages into one concise summary.
+    Keep facts needed later: entity ids, names, statuses, decisions and open requests.
+    Drop raw API payloads. Answer with the summary only.
+    """)
+
+
+def split_turns(messages: List[BaseMessage]) -> List[List[BaseMessage]]:
+    """Groups messages into turns, each starting at a HumanMessage."""
+    turns: List[List[BaseMessage]] = []
+    for message in messages:
+        if isinstance(message, HumanMessage) or not turns:
+            turns.append([])
+        turns[-1].append(message)
+    return turns
+
+
+def collect_tool_calls(messages: List[BaseMessage]) -> List[dict]:
+    """
+    Gathers every tool call the LLM made while producing the answer.
+    The state holds the whole (checkpointed) thread, so only messages after
+    the latest user message belong to this request.
+    """
+    start = 0
+    for i, msg in enumerate(messages):
+        if isinstance(msg, HumanMessage):
+            start = i
+
+    tool_logs = []
+    for msg in messages[start:]:
+        if hasattr(msg, "tool_calls") and msg.tool_calls:
+            tool_logs.extend(msg.tool_calls)
+    return tool_logs
+
+
+def truncate_tool_messages(messages: List[BaseMessage], limit: int = HISTORY_TOOL_MESSAGE_CHARS) -> List[BaseMessage]:
+    """
+    Returns shortened copies of the ToolMessages over the limit. They keep
+    their id, so add_messages replaces the originals in the state.
+    Copies are flagged and skipped later, since the marker makes them
+    longer than the limit again.
+    """
+    replacements = []
+    for message in messages:
+        if isinstance(message, ToolMessage) and isinstance(message.content, str) \
+                and len(message.content) > limit \
+                and not message.additional_kwargs.get(TRUNCATED_FLAG):
+            dropped = len(message.content) - limit
+            replacements.append(message.model_copy(update={
+                "content": f"{message.content[:limit]}... [truncated {dropped} chars]",
+                "additional_kwargs": {**message.additional_kwargs, TRUNCATED_FLAG: True}
+            }))
+    return replacements
+
+
+def render_transcript(messages: List[BaseMessage]) -> str:
+    """Plain-text transcript used as summarizer input."""
+    lines = []
+    for message in messages:
+        content = message.content if isinstance(
+            message.content, str) else str(message.content)
+        if isinstance(message, ToolMessage):
+            content = content[:HISTORY_TOOL_MESSAGE_CHARS]
+        tool_calls = getattr(message, "tool_calls", None)
+        if tool_calls:
+            calls = ", ".join(f"{c['name']}({c['args']})" for c in tool_calls)
+            content = f"{content} [called {calls}]"
+        lines.append(f"{message.type}: {content}")
+    return "\n".join(lines)
+
+
+def build_summary_request(summary: str, messages: List[BaseMessage]) -> List[BaseMessage]:
+    return [
+        SUMMARY_PROMPT,
+        HumanMessage(content=(
+            f"Existing summary:\n{summary or '(none)'}\n\n"
+            f"New messages:\n{render_transcript(messages)}"
+        ))
+    ]
+
+
+def removals(messages: List[BaseMessage]) -> List[RemoveMessage]:
+    return [RemoveMessage(id=m.id) for m in messages if m.id]
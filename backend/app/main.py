@@ -1,19 +1,39 @@
-from fastapi import FastAPI
+from fastapi import FastAPI, Response
 from fastapi.middleware.cors import CORSMiddleware
 from app.api.routes import router
-from app.utils.logger import get_logger
+from app.utils.logger import get_logger, configure_logging, shutdown_logging
 from contextlib import asynccontextmanager
 from app.core.database import create_db_and_tables
+from app.services.http_client import http_pool
+from app.services.ingestion import rehydrate_registry
+from app.services.spec_loader import shutdown_pool
+from app.services.chat_store import chat_writer
+from app.core.agent import registry
+from app.services.mcp_gateway import MCPGateway
+from app.utils.metrics import render as render_metrics
 logger = get_logger("API_Main")
 
+# one MCP endpoint for every integration in the registry
+mcp_gateway = MCPGateway(registry)
+
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
+    configure_logging()
     logger.info("Starting up: Initializing Database...")
     create_db_and_tables()
     logger.info("Database ready.")
-    yield
+    chat_writer.start()
+    logger.info("Rehydrating tool registry from saved integrations...")
+    app.state.rehydration = await rehydrate_registry(registry)
+    async with mcp_gateway.run():
+        yield
     logger.info("Shutting server down")
+    await chat_writer.stop()
+    await http_pool.aclose()
+    registry.embeddings.close()
+    shutdown_pool()
+    shutdown_logging()
 
 app = FastAPI(
     title="AI Integration Agent API",
@@ -32,10 +52,25 @@ app.add_middleware(
 # Include Routes
 app.include_router(router, prefix="/api")
 
+# MCP clients: POST/GET /mcp (streamable HTTP), optional ?integrations=a,b&query=...&limit=N
+if mcp_gateway.enabled:
+    app.mount("/mcp", mcp_gateway.handle)
+
 
 @app.get("/")
 def health_check():
-    return {"status": "running", "service": "Integration Agent"}
+    return {
+        "status": "running",
+        "service": "Integration Agent",
+        "rehydration": getattr(app.state, "rehydration", None)
+    }
+
+
+@app.get("/metrics")
+def metrics():
+    """Prometheus metrics: node/tool/auth/persistence durations, tokens, upstream status codes."""
+    body, content_type = render_metrics()
+    return Response(content=body, media_type=content_type)
 
 
 if __name__ == "__main__":
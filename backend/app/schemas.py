@@ -1,4 +1,6 @@
-from pydantic import BaseModel
+import uuid
+
+from pydantic import BaseModel, Field
 from typing import List, Optional, Dict, Any
 
 
@@ -6,18 +8,90 @@ class IntegrationCreate(BaseModel):
     name: str
     spec_url: str
     api_key: Optional[str] = None
+    # opt-in cache for GET operations, in seconds (None keeps the saved value)
+    response_cache_ttl: Optional[int] = None
 
 
 class IntegrationResponse(BaseModel):
     message: str
     tools_count: int
+    job_id: Optional[str] = None
+
+
+class IngestionJob(BaseModel):
+    id: str
+    connection_id: str
+    name: str
+    # queued -> running -> completed | failed
+    status: str = "queued"
+    # queued, fetching, parsing, embedding, pruning, done
+    phase: str = "queued"
+    operations_total: int = 0
+    operations_parsed: int = 0
+    tools_embedded: int = 0
+    tools_unchanged: int = 0
+    tools_removed: int = 0
+    error: Optional[str] = None
+    created_at: float
+    finished_at: Optional[float] = None
 
 
 class ChatRequest(BaseModel):
     message: str
-    thread_id: str = "default"
+    # omitted: a new conversation; send the returned id back to continue it
+    thread_id: str = Field(default_factory=lambda: uuid.uuid4().hex, min_length=1)
 
 
 class ChatResponse(BaseModel):
     response: str
     tool_calls: List[Dict[str, Any]] = []
+    thread_id: Optional[str] = None
+
+
+class ChatHistoryMessage(BaseModel):
+    id: int
+    role: str
+    content: str
+    tool_calls: List[Dict[str, Any]] = []
+
+
+class ChatHistoryPage(BaseModel):
+    messages: List[ChatHistoryMessage]
+    # pass as 'before' to get the next (older) page, None when there is none
+    next_before: Optional[int] = None
+
+
+class BatchItem(BaseModel):
+    thread_id: str
+    message: str
+
+
+class BatchRequest(BaseModel):
+    items: List[BatchItem]
+    # new threads opening with the same message share one answer;
+    # 'exact': verbatim, 'message': after normalization, 'none': run everything
+    dedupe: str = "exact"
+    # False: return the job right away and poll/stream its results later
+    stream: bool = True
+
+
+class BatchResult(BaseModel):
+    index: int
+    thread_id: str
+    response: Optional[str] = None
+    tool_calls: List[Dict[str, Any]] = []
+    error: Optional[str] = None
+    # index of the item whose answer was reused
+    deduplicated_from: Optional[int] = None
+
+
+class BatchJob(BaseModel):
+    id: str
+    # queued -> running -> completed | failed
+    status: str = "queued"
+    total: int
+    unique: int
+    completed: int = 0
+    failed: int = 0
+    created_at: float
+    finished_at: Optional[float] = None
@@ -0,0 +1,296 @@
+import os
+import json
+import time
+import uuid
+import asyncio
+from collections import OrderedDict
+from typing import AsyncIterator, Dict, List, Optional, Tuple
+
+from langchain_core.messages import AIMessage, HumanMessage
+
+from app.core.agent import agent_app, checkpointer
+from app.core.history import collect_tool_calls
+from app.schemas import BatchItem, BatchJob, BatchResult
+from app.services.chat_store import save_chat_turn
+from app.services.embeddings import normalize_query
+from app.services.job_store import save_job, load_job, prune_jobs
+from app.utils.logger import get_logger
+
+logger = get_logger("Batch")
+
+# agent runs in flight across all batch jobs of this process
+BATCH_CONCURRENCY = int(os.getenv("BATCH_CONCURRENCY", "16"))
+# tool calls in flight per integration across all batch jobs
+BATCH_CONCURRENCY_PER_INTEGRATION = int(
+    os.getenv("BATCH_CONCURRENCY_PER_INTEGRATION", "4"))
+BATCH_MAX_ITEMS = int(os.getenv("BATCH_MAX_ITEMS", "10000"))
+# finished jobs (with their results) kept in memory; the database has them too
+BATCH_JOB_HISTORY = int(os.getenv("BATCH_JOB_HISTORY", "50"))
+# how often a running job's progress is written for the other workers
+BATCH_SAVE_INTERVAL = float(os.getenv("BATCH_SAVE_INTERVAL", "1"))
+
+DEDUPE_MODES = ("exact", "message", "none")
+
+_global_limit: Optional[asyncio.Semaphore] = None
+_integration_limits: Dict[str, asyncio.Semaphore] = {}
+
+_runs: "OrderedDict[str, BatchRun]" = OrderedDict()
+
+
+def _global_semaphore() -> asyncio.Semaphore:
+    global _global_limit
+    if _global_limit is None:
+        _global_limit = asyncio.Semaphore(BATCH_CONCURRENCY)
+    return _global_limit
+
+
+def _integration_semaphore(connection_id: str) -> asyncio.Semaphore:
+    """Passed to the agent's tool executor through the run config."""
+    semaphore = _integration_limits.get(connection_id)
+    if semaphore is None:
+        semaphore = asyncio.Semaphore(BATCH_CONCURRENCY_PER_INTEGRATION)
+        _integration_limits[connection_id] = semaphore
+    return semaphore
+
+
+def _config(thread_id: str) -> dict:
+    return {"configurable": {
+        "thread_id": thread_id,
+        "integration_limit": _integration_semaphore,
+    }}
+
+
+async def _plan(items: List[BatchItem], dedupe: str) -> Tuple["OrderedDict[str, List[int]]", Dict[int, int]]:
+    """
+    Groups the items into lanes, one per thread_id in input order, and
+    picks the duplicates: index -> index of the item whose answer it reuses.
+    Only the first item of a thread without a checkpoint can reuse an answer,
+    and only another such first item's; later turns depend on what came
+    before them, so they always run. 'exact' compares messages verbatim,
+    'message' after normalization.
+    """
+    lanes: "OrderedDict[str, List[int]]" = OrderedDict()
+    for index, item in enumerate(items):
+        lanes.setdefault(item.thread_id, []).append(index)
+
+    sources: Dict[int, int] = {}
+    if dedupe == "none":
+        return lanes, sources
+
+    key = normalize_query if dedupe == "message" else (lambda text: text)
+    heads: Dict[str, int] = {}
+    for thread_id, indexes in lanes.items():
+        if await checkpointer.aget_tuple({"configurable": {"thread_id": thread_id}}):
+            continue
+        first, text = indexes[0], key(items[indexes[0]].message)
+        if text in heads:
+            sources[first] = heads[text]
+        else:
+            heads[text] = first
+
+    return lanes, sources
+
+
+class BatchRun:
+    """
+    A batch job plus its results, in completion order, for streaming readers.
+    Items of one thread run one after another in input order (they share a
+    checkpoint); different threads run concurrently.
+    """
+
+    def __init__(self, items: List[BatchItem], lanes: "OrderedDict[str, List[int]]",
+                 sources: Dict[int, int]):
+        self.items = items
+        self.lanes = lanes
+        self.sources = sources
+        # lanes that start with a copy wait for the item they copy
+        self.dependents: Dict[int, List[List[int]]] = {}
+        for indexes in lanes.values():
+            if indexes[0] in sources:
+                self.dependents.setdefault(sources[indexes[0]], []).append(indexes)
+
+        self.job = BatchJob(
+            id=uuid.uuid4().hex,
+            total=len(items),
+            unique=len(items) - len(sources),
+            created_at=time.time()
+        )
+        self.answers: Dict[int, BatchResult] = {}
+        self.results: List[BatchResult] = []
+        self.changed = asyncio.Condition()
+        self.task: Optional[asyncio.Task] = None
+        self._saved_at = 0.0
+
+    @property
+    def done(self) -> bool:
+        return self.job.status in ("completed", "failed")
+
+    async def save(self, final: bool = False):
+        """Writes the job (with the results once finished) for the other workers."""
+        self._saved_at = time.monotonic()
+        try:
+            await asyncio.to_thread(save_job, "batch", self.job, self.results if final else None)
+        except Exception as e:
+            logger.warning("Could not save batch %s: %s", self.job.id, e)
+
+    async def _publish(self, result: BatchResult):
+        async with self.changed:
+            self.results.append(result)
+            if result.error:
+                self.job.failed += 1
+            else:
+                self.job.completed += 1
+            self.changed.notify_all()
+        if time.monotonic() - self._saved_at >= BATCH_SAVE_INTERVAL:
+            await self.save()
+
+    async def _answer(self, index: int) -> BatchResult:
+        item = self.items[index]
+        result = BatchResult(index=index, thread_id=item.thread_id)
+        try:
+            async with _global_semaphore():
+                state = await agent_app.ainvoke(
+                    {"messages": [HumanMessage(content=item.message)]}, config=_config(item.thread_id))
+            result.response = str(state["messages"][-1].content)
+            result.tool_calls = collect_tool_calls(state["messages"])
+            await save_chat_turn(item.thread_id, item.message, result.response, result.tool_calls)
+        except Exception as e:
+            result.error = str(e)
+        return result
+
+    async def _copy(self, index: int, source: BatchResult) -> BatchResult:
+        """Reuses an answer and records the turn in the thread's checkpoint and history."""
+        item = self.items[index]
+        result = BatchResult(
+            index=index,
+            thread_id=item.thread_id,
+            response=source.response,
+            tool_calls=source.tool_calls,
+            deduplicated_from=source.index
+        )
+        try:
+            await agent_app.aupdate_state(
+                _config(item.thread_id),
+                {"messages": [HumanMessage(content=item.message), AIMessage(content=source.response)]},
+                as_node="reasoner")
+            await save_chat_turn(item.thread_id, item.message, source.response, source.tool_calls)
+        except Exception as e:
+            result.error = str(e)
+        return result
+
+    async def _run_lane(self, indexes: List[int], queue: asyncio.Queue):
+        try:
+            for index in indexes:
+                source = self.answers.get(self.sources.get(index, -1))
+                if source is not None and not source.error:
+                    result = await self._copy(index, source)
+                else:
+                    # nothing to copy (the original failed): run it
+                    result = await self._answer(index)
+                self.answers[index] = result
+                await self._publish(result)
+                for lane in self.dependents.pop(index, []):
+                    queue.put_nowait(lane)
+        finally:
+            # never leave dependent lanes waiting, even if this lane broke off
+            for index in indexes:
+                for lane in self.dependents.pop(index, []):
+                    queue.put_nowait(lane)
+
+    async def run(self):
+        self.job.status = "running"
+        start = time.perf_counter()
+        queue: asyncio.Queue = asyncio.Queue()
+        for indexes in self.lanes.values():
+            if indexes[0] not in self.sources:
+                queue.put_nowait(indexes)
+
+        # bounded pool per job; the global semaphore caps all jobs together
+        workers = min(BATCH_CONCURRENCY, len(self.lanes))
+        remaining = len(self.lanes)
+
+        async def worker():
+            nonlocal remaining
+            while True:
+                indexes = await queue.get()
+                if indexes is None:
+                    return
+                try:
+                    await self._run_lane(indexes, queue)
+                finally:
+                    remaining -= 1
+                    if remaining == 0:
+                        for _ in range(workers):
+                            queue.put_nowait(None)
+
+        try:
+            await asyncio.gather(*(worker() for _ in range(workers)))
+            self.job.status = "completed"
+        except Exception as e:
+            self.job.status = "failed"
+            logger.error("Batch %s failed: %s", self.job.id, e)
+        finally:
+            self.job.finished_at = time.time()
+            await self.save(final=True)
+            async with self.changed:
+                self.changed.notify_all()
+
+        logger.info("Batch %s: %d items (%d unique), %d failed in %.2fs",
+                    self.job.id, self.job.total, self.job.unique, self.job.failed,
+                    time.perf_counter() - start)
+
+    async def stream(self, start: int = 0) -> AsyncIterator[BatchResult]:
+        """Yields results as they complete, from position 'start', until the job is done."""
+        position = start
+        while True:
+            async with self.changed:
+                await self.changed.wait_for(lambda: len(self.results) > position or self.done)
+                pending = self.results[position:]
+                finished = self.done
+            for result in pending:
+                yield result
+            position += len(pending)
+            if finished and position >= len(self.results):
+                return
+
+
+async def start_batch(items: List[BatchItem], dedupe: str = "exact") -> BatchRun:
+    """Validates and schedules a batch; it runs in the background."""
+    if not items:
+        raise ValueError("A batch needs at least one item.")
+    if len(items) > BATCH_MAX_ITEMS:
+        raise ValueError(f"A batch can have at most {BATCH_MAX_ITEMS} items.")
+    if dedupe not in DEDUPE_MODES:
+        raise ValueError(f"dedupe must be one of {', '.join(DEDUPE_MODES)}.")
+
+    lanes, sources = await _plan(items, dedupe)
+    run = BatchRun(items, lanes, sources)
+    # saved before the id is handed out, so any worker can report it
+    await asyncio.to_thread(prune_jobs)
+    await run.save()
+    _runs[run.job.id] = run
+    while len(_runs) > BATCH_JOB_HISTORY:
+        oldest = next(iter(_runs.values()))
+        if not oldest.done:
+            break
+        _runs.popitem(last=False)
+
+    run.task = asyncio.create_task(run.run())
+    return run
+
+
+def get_batch(job_id: str) -> Optional[BatchRun]:
+    """The live run, if this worker runs (or ran) the batch."""
+    return _runs.get(job_id)
+
+
+async def load_batch(job_id: str) -> Tuple[Optional[BatchJob], Optional[List[BatchResult]]]:
+    """
+    Last saved state of a batch run by any worker, and its results once it
+    finished (None while it is still running).
+    """
+    record = await asyncio.to_thread(load_job, "batch", job_id)
+    if record is None:
+        return None, None
+    results = [BatchResult(**r) for r in json.loads(record.results)] if record.results else None
+    return BatchJob.model_validate_json(record.state), results
@@ -0,0 +1,137 @@
+import os
+import json
+import asyncio
+from typing import Any, Dict, List, Optional
+from sqlalchemy import insert
+from sqlmodel import Session, col, select
+
+from app.core.database import engine, ChatMessage
+from app.utils.logger import get_logger
+from app.utils.metrics import PERSISTENCE_DURATION, timed
+
+logger = get_logger("Chat_Store")
+
+# rows written per bulk insert, and how long a partial batch may wait
+CHAT_WRITE_BATCH_SIZE = int(os.getenv("CHAT_WRITE_BATCH_SIZE", "200"))
+CHAT_WRITE_FLUSH_INTERVAL = float(os.getenv("CHAT_WRITE_FLUSH_INTERVAL", "0.5"))
+# pending rows before save_chat_turn starts to wait (backpressure)
+CHAT_WRITE_QUEUE_SIZE = int(os.getenv("CHAT_WRITE_QUEUE_SIZE", "10000"))
+CHAT_HISTORY_MAX_PAGE = int(os.getenv("CHAT_HISTORY_MAX_PAGE", "200"))
+
+
+def _write_rows(rows: List[Dict[str, Any]]):
+    with timed(PERSISTENCE_DURATION), Session(engine) as session:
+        session.execute(insert(ChatMessage), rows)
+        session.commit()
+
+
+def _turn_rows(thread_id: str, user_message: str, assistant_message: str,
+               tool_calls: Optional[List[Dict[str, Any]]]) -> List[Dict[str, Any]]:
+    return [
+        {"thread_id": thread_id, "role": "user",
+         "content": user_message, "tool_calls": None},
+        {"thread_id": thread_id, "role": "assistant", "content": assistant_message,
+         "tool_calls": json.dumps(tool_calls, default=str) if tool_calls else None},
+    ]
+
+
+class ChatWriter:
+    """
+    Write-behind queue for chat messages: requests enqueue their rows and
+    return, a background task bulk-inserts them in batches of up to
+    CHAT_WRITE_BATCH_SIZE (or whatever arrived within CHAT_WRITE_FLUSH_INTERVAL).
+    """
+
+    def __init__(self):
+        self._queue: Optional[asyncio.Queue] = None
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    def start(self):
+        if self.running:
+            return
+        self._queue = asyncio.Queue(maxsize=CHAT_WRITE_QUEUE_SIZE)
+        self._task = asyncio.create_task(self._run())
+        logger.info("Chat writer started")
+
+    async def stop(self):
+        """Flushes what is queued and stops the background task."""
+        if not self.running:
+            return
+        await self._queue.put(None)
+        await self._task
+        self._task = None
+        logger.info("Chat writer stopped")
+
+    async def put(self, rows: List[Dict[str, Any]]):
+        for row in rows:
+            await self._queue.put(row)
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        stopping = False
+
+        while not stopping:
+            row = await self._queue.get()
+            if row is None:
+                break
+            batch = [row]
+
+            # collect more rows until the batch is full or the interval ran out
+            deadline = loop.time() + CHAT_WRITE_FLUSH_INTERVAL
+            while len(batch) < CHAT_WRITE_BATCH_SIZE:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    row = await asyncio.wait_for(self._queue.get(), timeout)
+                except asyncio.TimeoutError:
+                    break
+                if row is None:
+                    stopping = True
+                    break
+                batch.append(row)
+
+            await self._flush(batch)
+
+    async def _flush(self, batch: List[Dict[str, Any]]):
+        try:
+            await asyncio.to_thread(_write_rows, batch)
+        except Exception as e:
+            # losing chat log rows must never take the writer down
+            logger.error(f"Could not persist {len(batch)} chat messages: {e}")
+
+
+chat_writer = ChatWriter()
+
+
+async def save_chat_turn(thread_id: str, user_message: str, assistant_message: str,
+                         tool_calls: Optional[List[Dict[str, Any]]] = None):
+    """
+    Persists one user/assistant exchange without blocking the request:
+    the rows go to the write-behind queue. Without a running writer
+    (e.g. outside the app lifespan) they are written directly in a worker thread.
+    """
+    rows = _turn_rows(thread_id, user_message, assistant_message, tool_calls)
+    if chat_writer.running:
+        await chat_writer.put(rows)
+    else:
+        await asyncio.to_thread(_write_rows, rows)
+
+
+def get_chat_history(thread_id: str, before_id: Optional[int] = None,
+                     limit: int = 50) -> List[ChatMessage]:
+    """
+    One page of a thread's messages, newest first. Keyset pagination:
+    pass the smallest id of the previous page as before_id.
+    """
+    limit = max(1, min(limit, CHAT_HISTORY_MAX_PAGE))
+    with Session(engine) as session:
+        statement = select(ChatMessage).where(ChatMessage.thread_id == thread_id)
+        if before_id is not None:
+            statement = statement.where(col(ChatMessage.id) < before_id)
+        statement = statement.order_by(col(ChatMessage.id).desc()).limit(limit)
+        return list(session.exec(statement).all())
@@ -0,0 +1,218 @@
+import os
+import re
+import json
+import zlib
+import sqlite3
+import threading
+from collections import Counter, OrderedDict
+from typing import Dict, List, Optional
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+from app.services.lexical_index import tokenize
+from app.utils.logger import get_logger
+
+logger = get_logger("Embeddings")
+
+EMBEDDING_CACHE_SIZE = int(os.getenv("EMBEDDING_CACHE_SIZE", "2048"))
+EMBEDDING_BATCH_SIZE = int(os.getenv("EMBEDDING_BATCH_SIZE", "100"))
+# optional on-disk copy of the query cache (a SQLite file all workers
+# can share), survives restarts
+EMBEDDING_CACHE_PATH = os.getenv("EMBEDDING_CACHE_PATH")
+# 'google' (Gemini text-embedding-004) or 'hashing' (local, offline)
+EMBEDDING_BACKEND = os.getenv("EMBEDDING_BACKEND", "google").lower()
+HASHING_EMBEDDING_DIM = int(os.getenv("HASHING_EMBEDDING_DIM", "512"))
+
+
+def build_embeddings(backend: str = EMBEDDING_BACKEND) -> Embeddings:
+    """Creates the configured embedding backend."""
+    if backend == "hashing":
+        return HashingEmbeddings()
+    if backend == "google":
+        from langchain_google_genai import GoogleGenerativeAIEmbeddings
+        return GoogleGenerativeAIEmbeddings(
+            model="models/text-embedding-004",
+            google_api_key=os.getenv("GOOGLE_API_KEY"),
+            task_type="semantic_similarity"
+        )
+    raise ValueError(f"Unknown EMBEDDING_BACKEND '{backend}'")
+
+
+def normalize_query(text: str) -> str:
+    """Case/whitespace/punctuation-insensitive cache key."""
+    text = re.sub(r"[^\w\s]", " ", text.lower())
+    return " ".join(text.split())
+
+
+def _backend_id(embeddings: Embeddings) -> str:
+    """Class plus model (or dimension): vectors of different backends never mix."""
+    detail = getattr(embeddings, "model", None) or getattr(embeddings, "dim", "")
+    return f"{type(embeddings).__name__}:{detail}"
+
+
+class CachedEmbeddings(Embeddings):
+    """
+    Wraps a (remote) embedding model with a bounded LRU cache for query
+    embeddings and batched document embedding.
+    """
+
+    def __init__(self, base: Embeddings, max_size: int = EMBEDDING_CACHE_SIZE,
+                 batch_size: int = EMBEDDING_BATCH_SIZE, persist_path: Optional[str] = EMBEDDING_CACHE_PATH):
+        self.base = base
+        self.max_size = max_size
+        self.batch_size = batch_size
+
+        self._cache: "OrderedDict[str, List[float]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._stats = {"hits": 0, "misses": 0, "evictions": 0,
+                       "document_batches": 0, "documents_embedded": 0}
+
+        self._store: Optional[sqlite3.Connection] = None
+        # the on-disk cache outlives a change of EMBEDDING_BACKEND or model
+        self._store_prefix = f"{_backend_id(base)}|"
+        if persist_path:
+            try:
+                self._store = _open_store(persist_path)
+                logger.info(f"Persistent query embedding cache at {persist_path}")
+            except sqlite3.Error as e:
+                logger.warning(f"Persistent query embedding cache disabled ({persist_path}): {e}")
+
+    def _get(self, key: str) -> Optional[List[float]]:
+        with self._lock:
+            vector = self._cache.get(key)
+            if vector is not None:
+                self._cache.move_to_end(key)
+            elif self._store is not None:
+                vector = self._load(self._store_prefix + key)
+                if vector is not None:
+                    self._put_locked(key, vector)
+
+            self._stats["hits" if vector is not None else "misses"] += 1
+            return vector
+
+    def _put(self, key: str, vector: List[float]):
+        with self._lock:
+            self._put_locked(key, vector)
+            if self._store is not None:
+                try:
+                    with self._store:
+                        self._store.execute(
+                            "INSERT OR REPLACE INTO query_embedding (key, vector) VALUES (?, ?)",
+                            (self._store_prefix + key, json.dumps(vector)))
+                except sqlite3.Error as e:
+                    logger.warning("Could not persist query embedding: %s", e)
+
+    def _load(self, key: str) -> Optional[List[float]]:
+        try:
+            row = self._store.execute(
+                "SELECT vector FROM query_embedding WHERE key = ?", (key,)).fetchone()
+        except sqlite3.Error as e:
+            logger.warning("Could not read query embedding: %s", e)
+            return None
+        return json.loads(row[0]) if row else None
+
+    def _put_locked(self, key: str, vector: List[float]):
+        self._cache[key] = vector
+        self._cache.move_to_end(key)
+        while len(self._cache) > self.max_size:
+            self._cache.popitem(last=False)
+            self._stats["evictions"] += 1
+
+    def embed_query(self, text: str) -> List[float]:
+        key = normalize_query(text)
+        vector = self._get(key)
+        if vector is None:
+            vector = self.base.embed_query(text)
+            self._put(key, vector)
+        return vector
+
+    async def aembed_query(self, text: str) -> List[float]:
+        key = normalize_query(text)
+        vector = self._get(key)
+        if vector is None:
+            vector = await self.base.aembed_query(text)
+            self._put(key, vector)
+        return vector
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        vectors: List[List[float]] = []
+        for i in range(0, len(texts), self.batch_size):
+            batch = texts[i:i + self.batch_size]
+            vectors.extend(self.base.embed_documents(batch))
+            self._count_batch(len(batch))
+        return vectors
+
+    async def aembed_documents(self, texts: List[str]) -> List[List[float]]:
+        vectors: List[List[float]] = []
+        for i in range(0, len(texts), self.batch_size):
+            batch = texts[i:i + self.batch_size]
+            vectors.extend(await self.base.aembed_documents(batch))
+            self._count_batch(len(batch))
+        return vectors
+
+    def _count_batch(self, size: int):
+        with self._lock:
+            self._stats["document_batches"] += 1
+            self._stats["documents_embedded"] += size
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {**self._stats, "size": len(self._cache), "max_size": self.max_size}
+
+    def close(self):
+        if self._store is not None:
+            with self._lock:
+                self._store.close()
+                self._store = None
+
+
+def _open_store(path: str) -> sqlite3.Connection:
+    """
+    SQLite rather than shelve: several worker processes read and write the
+    same file, WAL lets readers continue while one of them writes.
+    """
+    store = sqlite3.connect(path, timeout=5, check_same_thread=False)
+    store.execute("PRAGMA journal_mode=WAL")
+    store.execute(
+        "CREATE TABLE IF NOT EXISTS query_embedding (key TEXT PRIMARY KEY, vector TEXT NOT NULL)")
+    store.commit()
+    return store
+
+
+class HashingEmbeddings(Embeddings):
+    """
+    Local embedding backend: hashing-trick vectors over word tokens and
+    character trigrams, sublinear TF and L2-normalized, computed with NumPy.
+    Needs no network and is deterministic across processes.
+    """
+
+    def __init__(self, dim: int = HASHING_EMBEDDING_DIM):
+        self.dim = dim
+
+    def _features(self, text: str) -> Counter:
+        features = Counter(tokenize(text))
+        for word in list(features):
+            padded = f"#{word}#"
+            for i in range(len(padded) - 2):
+                features[padded[i:i + 3]] += 1
+        return features
+
+    def _embed(self, text: str) -> List[float]:
+        vector = np.zeros(self.dim, dtype=np.float32)
+        for feature, count in self._features(text).items():
+            # crc32 is stable across runs, unlike the salted builtin hash()
+            h = zlib.crc32(feature.encode())
+            sign = 1.0 if (h >> 31) & 1 else -1.0
+            vector[h % self.dim] += sign * (1.0 + np.log(count))
+
+        norm = np.linalg.norm(vector)
+        if norm > 0:
+            vector /= norm
+        return vector.tolist()
+
+    def embed_query(self, text: str) -> List[float]:
+        return self._embed(text)
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return [self._embed(text) for text in texts]
@@ -0,0 +1,85 @@
+import os
+from typing import Dict
+
+import httpx
+
+from app.utils.logger import get_logger
+
+logger = get_logger("HTTP_Client")
+
+try:
+    import h2  # noqa: F401
+    HTTP2_AVAILABLE = True
+except ImportError:
+    HTTP2_AVAILABLE = False
+
+# Connection settings for the upstream APIs behind the generated tools
+HTTP_CONNECT_TIMEOUT = float(os.getenv("HTTP_CONNECT_TIMEOUT", "5"))
+HTTP_READ_TIMEOUT = float(os.getenv("HTTP_READ_TIMEOUT", "30"))
+HTTP_MAX_CONNECTIONS = int(os.getenv("HTTP_MAX_CONNECTIONS", "20"))
+HTTP_MAX_KEEPALIVE = int(os.getenv("HTTP_MAX_KEEPALIVE", "10"))
+HTTP_KEEPALIVE_EXPIRY = float(os.getenv("HTTP_KEEPALIVE_EXPIRY", "30"))
+HTTP2_ENABLED = os.getenv("HTTP2_ENABLED", "true").lower() == "true"
+
+
+class HTTPClientPool:
+    """
+    Keeps one pooled AsyncClient per integration so tool calls reuse
+    keep-alive connections instead of paying a new handshake every time.
+    """
+
+    def __init__(self):
+        self._clients: Dict[str, httpx.AsyncClient] = {}
+
+        self.timeout = httpx.Timeout(
+            HTTP_READ_TIMEOUT,
+            connect=HTTP_CONNECT_TIMEOUT
+        )
+        # each integration normally talks to a single host, so the pool
+        # limits of its client are effectively per-host limits
+        self.limits = httpx.Limits(
+            max_connections=HTTP_MAX_CONNECTIONS,
+            max_keepalive_connections=HTTP_MAX_KEEPALIVE,
+            keepalive_expiry=HTTP_KEEPALIVE_EXPIRY
+        )
+        self.http2 = HTTP2_ENABLED and HTTP2_AVAILABLE
+
+        if HTTP2_ENABLED and not HTTP2_AVAILABLE:
+            logger.warning(
+                "HTTP/2 requested but the 'h2' package is missing, falling back to HTTP/1.1")
+
+    def get_client(self, connection_id: str) -> httpx.AsyncClient:
+        """Returns the shared client for an integration, creating it on first use."""
+        client = self._clients.get(connection_id)
+
+        if client is None or client.is_closed:
+            client = httpx.AsyncClient(
+                timeout=self.timeout,
+                limits=self.limits,
+                http2=self.http2,
+                follow_redirects=True
+            )
+            self._clients[connection_id] = client
+            logger.info(f"Created HTTP client pool for {connection_id}")
+
+        return client
+
+    async def close_client(self, connection_id: str):
+        """Closes the pool of a single integration (e.g. when it is re-registered)."""
+        client = self._clients.pop(connection_id, None)
+        if client is not None:
+            await client.aclose()
+
+    async def aclose(self):
+        """Closes every pooled client. Called on application shutdown."""
+        clients = list(self._clients.values())
+        self._clients.clear()
+
+        for client in clients:
+            await client.aclose()
+
+        logger.info(f"Closed {len(clients)} HTTP client pools")
+
+
+# shared by every bridge in the process
+http_pool = HTTPClientPool()
@@ -0,0 +1,318 @@
+import os
+import json
+import time
+import uuid
+import asyncio
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Set, Tuple
+from sqlalchemy import update
+from sqlmodel import Session, select
+
+from app.core.database import engine, Integration, IntegrationSpec
+from app.schemas import IngestionJob
+from app.services.mcp_bridge import OpenAPIMCPBridge
+from app.services.spec_loader import IR_VERSION
+from app.services.tool_registry import ToolRegistry, OperationRecord
+from app.services.job_store import save_job, load_job, prune_jobs
+from app.services.response_cache import response_cache
+from app.services.security import invalidate_auth_headers
+from app.utils.logger import get_logger
+
+logger = get_logger("Ingestion")
+
+# how many specs are fetched/parsed at the same time during startup
+REHYDRATE_CONCURRENCY = int(os.getenv("REHYDRATE_CONCURRENCY", "8"))
+# tools per embedding batch; the next batch is parsed while one is embedded
+INGEST_CHUNK_SIZE = int(os.getenv("INGEST_CHUNK_SIZE", "100"))
+# finished jobs kept in memory; every job is also in the database (see job_store)
+INGEST_JOB_HISTORY = int(os.getenv("INGEST_JOB_HISTORY", "200"))
+# how often a worker checks Integration.version for changes made by other workers
+REGISTRY_SYNC_INTERVAL = float(os.getenv("REGISTRY_SYNC_INTERVAL", "2"))
+
+_jobs: "OrderedDict[str, IngestionJob]" = OrderedDict()
+# strong references, otherwise running tasks can be garbage collected
+_tasks: Dict[str, asyncio.Task] = {}
+
+_last_sync = 0.0
+_sync_lock: Optional[asyncio.Lock] = None
+
+
+def _load_integrations() -> List[Integration]:
+    with Session(engine) as session:
+        return list(session.exec(select(Integration)).all())
+
+
+def get_integration(connection_id: str) -> Optional[Integration]:
+    with Session(engine) as session:
+        return session.exec(select(Integration).where(
+            Integration.connection_id == connection_id)).first()
+
+
+def _bridge(integration: Integration) -> OpenAPIMCPBridge:
+    return OpenAPIMCPBridge(
+        integration.name, integration.spec_url, integration.connection_id,
+        cache_ttl=integration.response_cache_ttl)
+
+
+def _load_spec(connection_id: str) -> Optional[IntegrationSpec]:
+    with Session(engine) as session:
+        return session.get(IntegrationSpec, connection_id)
+
+
+def _store_compiled(connection_id: str, compiled: Dict[str, Any]) -> int:
+    """
+    Saves the compiled operations for the other workers and bumps
+    Integration.version in the same transaction. Returns the new version.
+    """
+    with Session(engine) as session:
+        # atomic increment, concurrent ingestions in other workers can't lose a bump
+        session.execute(update(Integration)
+                        .where(Integration.connection_id == connection_id)
+                        .values(version=Integration.version + 1))
+        version = session.exec(select(Integration.version).where(
+            Integration.connection_id == connection_id)).one()
+
+        spec = session.get(IntegrationSpec, connection_id)
+        if spec is None:
+            spec = IntegrationSpec(connection_id=connection_id, compiled="")
+        spec.version = version
+        spec.compiled = json.dumps(compiled)
+        session.add(spec)
+        session.commit()
+        return version
+
+
+def _build_tools(integration: Integration) -> Tuple[List[OperationRecord], int]:
+    """
+    Operation records of an integration: from the compiled operations in the
+    database when present and current, otherwise by fetching and compiling the spec.
+    """
+    bridge = _bridge(integration)
+    spec = _load_spec(integration.connection_id)
+    if spec is not None:
+        compiled = json.loads(spec.compiled)
+        # IR written by an older compiler is rebuilt from the spec
+        if compiled.get("version") == IR_VERSION:
+            return bridge.load_compiled(compiled), spec.version
+
+    bridge.register_tools()
+    version = _store_compiled(integration.connection_id, bridge.compiled)
+    return bridge.get_operations(), version
+
+
+async def rehydrate_registry(registry: ToolRegistry) -> Dict[str, Any]:
+    """
+    Rebuilds the in-memory tool map from the Integration table at startup.
+    Operations come from the compiled IR stored in IntegrationSpec, which is
+    not revalidated against the upstream spec (re-add an integration to pick
+    up spec changes). Only integrations without stored IR have their spec
+    fetched and compiled, in parallel. The incremental index sync skips
+    re-embedding unchanged tools.
+    """
+    start = time.perf_counter()
+    integrations = await asyncio.to_thread(_load_integrations)
+
+    semaphore = asyncio.Semaphore(REHYDRATE_CONCURRENCY)
+
+    async def build(integration: Integration) -> Tuple[List[OperationRecord], int]:
+        async with semaphore:
+            return await asyncio.to_thread(_build_tools, integration)
+
+    results = await asyncio.gather(
+        *(build(i) for i in integrations), return_exceptions=True)
+
+    stats = {"integrations": 0, "failed": 0, "tools": 0}
+
+    for integration, result in zip(integrations, results):
+        if isinstance(result, Exception):
+            stats["failed"] += 1
+            logger.error(
+                f"Could not rehydrate {integration.connection_id}: {result}")
+            continue
+
+        records, version = result
+        # only operations missing from the (shared) vector store are embedded
+        await asyncio.to_thread(registry.register_tools, records)
+        registry.versions[integration.connection_id] = version
+        stats["integrations"] += 1
+        stats["tools"] += len(records)
+
+    stats["seconds"] = round(time.perf_counter() - start, 3)
+    logger.info(
+        f"Rehydrated {stats['integrations']} integrations ({stats['tools']} tools, "
+        f"{stats['failed']} failed) in {stats['seconds']}s")
+    return stats
+
+
+async def get_job(job_id: str) -> Optional[IngestionJob]:
+    """Live state when this worker runs the job, else the last state it saved."""
+    job = _jobs.get(job_id)
+    if job is not None:
+        return job
+    record = await asyncio.to_thread(load_job, "ingestion", job_id)
+    return IngestionJob.model_validate_json(record.state) if record else None
+
+
+def _save_job(job: IngestionJob):
+    try:
+        save_job("ingestion", job)
+    except Exception as e:
+        # progress reporting must never fail the ingestion
+        logger.warning("Could not save ingestion job %s: %s", job.id, e)
+
+
+async def start_ingestion(integration: Integration, registry: ToolRegistry) -> IngestionJob:
+    """Creates an ingestion job and runs it in the background."""
+    job = IngestionJob(
+        id=uuid.uuid4().hex,
+        connection_id=integration.connection_id,
+        name=integration.name,
+        created_at=time.time()
+    )
+    _jobs[job.id] = job
+    while len(_jobs) > INGEST_JOB_HISTORY:
+        _jobs.popitem(last=False)
+
+    # saved before the id is handed out, so any worker can answer the first poll
+    await asyncio.to_thread(prune_jobs)
+    await asyncio.to_thread(_save_job, job)
+
+    task = asyncio.create_task(_run_job(job, integration, registry))
+    _tasks[job.id] = task
+    task.add_done_callback(lambda _: _tasks.pop(job.id, None))
+    return job
+
+
+async def _run_job(job: IngestionJob, integration: Integration, registry: ToolRegistry):
+    """
+    Fetches and compiles the spec in a worker thread, then embeds the
+    operations chunk by chunk, saving progress after each chunk.
+    """
+    loop = asyncio.get_running_loop()
+    # small buffer: records are built at most two chunks ahead of embedding
+    queue: asyncio.Queue = asyncio.Queue(maxsize=2)
+    stop = threading.Event()
+    job.status = "running"
+    await asyncio.to_thread(_save_job, job)
+
+    bridge = _bridge(integration)
+
+    def produce():
+        try:
+            job.phase = "fetching"
+            text = bridge.fetch_spec_text()
+            job.phase = "parsing"
+            compiled = bridge.compile(text)
+            job.operations_total = bridge.operations_total
+            for chunk in bridge.iter_tool_chunks(INGEST_CHUNK_SIZE, compiled):
+                if stop.is_set():
+                    return
+                job.operations_parsed += len(chunk)
+                asyncio.run_coroutine_threadsafe(queue.put(chunk), loop).result()
+        finally:
+            asyncio.run_coroutine_threadsafe(queue.put(None), loop).result()
+
+    start = time.perf_counter()
+    producer = asyncio.create_task(asyncio.to_thread(produce))
+    try:
+        names: Set[str] = set()
+        while True:
+            chunk = await queue.get()
+            if chunk is None:
+                break
+            job.phase = "embedding"
+            stats = await asyncio.to_thread(registry.register_tools, chunk, False)
+            job.tools_embedded += stats["added"] + stats["updated"]
+            job.tools_unchanged += stats["unchanged"]
+            names.update(t.name for t in chunk)
+            await asyncio.to_thread(_save_job, job)
+
+        # surfaces parse/fetch errors
+        await producer
+
+        job.phase = "pruning"
+        job.tools_removed = await asyncio.to_thread(
+            registry.prune_integration, integration.connection_id, names)
+
+        # other workers pick the new operations up from the database
+        registry.versions[integration.connection_id] = await asyncio.to_thread(
+            _store_compiled, integration.connection_id, bridge.compiled)
+
+        job.phase = "done"
+        job.status = "completed"
+        logger.info(
+            f"Ingested {integration.connection_id}: {job.operations_parsed} operations, "
+            f"{job.tools_embedded} embedded in {time.perf_counter() - start:.2f}s")
+
+    except Exception as e:
+        job.status = "failed"
+        job.error = str(e)
+        logger.error(f"Ingestion of {integration.connection_id} failed: {e}")
+
+        # unblock the producer if embedding failed while it was waiting on the queue
+        stop.set()
+        while not producer.done():
+            while not queue.empty():
+                queue.get_nowait()
+            await asyncio.sleep(0.01)
+
+    finally:
+        job.finished_at = time.time()
+        await asyncio.to_thread(_save_job, job)
+
+
+def sync_registry(registry: ToolRegistry) -> int:
+    """
+    Loads the operations of integrations whose version changed since this
+    worker last saw them (ingested by another worker). Nothing is embedded,
+    the vectors are already in the shared store. Cached auth headers and
+    responses of those integrations are dropped too, the other worker may
+    have saved new credentials. Returns how many were synced.
+    """
+    with Session(engine) as session:
+        rows = session.exec(select(IntegrationSpec.connection_id, IntegrationSpec.version)).all()
+
+    synced = 0
+    for connection_id, version in rows:
+        if registry.versions.get(connection_id, -1) >= version:
+            continue
+
+        integration = get_integration(connection_id)
+        spec = _load_spec(connection_id)
+        if integration is None or spec is None:
+            continue
+
+        records = _bridge(integration).load_compiled(json.loads(spec.compiled))
+        registry.load_operations(connection_id, records)
+        invalidate_auth_headers(connection_id)
+        response_cache.invalidate(connection_id)
+        registry.versions[connection_id] = spec.version
+        synced += 1
+
+    return synced
+
+
+async def maybe_sync_registry(registry: ToolRegistry):
+    """
+    Lazy, throttled sync_registry: at most once per REGISTRY_SYNC_INTERVAL,
+    called on the request path so every worker converges on the database.
+    """
+    global _last_sync, _sync_lock
+    if time.monotonic() - _last_sync < REGISTRY_SYNC_INTERVAL:
+        return
+
+    if _sync_lock is None:
+        _sync_lock = asyncio.Lock()
+    if _sync_lock.locked():
+        # another request is already syncing, don't queue behind it
+        return
+
+    async with _sync_lock:
+        _last_sync = time.monotonic()
+        try:
+            synced = await asyncio.to_thread(sync_registry, registry)
+            if synced:
+                logger.info("Synced %d integrations from the database", synced)
+        except Exception as e:
+            logger.warning("Registry sync failed: %s", e)
@@ -0,0 +1,43 @@
+import os
+import json
+import time
+from typing import List, Optional
+
+from pydantic import BaseModel
+from sqlalchemy import delete
+from sqlmodel import Session, col
+
+from app.core.database import engine, JobRecord
+
+# finished or abandoned jobs older than this are deleted
+JOB_RETENTION_SECONDS = float(os.getenv("JOB_RETENTION_SECONDS", str(24 * 3600)))
+
+
+def save_job(kind: str, job: BaseModel, results: Optional[List[BaseModel]] = None):
+    """
+    Writes a job's state (and, once finished, its results) to the database.
+    The worker running a job answers from memory, the others read this.
+    """
+    record = JobRecord(
+        id=job.id,
+        kind=kind,
+        state=job.model_dump_json(),
+        results=json.dumps([r.model_dump() for r in results], default=str) if results is not None else None,
+        updated_at=time.time()
+    )
+    with Session(engine) as session:
+        session.merge(record)
+        session.commit()
+
+
+def load_job(kind: str, job_id: str) -> Optional[JobRecord]:
+    with Session(engine) as session:
+        record = session.get(JobRecord, job_id)
+        return record if record is not None and record.kind == kind else None
+
+
+def prune_jobs():
+    with Session(engine) as session:
+        session.execute(delete(JobRecord).where(
+            col(JobRecord.updated_at) < time.time() - JOB_RETENTION_SECONDS))
+        session.commit()
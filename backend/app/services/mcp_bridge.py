@@ -1,36 +1,89 @@
+import httpx
 import requests
-import re
-import yaml
+import os
 import json
+import hashlib
+from functools import partial
 from pydantic import BaseModel, create_model
-from typing import Any, Dict, List, Optional
+from typing import Any, Dict, Iterator, List, Optional
 from mcp.server.fastmcp import FastMCP
 from langchain_core.tools import StructuredTool
 
-from app.services.security import get_auth_headers
+from app.services.security import aget_auth_headers
+from app.services.http_client import http_pool
+from app.services.spec_cache import spec_cache
+from app.services.spec_loader import ensure_ir, load_compiled_spec, load_operation, parse_spec_text
+from app.services.result_shaper import ToolError, read_shaped, shape_body, truncate_text
+from app.services.response_cache import response_cache, cache_key
+from app.services.tool_registry import OperationRecord
+from app.services.resilience import upstream_guards, UpstreamUnavailable
 from app.utils.logger import get_logger
+from app.utils.metrics import TOOL_CALL_DURATION, UPSTREAM_RESPONSES, timed
 
 logger = get_logger("MCP_Bridge")
 
+SPEC_FETCH_TIMEOUT = float(os.getenv("SPEC_FETCH_TIMEOUT", "30"))
+
+
+def _map_openapi_type(t: str):
+    """Map OpenAPI basic types to Python types"""
+    t = (t or "").lower()
+    if t == "integer":
+        return int
+    if t == "number":
+        return float
+    if t == "boolean":
+        return bool
+    if t == "array":
+        return List[Any]
+    if t == "object":
+        return Dict[str, Any]
+    return str
+
 
 class OpenAPIMCPBridge:
-    def __init__(self, api_name: str, spec_url: str, connection_name: str):
+    def __init__(self, api_name: str, spec_url: str, connection_name: str, cache_ttl: int = 0):
         self.api_name = api_name
         self.spec_url = spec_url
         self.connection_name = connection_name
+        # seconds GET results may be served from the response cache (0 = off)
+        self.cache_ttl = cache_ttl or 0
 
-        self.mcp = FastMCP(api_name)
+        # only created for the standalone stdio server, see start()
+        self.mcp: Optional[FastMCP] = None
 
-        self._generated_tools: List[StructuredTool] = []
+        self._operations: List[OperationRecord] = []
+        self.operations_total = 0
+        # compiled spec the records were built from, persisted for other workers
+        self.compiled: Optional[Dict[str, Any]] = None
 
-        logger.info(
+        logger.debug(
             f"Initialized Bridge for {api_name} (Connection: {connection_name})")
 
     def fetch_spec(self) -> Dict[str, Any]:
         """Fetches and parses the OpenAPI spec."""
+        return parse_spec_text(self.fetch_spec_text())
+
+    def fetch_spec_text(self) -> str:
+        """
+        Fetches the raw OpenAPI spec document.
+        Uses the on-disk spec cache with ETag/Last-Modified revalidation and
+        falls back to the cached copy when the spec host is unreachable.
+        """
+        cached = spec_cache.load(self.spec_url)
+
         try:
             logger.info(f"Fetching spec from: {self.spec_url}")
-            response = requests.get(self.spec_url)
+            response = requests.get(
+                self.spec_url,
+                headers=spec_cache.conditional_headers(cached),
+                timeout=SPEC_FETCH_TIMEOUT
+            )
+
+            if response.status_code == 304 and cached:
+                logger.info("Spec not modified, using cached copy.")
+                return cached["body"]
+
             response.raise_for_status()
 
             # check if accidentally downloaded HTML
@@ -41,10 +94,21 @@ class OpenAPIMCPBridge:
                 raise ValueError(
                     "The URL returned an HTML page. Please use the 'Raw' URL.")
 
-            try:
-                return response.json()
-            except json.JSONDecodeError:
-                return yaml.safe_load(response.text)
+            spec_cache.store(
+                self.spec_url,
+                response.text,
+                etag=response.headers.get("ETag"),
+                last_modified=response.headers.get("Last-Modified")
+            )
+            return response.text
+
+        except requests.RequestException as e:
+            if cached:
+                logger.warning(
+                    f"Spec fetch failed ({e}), using cached copy.")
+                return cached["body"]
+            logger.error(f"Spec fetch failed: {e}")
+            raise RuntimeError(f"Could not fetch spec: {e}")
 
         except Exception as e:
             logger.error(f"Spec fetch failed: {e}")
@@ -52,194 +116,314 @@ class OpenAPIMCPBridge:
 
     def register_tools(self):
         """
-        Parses the spec and dynamically registers tools to the MCP server.
+        Parses the spec into operation records. Tools are built lazily,
+        see OperationRecord.
         """
-        spec = self.fetch_spec()
+        for _ in self.iter_tool_chunks():
+            pass
 
-        base_url = "https://api.example.com"
+    def compile(self, text: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Fetches (unless 'text' is given) and compiles the whole spec; the
+        IR is cached per spec digest, so this is a file read when unchanged.
+        """
+        try:
+            compiled = load_compiled_spec(text if text is not None else self.fetch_spec_text())
+        except RuntimeError:
+            raise
+        except Exception as e:
+            raise RuntimeError(f"Could not parse spec: {e}")
 
-        # OpenAPI 3.0 'servers' array
-        if "servers" in spec and spec["servers"]:
-            base_url = spec["servers"][0].get("url", "")
+        self.compiled = compiled
+        self.operations_total = len(compiled["operations"])
+        return compiled
 
-        # Strategy B: Swagger 2.0 'host' + 'basePath'
-        elif "host" in spec:
-            scheme = spec.get("schemes", ["https"])[0]
-            host = spec["host"]
-            base_path = spec.get("basePath", "")
-            base_url = f"{scheme}://{host}{base_path}"
+    def iter_tool_chunks(self, chunk_size: int = 100,
+                         compiled: Optional[Dict[str, Any]] = None) -> Iterator[List[OperationRecord]]:
+        """
+        Yields the operation records of a compiled spec (compiling it first
+        when not given) in chunks, so callers can index and report progress
+        chunk by chunk. The spec itself is compiled as a whole.
+        """
+        if compiled is None:
+            compiled = self.compile()
+        key = ensure_ir(compiled)
+        operations = compiled["operations"]
 
-        else:
-            logger.warning(
-                "Could not determine Base URL. Defaulting to example.com")
+        tool_count = 0
+        chunk: List[OperationRecord] = []
 
-        if base_url.endswith("/"):
-            base_url = base_url[:-1]
+        for op in operations:
+            record = self._record(op, key)
+            self._operations.append(record)
+            tool_count += 1
 
-        paths = spec.get("paths", {})
-        tool_count = 0
+            chunk.append(record)
+            if len(chunk) >= chunk_size:
+                yield chunk
+                chunk = []
 
-        for path, methods in paths.items():
-            for method, details in methods.items():
-                if method.lower() not in ["get", "post", "put", "delete", "patch"]:
-                    continue
-
-                op_id = details.get("operationId")
-                if not op_id:
-                    clean_path = path.replace(
-                        "/", "_").replace("{", "").replace("}", "")
-                    op_id = f"{method.lower()}{clean_path}"
-
-                # building a rich description for better semantic search
-                base_description = details.get("summary") or details.get(
-                    "description") or "No description."
-
-                # extracting parameter information to enhance description
-                params_info = []
-                parameters = details.get("parameters", [])
-                for param in parameters:
-                    param_name = param.get("name", "")
-                    param_desc = param.get("description", "")
-                    param_in = param.get("in", "")
-                    if param_name and param_in == "path":
-                        params_info.append(
-                            f"Uses {param_name} parameter ({param_desc})")
-
-                description = base_description
-                if params_info:
-                    description = f"{base_description}. {'. '.join(params_info)}."
-
-                # We use a closure to capture the specific path, method, and base_url
-                # Build a Pydantic args schema for better typing/validation
-                # Map OpenAPI basic types to Python types
-                def _map_openapi_type(t: str):
-                    t = (t or "").lower()
-                    if t == "integer":
-                        return int
-                    if t == "number":
-                        return float
-                    if t == "boolean":
-                        return bool
-                    if t == "array":
-                        return List[Any]
-                    if t == "object":
-                        return Dict[str, Any]
-                    return str
-
-                args_fields: Dict[str, Any] = {}
-                for param in parameters:
-                    name = param.get("name")
-                    if not name:
-                        continue
-                    required = bool(param.get("required", False))
-                    schema = param.get("schema", {}) or {}
-                    inferred_type = _map_openapi_type(schema.get("type"))
-                    if param.get("in") == "path" and (name.lower().endswith("id") or inferred_type is int):
-                        inferred_type = int
-
-                    default = ... if required else None
-                    if not required and inferred_type is not Any and inferred_type is not List[Any] and inferred_type is not Dict[str, Any]:
-                        args_fields[name] = (
-                            Optional[inferred_type], default)
-                    else:
-                        args_fields[name] = (inferred_type, default)
-
-                ArgsModel: BaseModel
-                if args_fields:
-                    model_name = f"{self.api_name}_{op_id}_Args"
-                    # pydantic create_model will handle Optional/required semantics via default
-                    ArgsModel = create_model(
-                        model_name, **args_fields)  # type: ignore
-                else:
-                    # Fallback empty model
-                    ArgsModel = create_model(
-                        f"{self.api_name}_{op_id}_Args")  # type: ignore
-
-                def make_handler(p=path, m=method, b=base_url, c_name=self.connection_name):
-                    def handler(**kwargs):
-                        """
-                        Dynamic handler that forwards the request to the real API.
-                        accepts **kwargs for dynamic arguments.
-                        """
-                        # Unwrap if the arguments are nested in a 'kwargs' key
-                        if len(kwargs) == 1 and 'kwargs' in kwargs:
-                            kwargs = kwargs['kwargs']
-
-                        # auth injection
-                        try:
-                            headers = get_auth_headers(c_name)
-                        except ValueError:
-                            logger.warning(
-                                f"No credentials found for {c_name}, proceeding without auth.")
-                            headers = {}
-
-                        # URL Construction
-                        url = f"{b}{p}"
-
-                        # Track which kwargs are used for path params
-                        path_params_used = set()
-                        for key, value in list(kwargs.items()):
-                            placeholder = f"{{{key}}}"
-                            if placeholder in url:
-                                if isinstance(value, float):
-                                    if value.is_integer():
-                                        value = int(value)
-                                        kwargs[key] = value
-                                    else:
-                                        return f"Invalid value for path parameter '{key}': non-integer float {value}"
-
-                                url = url.replace(placeholder, str(value))
-                                path_params_used.add(key)
-
-                        logger.info(f"Executing {m.upper()} {url}")
-
-                        try:
-                            if m.lower() == "get":
-                                # For GET, remaining kwargs (not used in path) go to Query Params
-                                query_params = {
-                                    k: v for k, v in kwargs.items() if k not in path_params_used}
-                                resp = requests.get(
-                                    url, params=query_params, headers=headers)
-                            else:
-                                # For POST/PUT, kwargs go to Body (JSON)
-                                resp = requests.post(
-                                    url, json=kwargs, headers=headers)
+        if chunk:
+            yield chunk
 
-                            if resp.status_code >= 400:
-                                logger.error(
-                                    f"API Error {resp.status_code}: {resp.text}")
-                                return f"Error {resp.status_code}: {resp.text}"
+        logger.info(
+            f"Successfully registered {tool_count} tools for {self.api_name}")
 
-                            return resp.json()
-                        except Exception as e:
-                            return f"Connection Failed: {str(e)}"
+    def load_compiled(self, compiled: Dict[str, Any]) -> List[OperationRecord]:
+        """Builds the operation records from an already compiled spec (no fetch, no parse)."""
+        self.compiled = compiled
+        self.operations_total = len(compiled["operations"])
+        key = ensure_ir(compiled)
+        self._operations = [self._record(op, key) for op in compiled["operations"]]
+        return self._operations
 
-                    return handler
+    def _record(self, op: Dict[str, Any], key: str) -> OperationRecord:
+        """
+        Compact, index-only view of a compiled operation. The factory holds
+        the IR key and operation id only, not the operation or this bridge.
+        """
+        arg_names = tuple(dict.fromkeys(
+            f["name"] for f in op["params"] + op["body_fields"]))
+        # everything that ends up in the embedded document or the args schema
+        payload = json.dumps(
+            {"name": op["op_id"], "description": op["description"],
+             "params": op["params"], "body": op["body_fields"]},
+            sort_keys=True
+        )
+        return OperationRecord(
+            name=op["op_id"],
+            connection_id=self.connection_name,
+            description=op["description"],
+            arg_names=arg_names,
+            content_hash=hashlib.sha256(payload.encode()).hexdigest(),
+            factory=partial(materialize_tool, self.api_name, self.spec_url,
+                            self.connection_name, self.cache_ttl, key, op["op_id"])
+        )
+
+    def _build_tool(self, op: Dict[str, Any], base_url: str) -> StructuredTool:
+        """Builds the args model, the HTTP handler and the StructuredTool of one compiled operation."""
+        op_id = op["op_id"]
+        description = op["description"]
+
+        # We use a closure to capture the specific path, method, and base_url
+        # Build a Pydantic args schema for better typing/validation
+        args_fields: Dict[str, Any] = {}
+        for field in op["params"] + op["body_fields"]:
+            name = field["name"]
+            if name in args_fields:
+                continue
+            required = field["required"]
+            inferred_type = _map_openapi_type(field["type"])
+            if field.get("in") == "path" and (name.lower().endswith("id") or inferred_type is int):
+                inferred_type = int
+
+            default = ... if required else None
+            if not required and inferred_type is not Any and inferred_type is not List[Any] and inferred_type is not Dict[str, Any]:
+                args_fields[name] = (
+                    Optional[inferred_type], default)
+            else:
+                args_fields[name] = (inferred_type, default)
+
+        ArgsModel: BaseModel
+        if args_fields:
+            model_name = f"{self.api_name}_{op_id}_Args"
+            # pydantic create_model will handle Optional/required semantics via default
+            ArgsModel = create_model(
+                model_name, **args_fields)  # type: ignore
+        else:
+            # Fallback empty model
+            ArgsModel = create_model(
+                f"{self.api_name}_{op_id}_Args")  # type: ignore
+
+        query_names = {p["name"] for p in op["params"] if p["in"] == "query"}
+        header_names = {p["name"] for p in op["params"] if p["in"] == "header"}
+        form_names = {p["name"] for p in op["params"] if p["in"] == "formData"}
+
+        def make_handler(p=op["path"], m=op["method"], b=base_url, c_name=self.connection_name,
+                         r_schema=op["response_schema"], body_mode=op["body_mode"]):
+            async def handler(**kwargs):
+                """
+                Dynamic handler that forwards the request to the real API.
+                accepts **kwargs for dynamic arguments.
+                """
+                # Unwrap if the arguments are nested in a 'kwargs' key
+                if len(kwargs) == 1 and 'kwargs' in kwargs:
+                    kwargs = kwargs['kwargs']
+
+                # auth injection (cached, DB only on a miss)
+                try:
+                    headers = await aget_auth_headers(c_name)
+                except ValueError:
+                    logger.warning(
+                        "No credentials found for %s, proceeding without auth.", c_name)
+                    headers = {}
+
+                # URL Construction
+                url = f"{b}{p}"
+
+                # Track which kwargs are used for path params
+                path_params_used = set()
+                for key, value in list(kwargs.items()):
+                    placeholder = f"{{{key}}}"
+                    if placeholder in url:
+                        if isinstance(value, float):
+                            if value.is_integer():
+                                value = int(value)
+                                kwargs[key] = value
+                            else:
+                                return ToolError(
+                                    f"Invalid value for path parameter '{key}': non-integer float {value}")
 
-                func = make_handler(path, method, base_url)
-                func.__name__ = op_id
-                func.__doc__ = description
+                        url = url.replace(placeholder, str(value))
+                        path_params_used.add(key)
 
-                # converting the python function into a StructuredTool for the Agent
-                lc_tool = StructuredTool.from_function(
-                    func=func,
-                    name=op_id,
-                    description=description,
-                    args_schema=ArgsModel
-                )
-                self._generated_tools.append(lc_tool)
+                logger.info("Executing %s %s", m.upper(), url)
 
-                self.mcp.tool()(func)
-                tool_count += 1
+                client = http_pool.get_client(c_name)
 
-        logger.info(
-            f"Successfully registered {tool_count} tools for {self.api_name}")
+                # declared header parameters are sent as headers
+                for k in header_names:
+                    if kwargs.get(k) is not None:
+                        headers[k] = str(kwargs[k])
+
+                if m.lower() == "get":
+                    # For GET, remaining kwargs (not used in path) go to Query Params
+                    query_params = {
+                        k: v for k, v in kwargs.items()
+                        if k not in path_params_used and k not in header_names and v is not None}
+                    request = client.build_request(
+                        "GET", url, params=query_params, headers=headers)
+                else:
+                    # For POST/PUT/PATCH/DELETE, declared query/header params go
+                    # to the URL/headers and the rest to the Body (JSON, or a
+                    # form for Swagger 2 formData params)
+                    remaining = {
+                        k: v for k, v in kwargs.items() if k not in path_params_used}
+                    query_params = {
+                        k: v for k, v in remaining.items() if k in query_names and v is not None}
+                    body = {
+                        k: v for k, v in remaining.items() if k not in query_names and k not in header_names}
+                    if form_names:
+                        form = {k: v for k, v in body.items() if v is not None}
+                        request = client.build_request(
+                            m.upper(), url, params=query_params, data=form, headers=headers)
+                    else:
+                        if body_mode == "raw":
+                            body = body.get("body")
+                        request = client.build_request(
+                            m.upper(), url, params=query_params, json=body, headers=headers)
+
+                with timed(TOOL_CALL_DURATION, "tool.call", integration=c_name, operation=op_id):
+                    return await self._send(client, request, m, r_schema)
+
+            return handler
+
+        func = make_handler()
+        func.__name__ = op_id
+        func.__doc__ = description
+
+        # converting the python function into a StructuredTool for the Agent
+        lc_tool = StructuredTool.from_function(
+            coroutine=func,
+            name=op_id,
+            description=description,
+            args_schema=ArgsModel,
+            metadata={"connection_id": self.connection_name,
+                      "api_name": self.api_name,
+                      "method": op["method"].lower()}
+        )
+
+        return lc_tool
+
+    async def _send(self, client: httpx.AsyncClient, request: httpx.Request, method: str,
+                    r_schema: Optional[Dict[str, Any]]) -> Any:
+        """
+        Sends the request (through the response cache for GETs if enabled) and
+        shapes the result. Upstream calls go through the integration's guard
+        (rate limit, adaptive concurrency limit, circuit breaker).
+        """
+        try:
+            if method.lower() == "get" and self.cache_ttl > 0:
+                return await self._cached_get(client, request, r_schema)
+
+            async with upstream_guards.get(self.connection_name).call() as outcome:
+                resp = await client.send(request, stream=True)
+                outcome.observe(resp)
+                UPSTREAM_RESPONSES.labels(
+                    integration=self.connection_name, status=str(resp.status_code)).inc()
+                try:
+                    if resp.status_code >= 400:
+                        body = truncate_text(
+                            (await resp.aread()).decode(errors="replace"))
+                        logger.error("API Error %s: %s", resp.status_code, body)
+                        return ToolError(f"Error {resp.status_code}: {body}")
+
+                    # shaped to the key fields / capped arrays
+                    return await read_shaped(resp, r_schema)
+                finally:
+                    await resp.aclose()
+        except UpstreamUnavailable as e:
+            UPSTREAM_RESPONSES.labels(
+                integration=self.connection_name, status="rejected").inc()
+            return ToolError(f"Error: upstream unavailable, {e}")
+        except httpx.TimeoutException as e:
+            UPSTREAM_RESPONSES.labels(
+                integration=self.connection_name, status="timeout").inc()
+            return ToolError(f"Connection Failed: request timed out ({e.__class__.__name__})")
+        except Exception as e:
+            UPSTREAM_RESPONSES.labels(
+                integration=self.connection_name, status="error").inc()
+            return ToolError(f"Connection Failed: {str(e)}")
+
+    async def _cached_get(self, client: httpx.AsyncClient, request: httpx.Request,
+                          r_schema: Optional[Dict[str, Any]]) -> Any:
+        """GET through the response cache (TTL, conditional requests, single-flight)."""
+        key = cache_key(self.connection_name, request.method, str(request.url.copy_with(query=None)),
+                        dict(request.url.params), request.headers)
+
+        async def fetch(conditional: Dict[str, str]):
+            for name, value in conditional.items():
+                request.headers[name] = value
+            async with upstream_guards.get(self.connection_name).call() as outcome:
+                resp = await client.send(request)
+                outcome.observe(resp)
+            UPSTREAM_RESPONSES.labels(
+                integration=self.connection_name, status=str(resp.status_code)).inc()
+            return resp.status_code, resp.headers, resp.content
+
+        status, body = await response_cache.get_or_fetch(key, self.cache_ttl, fetch)
+
+        if status >= 400:
+            text = truncate_text(body.decode(errors="replace"))
+            logger.error("API Error %s: %s", status, text)
+            return ToolError(f"Error {status}: {text}")
+
+        return shape_body(body, r_schema)
+
+    def get_operations(self) -> List[OperationRecord]:
+        """Returns the parsed operation records."""
+        return self._operations
 
     def get_tools(self) -> List[StructuredTool]:
-        """Returns the list of LangChain-compatible tools."""
-        return self._generated_tools
+        """Builds and returns every tool as a LangChain-compatible tool."""
+        return [record.factory() for record in self._operations]
 
     def start(self):
-        """Starts the MCP server."""
+        """
+        Registers every operation on a dedicated stdio MCP server and starts it.
+        The API serves all integrations on one endpoint instead (app/services/mcp_gateway.py).
+        """
+        self.mcp = FastMCP(self.api_name)
+        for lc_tool in self.get_tools():
+            self.mcp.tool(name=lc_tool.name, description=lc_tool.description)(
+                lc_tool.coroutine)
         logger.info(f"Starting MCP Server for {self.api_name}...")
         self.mcp.run()
+
+
+def materialize_tool(api_name: str, spec_url: str, connection_name: str, cache_ttl: int,
+                     key: str, op_id: str) -> StructuredTool:
+    """Builds the tool of one operation, reading it back from the compiled spec (OperationRecord.factory)."""
+    base_url, op = load_operation(key, op_id)
+    bridge = OpenAPIMCPBridge(api_name, spec_url, connection_name, cache_ttl)
+    return bridge._build_tool(op, base_url)
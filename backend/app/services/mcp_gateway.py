@@ -0,0 +1,130 @@
+import os
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Dict, List, Optional, Set
+
+from app.services.ingestion import maybe_sync_registry
+from app.services.result_shaper import ToolError, format_tool_output
+from app.services.tool_registry import ToolRegistry
+from app.utils.logger import get_logger
+
+logger = get_logger("MCP_Gateway")
+
+try:
+    import mcp.types as types
+    from mcp.server.lowlevel import Server
+    from mcp.server.streamable_http_manager import StreamableHTTPSessionManager
+    MCP_HTTP_AVAILABLE = True
+except ImportError:
+    MCP_HTTP_AVAILABLE = False
+
+MCP_GATEWAY_ENABLED = os.getenv("MCP_GATEWAY_ENABLED", "true").lower() == "true"
+# upper bound of a tools/list answer; clients narrow it down with filters
+MCP_MAX_LISTED_TOOLS = int(os.getenv("MCP_MAX_LISTED_TOOLS", "100"))
+
+
+def _client_filters(request: Any) -> Dict[str, Any]:
+    """
+    Per-client tool filter from the HTTP request that carried tools/list:
+    ?integrations=a,b (or X-MCP-Integrations), ?query=... and ?limit=N.
+    """
+    filters: Dict[str, Any] = {"integrations": None, "query": None, "limit": MCP_MAX_LISTED_TOOLS}
+    if request is None:
+        return filters
+
+    params = getattr(request, "query_params", {}) or {}
+    headers = getattr(request, "headers", {}) or {}
+
+    integrations = params.get("integrations") or headers.get("x-mcp-integrations")
+    if integrations:
+        filters["integrations"] = {i.strip() for i in integrations.split(",") if i.strip()}
+    filters["query"] = params.get("query") or headers.get("x-mcp-query")
+    try:
+        filters["limit"] = max(1, min(int(params.get("limit", MCP_MAX_LISTED_TOOLS)), MCP_MAX_LISTED_TOOLS))
+    except ValueError:
+        pass
+    return filters
+
+
+class MCPGateway:
+    """
+    One MCP server (streamable HTTP) for every registered integration.
+    Tools come from the shared ToolRegistry, so calls reuse its pooled HTTP
+    clients, the credential cache and the upstream guards; nothing is
+    parsed or registered per integration.
+    """
+
+    def __init__(self, registry: ToolRegistry):
+        self.registry = registry
+        self.enabled = MCP_GATEWAY_ENABLED and MCP_HTTP_AVAILABLE
+        self.session_manager = None
+
+        if MCP_GATEWAY_ENABLED and not MCP_HTTP_AVAILABLE:
+            logger.warning(
+                "MCP gateway disabled: the installed 'mcp' package has no streamable HTTP support")
+        if not self.enabled:
+            return
+
+        self.server = Server("integration-agent")
+        self.server.list_tools()(self._list_tools)
+        self.server.call_tool()(self._call_tool)
+        self.session_manager = StreamableHTTPSessionManager(app=self.server)
+
+    def _request(self) -> Any:
+        try:
+            return getattr(self.server.request_context, "request", None)
+        except LookupError:
+            return None
+
+    async def _list_tools(self) -> List["types.Tool"]:
+        # integrations added or changed through another worker
+        await maybe_sync_registry(self.registry)
+        filters = _client_filters(self._request())
+        integrations: Optional[Set[str]] = filters["integrations"]
+        limit = filters["limit"]
+
+        if filters["query"]:
+            tools = await self.registry.asearch_tools(filters["query"], k=limit)
+            if integrations:
+                tools = [t for t in tools
+                         if (t.metadata or {}).get("connection_id") in integrations]
+        else:
+            names = [record.name for record in self.registry.operations(integrations)][:limit]
+            tools = self.registry.get_tools(names)
+
+        tools += self.registry.get_tools(self.registry.builtin_tool_names())
+
+        return [
+            types.Tool(
+                name=tool.name,
+                description=tool.description or "",
+                inputSchema=tool.args_schema.model_json_schema() if tool.args_schema
+                else {"type": "object", "properties": {}}
+            )
+            for tool in tools
+        ]
+
+    async def _call_tool(self, name: str, arguments: Dict[str, Any]) -> List["types.TextContent"]:
+        await maybe_sync_registry(self.registry)
+        tools = self.registry.get_tools([name])
+        if not tools:
+            raise ValueError(f"Unknown tool '{name}'")
+
+        result = await tools[0].ainvoke(arguments or {})
+        if isinstance(result, ToolError):
+            # the server answers with isError=True, so clients see the failure
+            raise RuntimeError(result)
+        return [types.TextContent(type="text", text=format_tool_output(result))]
+
+    async def handle(self, scope, receive, send):
+        """ASGI entry point, mounted at /mcp."""
+        await self.session_manager.handle_request(scope, receive, send)
+
+    @asynccontextmanager
+    async def run(self) -> AsyncIterator[None]:
+        """Runs the session manager for the lifetime of the app."""
+        if not self.enabled:
+            yield
+            return
+        async with self.session_manager.run():
+            logger.info("MCP gateway listening on /mcp (streamable HTTP)")
+            yield
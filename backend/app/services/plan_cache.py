@@ -0,0 +1,258 @@
+import os
+import re
+import uuid
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+from langchain_core.messages import AIMessage, BaseMessage, HumanMessage, ToolMessage
+
+from app.services.embeddings import normalize_query
+from app.utils.logger import get_logger
+from app.utils.metrics import PLAN_CACHE_LOOKUPS, PLAN_CACHE_SAVED_SECONDS
+
+logger = get_logger("Plan_Cache")
+
+# opt-in: a false hit answers without the LLM ever seeing the request
+PLAN_CACHE_ENABLED = os.getenv("PLAN_CACHE_ENABLED", "false").lower() == "true"
+PLAN_CACHE_SIZE = int(os.getenv("PLAN_CACHE_SIZE", "512"))
+# cosine similarity of the request templates; conservative on purpose,
+# a false hit calls the wrong tool without the LLM ever looking at it
+PLAN_CACHE_THRESHOLD = float(os.getenv("PLAN_CACHE_THRESHOLD", "0.95"))
+
+# values that change between otherwise identical requests:
+# quoted strings, UUIDs and tokens containing a digit ("12", "ord_881")
+SLOT_PATTERN = re.compile(
+    r"\"([^\"]+)\"|'([^']+)'|\b([0-9a-fA-F]{8}-[0-9a-fA-F-]{27})\b|\b(\w*\d\w*)\b")
+SLOT_TOKEN = "slot"
+# replaying skips the LLM, so only calls without side effects are cached
+PLAN_SAFE_METHODS = {"get", "head"}
+
+
+def make_template(text: str) -> Tuple[str, List[str]]:
+    """
+    'get pet 12' -> ('get pet slot', ['12']). The template is what is
+    embedded, the slots are bound to the tool arguments.
+    """
+    slots: List[str] = []
+
+    def replace(match: re.Match) -> str:
+        slots.append(next(g for g in match.groups() if g is not None))
+        return f" {SLOT_TOKEN} "
+
+    return normalize_query(SLOT_PATTERN.sub(replace, text)), slots
+
+
+def replayable(tool: Any) -> bool:
+    """True for tools of read-only HTTP operations (see PLAN_SAFE_METHODS)."""
+    return (getattr(tool, "metadata", None) or {}).get("method") in PLAN_SAFE_METHODS
+
+
+class Plan:
+    __slots__ = ("template", "vector", "slot_count", "calls", "anchors", "fixed_slots")
+
+    def __init__(self, template: str, vector: np.ndarray, slot_count: int,
+                 calls: List[Dict[str, Any]], anchors: List[str], fixed_slots: Dict[int, str]):
+        self.template = template
+        self.vector = vector
+        self.slot_count = slot_count
+        # [{"name": tool, "args": {arg: {"slot": i, "type": "int"} | {"value": v}}}]
+        self.calls = calls
+        # constant argument values that were spelled out in the request;
+        # a new request must contain them too ("status sold" != "status pending")
+        self.anchors = anchors
+        # slot values no argument consumed ("invoice 12 for 2023": 2023) must
+        # match verbatim, otherwise the replay would silently drop them
+        self.fixed_slots = fixed_slots
+
+    def matches(self, normalized: str, slots: List[str]) -> bool:
+        return self.slot_count == len(slots) \
+            and all(slots[i] == value for i, value in self.fixed_slots.items()) \
+            and all(_contains(normalized, anchor) for anchor in self.anchors)
+
+
+def _contains(normalized: str, phrase: str) -> bool:
+    return bool(phrase) and f" {phrase} " in f" {normalized} "
+
+
+def _bind_value(value: Any, slots: List[str], normalized: str) -> Tuple[Dict[str, Any], Optional[str]]:
+    """Maps one argument value to a slot reference or a constant (plus its anchor word)."""
+    if isinstance(value, (str, int, float)) and not isinstance(value, bool):
+        text = str(int(value)) if isinstance(value, float) and value.is_integer() else str(value)
+        if text in slots:
+            return {"slot": slots.index(text), "type": type(value).__name__}, None
+
+    anchor = None
+    if isinstance(value, str) and _contains(normalized, normalize_query(value)):
+        anchor = normalize_query(value)
+    return {"value": value}, anchor
+
+
+def _convert(raw: str, type_name: str) -> Any:
+    try:
+        if type_name == "int":
+            return int(raw)
+        if type_name == "float":
+            return float(raw)
+    except ValueError:
+        pass
+    return raw
+
+
+class PlanCache:
+    """
+    Request template -> tool calls learned from successful turns.
+    Lookups compare template embeddings (cosine, PLAN_CACHE_THRESHOLD) and
+    bind the new request's slot values into the learned arguments.
+    Bounded LRU.
+    """
+
+    def __init__(self, embeddings: Embeddings, max_entries: int = PLAN_CACHE_SIZE,
+                 threshold: float = PLAN_CACHE_THRESHOLD):
+        self.embeddings = embeddings
+        self.max_entries = max_entries
+        self.threshold = threshold
+
+        self._plans: "OrderedDict[str, Plan]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._stats = {"hits": 0, "misses": 0, "learned": 0,
+                       "fallbacks": 0, "evictions": 0}
+        # moving average of one reasoner LLM call, to estimate what a hit saves
+        self._llm_seconds = 0.0
+
+    async def _vector(self, template: str) -> np.ndarray:
+        vector = np.asarray(await self.embeddings.aembed_query(template), dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    async def lookup(self, text: str) -> Optional[AIMessage]:
+        """Returns a ready-to-execute AIMessage with tool calls, or None."""
+        template, slots = make_template(text)
+        plan = None
+
+        with self._lock:
+            plan = self._plans.get(template)
+            # an exact template hit skips the similarity threshold, which is
+            # only safe when the template's slots are all bound to arguments
+            if plan is not None and plan.fixed_slots:
+                plan = None
+            candidates = list(self._plans.values()) if plan is None else []
+
+        if plan is None and candidates:
+            vector = await self._vector(template)
+            scores = np.stack([c.vector for c in candidates]) @ vector
+            best = int(np.argmax(scores))
+            if scores[best] >= self.threshold:
+                plan = candidates[best]
+
+        normalized = normalize_query(text)
+        if plan is None or not plan.matches(normalized, slots):
+            self._count("misses")
+            PLAN_CACHE_LOOKUPS.labels(result="miss").inc()
+            return None
+
+        with self._lock:
+            if plan.template in self._plans:
+                self._plans.move_to_end(plan.template)
+            self._stats["hits"] += 1
+            saved = 2 * self._llm_seconds
+
+        PLAN_CACHE_LOOKUPS.labels(result="hit").inc()
+        PLAN_CACHE_SAVED_SECONDS.inc(saved)
+        logger.info("Plan cache hit for template '%s'", plan.template)
+
+        tool_calls = []
+        for call in plan.calls:
+            args = {
+                name: _convert(slots[spec["slot"]], spec["type"]) if "slot" in spec else spec["value"]
+                for name, spec in call["args"].items()
+            }
+            tool_calls.append({"name": call["name"], "args": args,
+                               "id": f"plan_{uuid.uuid4().hex[:12]}"})
+        return AIMessage(content="", tool_calls=tool_calls,
+                         additional_kwargs={"plan_template": plan.template})
+
+    async def learn(self, turn: List[BaseMessage], safe_tools: Set[str]):
+        """
+        Stores the plan of a turn that went user -> one tool-calling step ->
+        successful tool results -> final answer. Anything else is ignored,
+        as are plans calling tools outside 'safe_tools' (see replayable)
+        or with argument values that don't come from the request text.
+        The caller only passes the first turn of a thread: a follow-up
+        ("yes, delete it") depends on context the template doesn't carry.
+        """
+        if len(turn) < 4 or not isinstance(turn[0], HumanMessage):
+            return
+        request, decision, results, answer = turn[0], turn[1], turn[2:-1], turn[-1]
+
+        if not isinstance(decision, AIMessage) or not decision.tool_calls:
+            return
+        if not isinstance(answer, AIMessage) or answer.tool_calls:
+            return
+        if any(call["name"] not in safe_tools for call in decision.tool_calls):
+            return
+        if len(results) != len(decision.tool_calls) or any(
+                not isinstance(m, ToolMessage) or m.status == "error" for m in results):
+            return
+
+        text = str(request.content)
+        template, slots = make_template(text)
+        normalized = normalize_query(text)
+
+        calls = []
+        anchors = set()
+        bound = set()
+        for call in decision.tool_calls:
+            args = {}
+            for name, value in (call.get("args") or {}).items():
+                spec, anchor = _bind_value(value, slots, normalized)
+                if "value" in spec and anchor is None:
+                    # a constant the LLM took from elsewhere (context, its own default)
+                    return
+                args[name] = spec
+                if anchor:
+                    anchors.add(anchor)
+                if "slot" in spec:
+                    bound.add(spec["slot"])
+            calls.append({"name": call["name"], "args": args})
+
+        fixed_slots = {i: value for i, value in enumerate(slots) if i not in bound}
+        plan = Plan(template, await self._vector(template), len(slots), calls,
+                    sorted(anchors), fixed_slots)
+
+        with self._lock:
+            self._plans[template] = plan
+            self._plans.move_to_end(template)
+            self._stats["learned"] += 1
+            while len(self._plans) > self.max_entries:
+                self._plans.popitem(last=False)
+                self._stats["evictions"] += 1
+
+    def forget(self, template: str):
+        """Drops a plan whose cached execution failed."""
+        with self._lock:
+            self._plans.pop(template, None)
+            self._stats["fallbacks"] += 1
+        PLAN_CACHE_LOOKUPS.labels(result="fallback").inc()
+
+    def observe_llm_latency(self, seconds: float):
+        with self._lock:
+            self._llm_seconds = seconds if not self._llm_seconds else \
+                0.9 * self._llm_seconds + 0.1 * seconds
+
+    def _count(self, name: str):
+        with self._lock:
+            self._stats[name] += 1
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self._stats["hits"] + self._stats["misses"]
+            return {
+                **self._stats,
+                "size": len(self._plans),
+                "max_size": self.max_entries,
+                "hit_rate": round(self._stats["hits"] / lookups, 3) if lookups else 0.0,
+                "avg_llm_seconds": round(self._llm_seconds, 3),
+            }
@@ -0,0 +1,301 @@
+import os
+import time
+import asyncio
+import threading
+from contextlib import asynccontextmanager
+from email.utils import parsedate_to_datetime
+from typing import Any, AsyncIterator, Dict, Optional
+
+import httpx
+
+from app.utils.logger import get_logger
+
+logger = get_logger("Resilience")
+
+# token bucket per integration; 0 disables the rate limit (Retry-After is still honored)
+UPSTREAM_RATE_LIMIT = float(os.getenv("UPSTREAM_RATE_LIMIT", "0"))
+UPSTREAM_BURST = int(os.getenv("UPSTREAM_BURST", "20"))
+# longest a call may wait for a token / a concurrency slot before failing fast
+UPSTREAM_MAX_WAIT = float(os.getenv("UPSTREAM_MAX_WAIT", "5"))
+# pause after a 429 without Retry-After
+UPSTREAM_DEFAULT_BACKOFF = float(os.getenv("UPSTREAM_DEFAULT_BACKOFF", "1"))
+
+# adaptive (AIMD) concurrency limit
+UPSTREAM_MIN_CONCURRENCY = int(os.getenv("UPSTREAM_MIN_CONCURRENCY", "1"))
+UPSTREAM_MAX_CONCURRENCY = int(os.getenv("UPSTREAM_MAX_CONCURRENCY", "32"))
+UPSTREAM_INITIAL_CONCURRENCY = int(os.getenv("UPSTREAM_INITIAL_CONCURRENCY", "8"))
+# a call slower than baseline * tolerance counts as a congestion signal
+UPSTREAM_LATENCY_TOLERANCE = float(os.getenv("UPSTREAM_LATENCY_TOLERANCE", "2.0"))
+
+# circuit breaker
+CIRCUIT_FAILURE_THRESHOLD = int(os.getenv("CIRCUIT_FAILURE_THRESHOLD", "5"))
+CIRCUIT_RESET_TIMEOUT = float(os.getenv("CIRCUIT_RESET_TIMEOUT", "30"))
+
+OVERLOAD_STATUSES = {429, 502, 503, 504}
+
+
+class UpstreamUnavailable(Exception):
+    """Raised instead of calling an upstream that is known to be unhealthy or saturated."""
+
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """Seconds from a Retry-After header (delta-seconds or HTTP date)."""
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+class TokenBucket:
+    """Requests per second with bursts; can be paused until a Retry-After deadline."""
+
+    def __init__(self, rate: float = UPSTREAM_RATE_LIMIT, burst: int = UPSTREAM_BURST):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = float(burst)
+        self.updated = time.monotonic()
+        self.paused_until = 0.0
+
+    def _refill(self, now: float):
+        if self.rate > 0:
+            self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def reserve(self) -> float:
+        """Takes a token and returns how long the caller must wait for it."""
+        now = time.monotonic()
+        self._refill(now)
+        wait = max(0.0, self.paused_until - now)
+        if self.rate > 0:
+            self.tokens -= 1
+            if self.tokens < 0:
+                wait = max(wait, -self.tokens / self.rate)
+        return wait
+
+    def refund(self):
+        if self.rate > 0:
+            self.tokens = min(self.burst, self.tokens + 1)
+
+    def pause(self, seconds: float):
+        self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+
+
+class AdaptiveLimiter:
+    """
+    AIMD concurrency limit: +1/limit per healthy call, halved on overload
+    (429/5xx/timeouts) and reduced by 10% when latency exceeds the baseline.
+    """
+
+    def __init__(self, initial: int = UPSTREAM_INITIAL_CONCURRENCY,
+                 minimum: int = UPSTREAM_MIN_CONCURRENCY, maximum: int = UPSTREAM_MAX_CONCURRENCY):
+        self.minimum = minimum
+        self.maximum = maximum
+        self.limit = float(max(minimum, min(initial, maximum)))
+        self.in_flight = 0
+        # slow-moving estimate of a healthy call's latency
+        self.baseline: Optional[float] = None
+        self._condition: Optional[asyncio.Condition] = None
+
+    def _cond(self) -> asyncio.Condition:
+        if self._condition is None:
+            self._condition = asyncio.Condition()
+        return self._condition
+
+    async def acquire(self, timeout: float):
+        condition = self._cond()
+        async with condition:
+            await asyncio.wait_for(
+                condition.wait_for(lambda: self.in_flight < int(self.limit)), timeout)
+            self.in_flight += 1
+
+    async def release(self, latency: float, overloaded: bool):
+        if overloaded:
+            self.limit = max(self.minimum, self.limit / 2)
+        elif self.baseline is not None and latency > self.baseline * UPSTREAM_LATENCY_TOLERANCE:
+            self.limit = max(self.minimum, self.limit * 0.9)
+        else:
+            self.limit = min(self.maximum, self.limit + 1 / self.limit)
+
+        if not overloaded:
+            self.baseline = latency if self.baseline is None else \
+                0.95 * self.baseline + 0.05 * latency
+
+        await self.discard()
+
+    async def discard(self):
+        """Frees the slot of a call that says nothing about the upstream (cancelled, client bug)."""
+        condition = self._cond()
+        async with condition:
+            self.in_flight -= 1
+            condition.notify_all()
+
+
+class CircuitBreaker:
+    """closed -> open after N consecutive failures -> half-open probe after a timeout."""
+
+    def __init__(self, threshold: int = CIRCUIT_FAILURE_THRESHOLD, reset_timeout: float = CIRCUIT_RESET_TIMEOUT):
+        self.threshold = threshold
+        self.reset_timeout = reset_timeout
+        self.state = "closed"
+        self.failures = 0
+        self.opened_at = 0.0
+        self.probing = False
+
+    def allow(self) -> bool:
+        if self.state == "closed":
+            return True
+        if self.state == "open" and time.monotonic() - self.opened_at >= self.reset_timeout:
+            self.state = "half_open"
+        if self.state == "half_open" and not self.probing:
+            # a single trial call decides whether to close again
+            self.probing = True
+            return True
+        return False
+
+    def record(self, ok: bool):
+        self.probing = False
+        if ok:
+            self.state = "closed"
+            self.failures = 0
+            return
+        self.failures += 1
+        if self.state == "half_open" or self.failures >= self.threshold:
+            if self.state != "open":
+                logger.warning("Circuit opened after %d failures", self.failures)
+            self.state = "open"
+            self.opened_at = time.monotonic()
+
+
+class CallOutcome:
+    __slots__ = ("status", "retry_after")
+
+    def __init__(self):
+        self.status: Optional[int] = None
+        self.retry_after: Optional[float] = None
+
+    def observe(self, resp: httpx.Response):
+        self.status = resp.status_code
+        self.retry_after = parse_retry_after(resp.headers.get("Retry-After"))
+
+
+class UpstreamGuard:
+    """Rate limit, adaptive concurrency limit and circuit breaker of one integration."""
+
+    def __init__(self, connection_id: str):
+        self.connection_id = connection_id
+        self.bucket = TokenBucket()
+        self.limiter = AdaptiveLimiter()
+        self.breaker = CircuitBreaker()
+        self.stats = {"calls": 0, "failures": 0, "rejected": 0, "throttled": 0}
+
+    @asynccontextmanager
+    async def call(self) -> AsyncIterator[CallOutcome]:
+        """
+        Wraps one upstream request. Raises UpstreamUnavailable without
+        calling the API when the circuit is open or the wait would be too long.
+        The body should call outcome.observe(resp) once the response arrived.
+        """
+        if not self.breaker.allow():
+            self.stats["rejected"] += 1
+            raise UpstreamUnavailable(
+                f"{self.connection_id} is failing, calls are paused for up to {self.breaker.reset_timeout:.0f}s")
+
+        wait = self.bucket.reserve()
+        if wait > UPSTREAM_MAX_WAIT:
+            self.bucket.refund()
+            self.breaker.probing = False
+            self.stats["rejected"] += 1
+            raise UpstreamUnavailable(
+                f"{self.connection_id} is rate limited, retry in {wait:.0f}s")
+        if wait > 0:
+            self.stats["throttled"] += 1
+            await asyncio.sleep(wait)
+
+        try:
+            await self.limiter.acquire(UPSTREAM_MAX_WAIT)
+        except asyncio.TimeoutError:
+            self.breaker.probing = False
+            self.stats["rejected"] += 1
+            raise UpstreamUnavailable(
+                f"{self.connection_id} has too many calls in flight ({self.limiter.in_flight})")
+
+        outcome = CallOutcome()
+        start = time.monotonic()
+        failed = False
+        try:
+            yield outcome
+        except (httpx.TransportError, OSError):
+            # timeouts, refused/reset connections
+            failed = True
+            raise
+        finally:
+            if outcome.status is None and not failed:
+                # no response and no transport error: cancelled or broken
+                # before the request went out, so neither health nor latency
+                await self._abandon()
+            else:
+                await self._settle(outcome, failed, time.monotonic() - start)
+
+    async def _settle(self, outcome: CallOutcome, failed: bool, latency: float):
+        overloaded = failed or outcome.status in OVERLOAD_STATUSES
+        failed = overloaded or (outcome.status or 0) >= 500
+
+        if outcome.status == 429 or outcome.retry_after:
+            self.bucket.pause(outcome.retry_after or UPSTREAM_DEFAULT_BACKOFF)
+
+        self.stats["calls"] += 1
+        if failed:
+            self.stats["failures"] += 1
+        self.breaker.record(not failed)
+        await self.limiter.release(latency, overloaded)
+
+    async def _abandon(self):
+        # a half-open probe that never reached the API lets the next call probe
+        self.breaker.probing = False
+        await self.limiter.discard()
+
+    def state(self) -> Dict[str, Any]:
+        now = time.monotonic()
+        return {
+            "circuit": self.breaker.state,
+            "consecutive_failures": self.breaker.failures,
+            "concurrency_limit": round(self.limiter.limit, 2),
+            "in_flight": self.limiter.in_flight,
+            "latency_baseline_ms": round(self.limiter.baseline * 1000, 1) if self.limiter.baseline else None,
+            "rate_limit": self.bucket.rate or None,
+            "paused_for_seconds": round(max(0.0, self.bucket.paused_until - now), 1),
+            **self.stats,
+        }
+
+
+class UpstreamGuards:
+    """One UpstreamGuard per connection_id, created on first use."""
+
+    def __init__(self):
+        self._guards: Dict[str, UpstreamGuard] = {}
+        self._lock = threading.Lock()
+
+    def get(self, connection_id: str) -> UpstreamGuard:
+        with self._lock:
+            guard = self._guards.get(connection_id)
+            if guard is None:
+                guard = UpstreamGuard(connection_id)
+                self._guards[connection_id] = guard
+            return guard
+
+    def state(self, connection_id: Optional[str] = None) -> Dict[str, Any]:
+        with self._lock:
+            guards = dict(self._guards)
+        if connection_id is not None:
+            guard = guards.get(connection_id)
+            return {connection_id: guard.state()} if guard else {}
+        return {cid: guard.state() for cid, guard in guards.items()}
+
+
+upstream_guards = UpstreamGuards()
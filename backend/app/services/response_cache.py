@@ -0,0 +1,203 @@
+import os
+import time
+import asyncio
+import hashlib
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable, Dict, Mapping, Optional, Tuple
+
+from app.utils.logger import get_logger
+
+logger = get_logger("Response_Cache")
+
+RESPONSE_CACHE_SIZE = int(os.getenv("RESPONSE_CACHE_SIZE", "1024"))
+# larger bodies are served but never stored
+RESPONSE_CACHE_MAX_BODY = int(os.getenv("RESPONSE_CACHE_MAX_BODY", str(256 * 1024)))
+
+# (status_code, headers, body) as returned by the fetch callback;
+# headers must be case-insensitive (httpx.Headers)
+FetchResult = Tuple[int, Mapping[str, str], bytes]
+
+# added by the cache itself when revalidating, not part of the key
+CONDITIONAL_HEADERS = {"if-none-match", "if-modified-since"}
+
+
+class _Abandoned(Exception):
+    """Set on an in-flight call whose leader was cancelled; waiters retry."""
+
+
+@dataclass
+class CachedResponse:
+    status: int
+    body: bytes
+    expires_at: float
+    etag: Optional[str] = None
+    last_modified: Optional[str] = None
+
+
+def cache_key(connection_id: str, method: str, url: str,
+              params: Dict[str, Any], headers: Mapping[str, str]) -> str:
+    """
+    Key of a GET call: integration, method, resolved URL, sorted query
+    params and a hash of the request headers. The headers carry the
+    credentials (whatever the auth header is called) and header parameters
+    set from tool arguments, so neither users nor argument values share entries.
+    """
+    sent = "\n".join(
+        f"{name.lower()}:{value}" for name, value in sorted(headers.items(), key=lambda h: h[0].lower())
+        if name.lower() not in CONDITIONAL_HEADERS)
+    header_hash = hashlib.sha256(sent.encode()).hexdigest()[:16]
+    query = "&".join(f"{k}={params[k]}" for k in sorted(params))
+    raw = f"{connection_id}|{method.upper()}|{url}|{query}|{header_hash}"
+    # prefixed, so invalidate() can find an integration's entries
+    return f"{connection_id}:{hashlib.sha256(raw.encode()).hexdigest()}"
+
+
+def freshness(headers: Mapping[str, str], ttl: float) -> Optional[float]:
+    """
+    Seconds a response may be served from cache, honoring Cache-Control.
+    None means it must not be stored at all.
+    """
+    cache_control = (headers.get("Cache-Control") or "").lower()
+    directives = [d.strip() for d in cache_control.split(",") if d.strip()]
+
+    if "no-store" in directives:
+        return None
+    if "no-cache" in directives:
+        # store for revalidation only
+        return 0.0
+    for directive in directives:
+        if directive.startswith("max-age="):
+            try:
+                return min(ttl, float(directive.split("=", 1)[1]))
+            except ValueError:
+                pass
+    return ttl
+
+
+class ResponseCache:
+    """
+    Opt-in TTL cache for idempotent GET tool calls.
+    LRU-bounded, revalidates stale entries with ETag/Last-Modified and
+    coalesces concurrent identical calls into one upstream request.
+    """
+
+    def __init__(self, max_entries: int = RESPONSE_CACHE_SIZE, max_body: int = RESPONSE_CACHE_MAX_BODY):
+        self.max_entries = max_entries
+        self.max_body = max_body
+
+        self._entries: "OrderedDict[str, CachedResponse]" = OrderedDict()
+        self._inflight: Dict[str, asyncio.Future] = {}
+        self._lock = threading.Lock()
+        self._stats = {"hits": 0, "misses": 0, "revalidated": 0,
+                       "coalesced": 0, "evictions": 0}
+
+    def _count(self, name: str):
+        with self._lock:
+            self._stats[name] += 1
+
+    def _get(self, key: str) -> Optional[CachedResponse]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+            return entry
+
+    def _store(self, key: str, entry: CachedResponse):
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self._stats["evictions"] += 1
+
+    async def get_or_fetch(self, key: str, ttl: float,
+                           fetch: Callable[[Dict[str, str]], Awaitable[FetchResult]]) -> Tuple[int, bytes]:
+        """
+        Returns (status, body) for a GET call. 'fetch' receives extra
+        (conditional) request headers and performs the upstream request.
+        """
+        while True:
+            entry = self._get(key)
+            if entry is not None and entry.expires_at > time.monotonic():
+                self._count("hits")
+                return entry.status, entry.body
+
+            # single-flight: identical calls wait for the request already running
+            inflight = self._inflight.get(key)
+            if inflight is None:
+                break
+            self._count("coalesced")
+            try:
+                return await asyncio.shield(inflight)
+            except _Abandoned:
+                # the caller that ran the request was cancelled, not ours:
+                # one of the waiters takes over
+                continue
+
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+
+        try:
+            result = await self._fetch(key, ttl, entry, fetch)
+            future.set_result(result)
+            return result
+        except asyncio.CancelledError:
+            future.set_exception(_Abandoned())
+            future.exception()
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            # mark as retrieved, waiters (if any) still get the exception
+            future.exception()
+            raise
+        finally:
+            self._inflight.pop(key, None)
+
+    async def _fetch(self, key: str, ttl: float, stale: Optional[CachedResponse],
+                     fetch: Callable[[Dict[str, str]], Awaitable[FetchResult]]) -> Tuple[int, bytes]:
+        conditional = {}
+        if stale is not None:
+            if stale.etag:
+                conditional["If-None-Match"] = stale.etag
+            if stale.last_modified:
+                conditional["If-Modified-Since"] = stale.last_modified
+
+        status, headers, body = await fetch(conditional)
+
+        if status == 304 and stale is not None:
+            self._count("revalidated")
+            fresh_for = freshness(headers, ttl)
+            stale.expires_at = time.monotonic() + (fresh_for or 0.0)
+            return stale.status, stale.body
+
+        self._count("misses")
+
+        fresh_for = freshness(headers, ttl)
+        if status == 200 and fresh_for is not None and len(body) <= self.max_body:
+            self._store(key, CachedResponse(
+                status=status,
+                body=body,
+                expires_at=time.monotonic() + fresh_for,
+                etag=headers.get("ETag"),
+                last_modified=headers.get("Last-Modified")
+            ))
+
+        return status, body
+
+    def invalidate(self, connection_id: str) -> int:
+        """Drops the entries of one integration (its spec or credentials changed)."""
+        prefix = f"{connection_id}:"
+        with self._lock:
+            keys = [key for key in self._entries if key.startswith(prefix)]
+            for key in keys:
+                del self._entries[key]
+        return len(keys)
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {**self._stats, "size": len(self._entries), "max_size": self.max_entries}
+
+
+response_cache = ResponseCache()
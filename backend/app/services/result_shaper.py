@@ -0,0 +1,419 @@
+import os
+import json
+import time
+import asyncio
+import uuid
+import tempfile
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
+from typing import Any, Dict, List, Optional
+
+import httpx
+from langchain_core.tools import StructuredTool
+from pydantic import BaseModel, Field
+from sqlalchemy import delete
+from sqlmodel import Session, col, select
+
+from app.core.database import engine, StoredResult
+from app.utils.logger import get_logger
+
+logger = get_logger("Result_Shaper")
+
+try:
+    import ijson
+    # ijson's errors don't derive from ValueError
+    PARSE_ERRORS = (ValueError, ijson.JSONError)
+except ImportError:
+    ijson = None
+    PARSE_ERRORS = (ValueError,)
+
+# size limits for what a single tool result may put into the LLM context
+RESULT_MAX_ITEMS = int(os.getenv("RESULT_MAX_ITEMS", "20"))
+RESULT_MAX_FIELDS = int(os.getenv("RESULT_MAX_FIELDS", "12"))
+RESULT_MAX_CHARS = int(os.getenv("RESULT_MAX_CHARS", "8000"))
+# bodies above this size are spooled to disk and parsed incrementally
+RESULT_STREAM_THRESHOLD = int(os.getenv("RESULT_STREAM_THRESHOLD", str(1024 * 1024)))
+# entries a worker keeps in memory; the database has all of them
+RESULT_STORE_SIZE = int(os.getenv("RESULT_STORE_SIZE", "256"))
+# stored results (and their spool files) are deleted after this many seconds
+RESULT_STORE_TTL = float(os.getenv("RESULT_STORE_TTL", "3600"))
+# spool files are read by whichever worker serves the follow-up call;
+# point this at a shared volume when workers run on different hosts
+RESULT_STORE_DIR = os.getenv(
+    "RESULT_STORE_DIR", os.path.join(tempfile.gettempdir(), "agent_results"))
+
+STORED_RESULT_TOOL = "get_stored_result"
+
+
+class ToolError(str):
+    """
+    Text result of a failed call (error status, connection failure, bad
+    arguments). The executor marks its ToolMessage with status 'error'.
+    """
+
+
+class ResultStore:
+    """
+    Out-of-band store for full tool payloads that were shaped down before
+    reaching the LLM, shared by all workers through the StoredResult table:
+    small payloads are stored as JSON, large bodies by the path of the file
+    they were spooled to. Each worker keeps a bounded LRU of entries in
+    memory; rows and files expire after RESULT_STORE_TTL.
+    """
+
+    def __init__(self, max_entries: int = RESULT_STORE_SIZE, directory: str = RESULT_STORE_DIR):
+        self.max_entries = max_entries
+        self.directory = directory
+        os.makedirs(self.directory, exist_ok=True)
+
+        # result_id -> ("memory", payload) | ("file", path, field, total)
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        # put() runs on the event loop, rows are written in the background
+        self._writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix="result-store")
+        self._pruned_at = 0.0
+
+    def put(self, payload: Any) -> str:
+        return self._add(("memory", payload))
+
+    def put_file(self, path: str, field: Optional[str], total: int) -> str:
+        """Takes over a spooled body whose items are at 'field' (None: top-level array)."""
+        return self._add(("file", path, field, total))
+
+    def holds(self, path: str) -> bool:
+        with self._lock:
+            return any(entry[0] == "file" and entry[1] == path for entry in self._entries.values())
+
+    def new_file_path(self) -> str:
+        return os.path.join(self.directory, f"{uuid.uuid4().hex}.json")
+
+    def _add(self, entry: tuple) -> str:
+        result_id = uuid.uuid4().hex[:12]
+        self._remember(result_id, entry)
+        self._writer.submit(self._save, result_id, entry)
+        return result_id
+
+    def _remember(self, result_id: str, entry: tuple):
+        with self._lock:
+            self._entries[result_id] = entry
+            self._entries.move_to_end(result_id)
+            while len(self._entries) > self.max_entries:
+                # other workers may still page it, the file goes with its row
+                self._entries.popitem(last=False)
+
+    def _save(self, result_id: str, entry: tuple):
+        if entry[0] == "file":
+            _, path, field, total = entry
+            row = StoredResult(id=result_id, path=path, field=field, total=total, created_at=time.time())
+        else:
+            row = StoredResult(id=result_id, payload=json.dumps(entry[1], default=str), created_at=time.time())
+        try:
+            with Session(engine) as session:
+                session.add(row)
+                session.commit()
+            if time.monotonic() - self._pruned_at > 60:
+                self._prune()
+        except Exception as e:
+            logger.warning("Could not persist stored result %s: %s", result_id, e)
+
+    def _prune(self):
+        """Deletes expired rows and their spool files."""
+        self._pruned_at = time.monotonic()
+        cutoff = time.time() - RESULT_STORE_TTL
+        expired = col(StoredResult.created_at) < cutoff
+        with Session(engine) as session:
+            paths = session.exec(select(StoredResult.path).where(
+                expired, col(StoredResult.path).is_not(None))).all()
+            session.execute(delete(StoredResult).where(expired))
+            session.commit()
+        for path in paths:
+            _remove_quietly(path)
+
+    def get(self, result_id: str) -> Optional[tuple]:
+        with self._lock:
+            entry = self._entries.get(result_id)
+            if entry is not None:
+                self._entries.move_to_end(result_id)
+                return entry
+
+        # stored by another worker
+        with Session(engine) as session:
+            row = session.get(StoredResult, result_id)
+        if row is None or row.created_at < time.time() - RESULT_STORE_TTL:
+            return None
+        if row.path:
+            entry = ("file", row.path, row.field, row.total)
+        else:
+            entry = ("memory", json.loads(row.payload))
+        self._remember(result_id, entry)
+        return entry
+
+    def page(self, result_id: str, offset: int = 0, limit: int = RESULT_MAX_ITEMS,
+             field: Optional[str] = None) -> Any:
+        """Returns items [offset, offset + limit) of a stored array (or of payload[field])."""
+        entry = self.get(result_id)
+        if entry is None:
+            raise KeyError(f"Unknown or expired result_id '{result_id}'")
+
+        if entry[0] == "file":
+            # parsed incrementally, only up to the requested page
+            _, path, stored_field, total = entry
+            field = field or stored_field
+            prefix = f"{field}.item" if field else "item"
+            try:
+                with open(path, "rb") as f:
+                    items = list(islice(ijson.items(f, prefix, use_float=True), offset, offset + limit))
+            except FileNotFoundError:
+                raise KeyError(f"Unknown or expired result_id '{result_id}'")
+            return {"items": items, "offset": offset, "total": total}
+
+        value = entry[1]
+        if field and isinstance(value, dict):
+            value = value.get(field)
+        if isinstance(value, list):
+            return {"items": value[offset:offset + limit], "offset": offset, "total": len(value)}
+        return value
+
+
+def _remove_quietly(path: str):
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+
+result_store = ResultStore()
+
+
+def _projection(schema: Optional[Dict[str, Any]]) -> Optional[List[str]]:
+    """
+    Key fields of an object schema: required ones first, then scalar
+    properties. None means 'keep the object as is'.
+    """
+    if not isinstance(schema, dict):
+        return None
+    properties = schema.get("properties") or {}
+    if len(properties) <= RESULT_MAX_FIELDS:
+        return None
+
+    required = [name for name in schema.get("required", []) if name in properties]
+    scalars = [
+        name for name, prop in properties.items()
+        if name not in required and isinstance(prop, dict)
+        and "$ref" not in prop and prop.get("type") not in ("object", "array")
+    ]
+    rest = [name for name in properties if name not in required and name not in scalars]
+    return (required + scalars + rest)[:RESULT_MAX_FIELDS]
+
+
+def _item_schema(schema: Optional[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+    if isinstance(schema, dict) and schema.get("type") == "array":
+        return schema.get("items")
+    return None
+
+
+def _array_field(schema: Optional[Dict[str, Any]]) -> Optional[str]:
+    """The list property of an envelope object like {"data": [...], "has_more": ...}."""
+    if not isinstance(schema, dict):
+        return None
+    arrays = [name for name, prop in (schema.get("properties") or {}).items()
+              if isinstance(prop, dict) and prop.get("type") == "array"]
+    return arrays[0] if len(arrays) == 1 else None
+
+
+def _project(obj: Any, fields: Optional[List[str]]) -> Any:
+    if fields is None or not isinstance(obj, dict):
+        return obj
+    return {k: obj[k] for k in fields if k in obj}
+
+
+def _cap(value: Any, depth: int = 0) -> Any:
+    """Caps nested arrays that the schema projection didn't cover."""
+    if depth > 3:
+        return value
+    if isinstance(value, list):
+        capped = [_cap(v, depth + 1) for v in value[:RESULT_MAX_ITEMS]]
+        if len(value) > RESULT_MAX_ITEMS:
+            capped.append(f"... {len(value) - RESULT_MAX_ITEMS} more items")
+        return capped
+    if isinstance(value, dict):
+        return {k: _cap(v, depth + 1) for k, v in value.items()}
+    return value
+
+
+def _more_marker(shaped: Dict[str, Any], result_id: str, field: Optional[str] = None) -> Dict[str, Any]:
+    shaped["more_available"] = True
+    shaped["result_id"] = result_id
+    hint = f"Call {STORED_RESULT_TOOL} with result_id, offset and limit"
+    if field:
+        hint += f" and field='{field}'"
+    shaped["hint"] = hint + " for the full data."
+    return shaped
+
+
+def shape_result(payload: Any, schema: Optional[Dict[str, Any]] = None) -> Any:
+    """
+    Reduces an API payload to what the LLM needs: arrays are capped at
+    RESULT_MAX_ITEMS, large objects projected to their key fields. When
+    anything is dropped the full payload goes to the result store and a
+    'more available' marker with its result_id is added.
+    """
+    if isinstance(payload, list):
+        fields = _projection(_item_schema(schema))
+        items = [_cap(_project(item, fields)) for item in payload[:RESULT_MAX_ITEMS]]
+        if len(payload) <= RESULT_MAX_ITEMS and fields is None:
+            return items
+        shaped = {"items": items, "total": len(payload), "returned": len(items)}
+        return _more_marker(shaped, result_store.put(payload))
+
+    if isinstance(payload, dict):
+        field = _array_field(schema)
+        if field and isinstance(payload.get(field), list) and len(payload[field]) > RESULT_MAX_ITEMS:
+            item_fields = _projection(_item_schema((schema.get("properties") or {}).get(field)))
+            shaped = {k: _cap(v) for k, v in payload.items() if k != field}
+            shaped[field] = [_cap(_project(item, item_fields))
+                             for item in payload[field][:RESULT_MAX_ITEMS]]
+            shaped["total"] = len(payload[field])
+            return _more_marker(shaped, result_store.put(payload), field)
+
+        fields = _projection(schema)
+        shaped = _cap(_project(payload, fields))
+        if fields is not None and len(shaped) < len(payload):
+            return _more_marker(shaped, result_store.put(payload))
+        return shaped
+
+    return payload
+
+
+def _shape_file(path: str, schema: Optional[Dict[str, Any]]) -> Any:
+    """
+    Shapes a spooled body, parsing only the first items when ijson is
+    available. The file goes to the result store when items were found,
+    the caller deletes it otherwise.
+    """
+    field = None
+    if isinstance(schema, dict) and schema.get("type") == "object":
+        field = _array_field(schema)
+        item_schema = _item_schema((schema.get("properties") or {}).get(field))
+    else:
+        item_schema = _item_schema(schema)
+
+    if ijson is not None and (field or item_schema is not None):
+        prefix = f"{field}.item" if field else "item"
+        fields = _projection(item_schema)
+        items = []
+        total = 0
+        with open(path, "rb") as f:
+            for item in ijson.items(f, prefix, use_float=True):
+                if total < RESULT_MAX_ITEMS:
+                    items.append(_cap(_project(item, fields)))
+                total += 1
+        if total:
+            shaped = {"items": items, "total": total, "returned": len(items)}
+            return _more_marker(shaped, result_store.put_file(path, field, total), field)
+        # the body doesn't have the shape the schema promised
+
+    with open(path, "rb") as f:
+        payload = json.load(f)
+    return shape_result(payload, schema)
+
+
+async def read_shaped(resp: httpx.Response, schema: Optional[Dict[str, Any]] = None) -> Any:
+    """
+    Reads a streamed response and shapes it. Bodies up to
+    RESULT_STREAM_THRESHOLD are parsed in memory, larger ones are spooled
+    to the result store directory chunk by chunk and parsed from there.
+    """
+    buffer = bytearray()
+    spool = None
+    spool_path = None
+
+    try:
+        async for chunk in resp.aiter_bytes():
+            if spool is not None:
+                spool.write(chunk)
+                continue
+            buffer.extend(chunk)
+            if len(buffer) > RESULT_STREAM_THRESHOLD:
+                spool_path = result_store.new_file_path()
+                spool = open(spool_path, "wb")
+                spool.write(buffer)
+                buffer = bytearray()
+
+        if spool_path is None:
+            return shape_body(bytes(buffer), schema)
+
+        spool.close()
+        logger.info("Large response spooled to disk: %s", spool_path)
+        try:
+            return await asyncio.to_thread(_shape_file, spool_path, schema)
+        except PARSE_ERRORS:
+            # malformed or truncated JSON
+            return await asyncio.to_thread(_read_text, spool_path)
+    finally:
+        if spool is not None:
+            spool.close()
+        # the spool file outlives the call only as a stored result
+        if spool_path is not None and not result_store.holds(spool_path):
+            _remove_quietly(spool_path)
+
+
+def shape_body(body: bytes, schema: Optional[Dict[str, Any]] = None) -> Any:
+    """Shapes a body that is already in memory (e.g. from the response cache)."""
+    try:
+        payload = json.loads(body)
+    except ValueError:
+        return truncate_text(body.decode(errors="replace"))
+
+    return shape_result(payload, schema)
+
+
+def _read_text(path: str) -> str:
+    with open(path, "rb") as f:
+        text = f.read(RESULT_MAX_CHARS + 1).decode(errors="replace")
+    return truncate_text(text)
+
+
+def truncate_text(text: str, limit: int = RESULT_MAX_CHARS) -> str:
+    if len(text) <= limit:
+        return text
+    return f"{text[:limit]}... [truncated {len(text) - limit} chars]"
+
+
+def format_tool_output(result: Any) -> str:
+    """Renders a (shaped) tool result as ToolMessage content."""
+    if isinstance(result, (dict, list)):
+        text = json.dumps(result, default=str, ensure_ascii=False)
+    else:
+        text = str(result)
+    return truncate_text(text)
+
+
+class StoredResultArgs(BaseModel):
+    result_id: str = Field(description="result_id from a truncated tool result")
+    offset: int = Field(default=0, description="index of the first item to return")
+    limit: int = Field(default=RESULT_MAX_ITEMS, description="number of items to return")
+    field: Optional[str] = Field(
+        default=None, description="list field of the stored object, if the hint names one")
+
+
+async def get_stored_result(result_id: str, offset: int = 0, limit: int = RESULT_MAX_ITEMS,
+                            field: Optional[str] = None) -> Any:
+    """Returns more of a tool result that was truncated, page by page."""
+    limit = max(1, min(limit, RESULT_MAX_ITEMS))
+    try:
+        page = await asyncio.to_thread(result_store.page, result_id, offset, limit, field)
+    except KeyError as e:
+        return ToolError(f"Error: {e.args[0]}")
+    return _cap(page)
+
+
+stored_result_tool = StructuredTool.from_function(
+    coroutine=get_stored_result,
+    name=STORED_RESULT_TOOL,
+    description="Fetches more items of a previous tool result that was truncated (has more_available and a result_id).",
+    args_schema=StoredResultArgs,
+    metadata={"connection_id": "builtin"}
+)
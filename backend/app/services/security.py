@@ -1,11 +1,25 @@
 from cryptography.fernet import Fernet
 import os
+import time
+import asyncio
+import threading
 import base64
+from typing import Dict, Optional, Tuple
 from sqlmodel import Session, select
 from app.core.database import engine, Integration
+from app.utils.metrics import AUTH_HEADERS_DURATION, timed
 
 MASTER_KEY = os.getenv("ENCRYPTION_KEY", Fernet.generate_key().decode())
 
+# seconds a decrypted auth header stays in the process-local cache
+CREDENTIAL_CACHE_TTL = float(os.getenv("CREDENTIAL_CACHE_TTL", "300"))
+
+# connection_id -> (expires_at, headers)
+_header_cache: Dict[str, Tuple[float, dict]] = {}
+_cache_lock = threading.Lock()
+_cache_stats = {"hits": 0, "misses": 0, "invalidations": 0}
+_credential_manager: Optional["CredentialManager"] = None
+
 
 class CredentialManager:
     def __init__(self):
@@ -22,11 +36,12 @@ class CredentialManager:
         return self.cipher.decrypt(encrypted_key.encode()).decode()
 
 
-def save_credential(connection_id: str, api_key: str | None, name: str, spec_url: str) -> bool:
+def save_credential(connection_id: str, api_key: str | None, name: str, spec_url: str,
+                    response_cache_ttl: int | None = None) -> bool:
     """
     Saves or Updates an integration record in the DB.
     """
-    manager = CredentialManager()
+    manager = get_credential_manager()
     encrypted = manager.encrypt(api_key)
 
     with Session(engine) as session:
@@ -38,6 +53,8 @@ def save_credential(connection_id: str, api_key: str | None, name: str, spec_url
         if existing_integration:
             existing_integration.name = name
             existing_integration.spec_url = spec_url
+            if response_cache_ttl is not None:
+                existing_integration.response_cache_ttl = response_cache_ttl
 
             if encrypted is not None:
                 existing_integration.encrypted_key = encrypted
@@ -54,28 +71,98 @@ def save_credential(connection_id: str, api_key: str | None, name: str, spec_url
                 name=name,
                 spec_url=spec_url,
                 encrypted_key=encrypted,
-                connection_id=connection_id
+                connection_id=connection_id,
+                response_cache_ttl=response_cache_ttl or 0
             )
             session.add(new_integration)
 
         session.commit()
+    invalidate_auth_headers(connection_id)
     print(f"Credentials for '{connection_id}' saved to DB.")
     return True
 
 
+def get_credential_manager() -> CredentialManager:
+    """Returns the shared CredentialManager, so the Fernet cipher is built once."""
+    global _credential_manager
+    if _credential_manager is None:
+        _credential_manager = CredentialManager()
+    return _credential_manager
+
+
 def get_auth_headers(connection_id: str) -> dict:
     """
     Retrieves key from DB -> Decrypts -> Returns Header.
+    Results (including 'no credentials') are cached per connection_id for
+    CREDENTIAL_CACHE_TTL seconds; save_credential invalidates the entry.
     """
+    cached = get_cached_auth_headers(connection_id)
+    if cached is not None:
+        return cached
+
+    with _cache_lock:
+        _cache_stats["misses"] += 1
+
     with Session(engine) as session:
         statement = select(Integration).where(
             Integration.connection_id == connection_id)
         result = session.exec(statement).first()
 
         if not result or not result.encrypted_key:
-            return {}
+            headers = {}
+        else:
+            decrypted_key = get_credential_manager().decrypt(result.encrypted_key)
+            headers = {"Authorization": f"Bearer {decrypted_key}"}
+
+    with _cache_lock:
+        _header_cache[connection_id] = (
+            time.monotonic() + CREDENTIAL_CACHE_TTL, headers)
+
+    return dict(headers)
+
+
+async def aget_auth_headers(connection_id: str) -> dict:
+    """
+    Async variant for the tool handlers: cache hits are served inline,
+    only a miss goes to the DB (in a worker thread).
+    """
+    start = time.perf_counter()
+    cached = get_cached_auth_headers(connection_id)
+    if cached is not None:
+        AUTH_HEADERS_DURATION.labels(cache="hit").observe(
+            time.perf_counter() - start)
+        return cached
+    with timed(AUTH_HEADERS_DURATION, cache="miss"):
+        return await asyncio.to_thread(get_auth_headers, connection_id)
+
+
+def get_cached_auth_headers(connection_id: str) -> Optional[dict]:
+    """Returns the cached headers, or None when missing/expired."""
+    with _cache_lock:
+        entry = _header_cache.get(connection_id)
+        if entry is None:
+            return None
+
+        expires_at, headers = entry
+        if expires_at <= time.monotonic():
+            del _header_cache[connection_id]
+            return None
+
+        _cache_stats["hits"] += 1
+        return dict(headers)
+
+
+def invalidate_auth_headers(connection_id: Optional[str] = None):
+    """Drops the cached headers of one integration (or all of them)."""
+    with _cache_lock:
+        if connection_id is None:
+            _header_cache.clear()
+        else:
+            _header_cache.pop(connection_id, None)
+        _cache_stats["invalidations"] += 1
 
-        manager = CredentialManager()
-        decrypted_key = manager.decrypt(result.encrypted_key)
 
-        return {"Authorization": f"Bearer {decrypted_key}"}
+def get_auth_cache_stats() -> dict:
+    """Hit/miss counters of the header cache."""
+    with _cache_lock:
+        return {**_cache_stats, "size": len(_header_cache), "ttl_seconds": CREDENTIAL_CACHE_TTL}
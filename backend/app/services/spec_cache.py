@@ -0,0 +1,72 @@
+import os
+import json
+import hashlib
+import tempfile
+from typing import Any, Dict, Optional
+
+from app.utils.logger import get_logger
+
+logger = get_logger("Spec_Cache")
+
+SPEC_CACHE_DIR = os.getenv("SPEC_CACHE_DIR", "./spec_cache")
+
+
+class SpecCache:
+    """
+    On-disk cache of raw OpenAPI spec downloads.
+    Stores the body together with the ETag/Last-Modified validators so a
+    re-fetch can be a conditional request answered with 304.
+    """
+
+    def __init__(self, directory: str = SPEC_CACHE_DIR):
+        self.directory = directory
+        os.makedirs(self.directory, exist_ok=True)
+
+    def _path(self, spec_url: str) -> str:
+        key = hashlib.sha256(spec_url.encode()).hexdigest()
+        return os.path.join(self.directory, f"{key}.json")
+
+    def load(self, spec_url: str) -> Optional[Dict[str, Any]]:
+        """Returns the cached entry for a URL, or None."""
+        path = self._path(spec_url)
+        if not os.path.exists(path):
+            return None
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, json.JSONDecodeError) as e:
+            logger.warning(f"Ignoring unreadable spec cache entry {path}: {e}")
+            return None
+
+    def store(self, spec_url: str, body: str, etag: Optional[str], last_modified: Optional[str]):
+        """Writes the entry atomically so concurrent readers never see half a file."""
+        path = self._path(spec_url)
+        entry = {
+            "url": spec_url,
+            "etag": etag,
+            "last_modified": last_modified,
+            "body": body
+        }
+        # unique per writer, concurrent stores of one URL must not share it
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                json.dump(entry, f)
+            os.replace(tmp_path, path)
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+
+    @staticmethod
+    def conditional_headers(entry: Optional[Dict[str, Any]]) -> Dict[str, str]:
+        """Revalidation headers for a cached entry."""
+        headers = {}
+        if entry:
+            if entry.get("etag"):
+                headers["If-None-Match"] = entry["etag"]
+            if entry.get("last_modified"):
+                headers["If-Modified-Since"] = entry["last_modified"]
+        return headers
+
+
+spec_cache = SpecCache()
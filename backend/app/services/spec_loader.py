@@ -0,0 +1,390 @@
+import os
+import json
+import hashlib
+import tempfile
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
+from typing import Any, Dict, List, Optional, Tuple
+
+import yaml
+
+from app.utils.logger import get_logger
+
+logger = get_logger("Spec_Loader")
+
+# libyaml bindings are an order of magnitude faster than the pure-Python loader
+try:
+    from yaml import CSafeLoader as YamlLoader
+    LIBYAML_AVAILABLE = True
+except ImportError:
+    from yaml import SafeLoader as YamlLoader
+    LIBYAML_AVAILABLE = False
+
+SPEC_IR_DIR = os.getenv("SPEC_IR_DIR", os.path.join(
+    os.getenv("SPEC_CACHE_DIR", "./spec_cache"), "ir"))
+# specs smaller than this are parsed inline, the IPC would cost more than it saves
+SPEC_PROCESS_POOL_MIN_BYTES = int(
+    os.getenv("SPEC_PROCESS_POOL_MIN_BYTES", str(512 * 1024)))
+SPEC_PARSE_WORKERS = int(os.getenv("SPEC_PARSE_WORKERS", "2"))
+# operation offset tables kept in memory for building tools
+SPEC_IR_CACHE_SIZE = int(os.getenv("SPEC_IR_CACHE_SIZE", "32"))
+# how deep response/body schemas are inlined into the compiled operations
+SPEC_SCHEMA_DEPTH = int(os.getenv("SPEC_SCHEMA_DEPTH", "4"))
+
+# bump when the compiled format changes, old cache files are then ignored
+IR_VERSION = 2
+
+HTTP_METHODS = ["get", "post", "put", "delete", "patch"]
+
+_pool: Optional[ProcessPoolExecutor] = None
+_pool_lock = threading.Lock()
+
+
+def parse_spec_text(text: str) -> Dict[str, Any]:
+    """JSON first (fast path), YAML otherwise."""
+    try:
+        return json.loads(text)
+    except json.JSONDecodeError:
+        return yaml.load(text, Loader=YamlLoader)
+
+
+class RefResolver:
+    """
+    Resolves local JSON pointers ("#/components/schemas/Pet") with
+    memoization, so shared components are looked up once per spec.
+    """
+
+    def __init__(self, spec: Dict[str, Any]):
+        self.spec = spec
+        self._pointers: Dict[str, Any] = {}
+        self._inlined: Dict[tuple, Any] = {}
+
+    def lookup(self, ref: str) -> Any:
+        if ref not in self._pointers:
+            target: Any = {}
+            if ref.startswith("#/"):
+                target = self.spec
+                for part in ref[2:].split("/"):
+                    part = part.replace("~1", "/").replace("~0", "~")
+                    target = target.get(part, {}) if isinstance(
+                        target, dict) else {}
+            self._pointers[ref] = target
+        return self._pointers[ref]
+
+    def deref(self, node: Any) -> Any:
+        """Follows a chain of $refs at the top of a node."""
+        seen = set()
+        while isinstance(node, dict) and "$ref" in node and node["$ref"] not in seen:
+            seen.add(node["$ref"])
+            node = self.lookup(node["$ref"])
+        return node
+
+    def inline(self, node: Any, depth: int = SPEC_SCHEMA_DEPTH) -> Any:
+        """
+        Returns a schema with $refs replaced by their targets, down to
+        'depth' levels. Results for named refs are memoized per depth.
+        """
+        if isinstance(node, dict) and "$ref" in node:
+            key = (node["$ref"], depth)
+            # depth shrinks on every nested level, so self-references terminate
+            if key not in self._inlined:
+                self._inlined[key] = self.inline(self.deref(node), depth)
+            return self._inlined[key]
+
+        if depth <= 0 or not isinstance(node, (dict, list)):
+            return node
+        if isinstance(node, list):
+            return [self.inline(item, depth - 1) for item in node]
+        return {k: self.inline(v, depth - 1) for k, v in node.items()}
+
+
+def _base_url(spec: Dict[str, Any]) -> str:
+    base_url = "https://api.example.com"
+
+    # OpenAPI 3.0 'servers' array
+    if "servers" in spec and spec["servers"]:
+        base_url = spec["servers"][0].get("url", "")
+
+    # Strategy B: Swagger 2.0 'host' + 'basePath'
+    elif "host" in spec:
+        scheme = spec.get("schemes", ["https"])[0]
+        host = spec["host"]
+        base_path = spec.get("basePath", "")
+        base_url = f"{scheme}://{host}{base_path}"
+
+    else:
+        logger.warning(
+            "Could not determine Base URL. Defaulting to example.com")
+
+    return base_url.rstrip("/")
+
+
+def _response_schema(details: Dict[str, Any], resolver: RefResolver) -> Optional[Dict[str, Any]]:
+    """Schema of the first 2xx JSON response (OpenAPI 3 or Swagger 2)."""
+    for code, response in (details.get("responses") or {}).items():
+        response = resolver.deref(response)
+        if not str(code).startswith("2") or not isinstance(response, dict):
+            continue
+        if "schema" in response:
+            return resolver.inline(response["schema"])
+        for media_type, media in (response.get("content") or {}).items():
+            if "json" in media_type and isinstance(media, dict) and "schema" in media:
+                return resolver.inline(media["schema"])
+    return None
+
+
+def _body_schema(details: Dict[str, Any], parameters: List[Dict[str, Any]],
+                 resolver: RefResolver) -> Optional[Dict[str, Any]]:
+    """JSON request body schema: OpenAPI 3 requestBody or a Swagger 2 'in: body' parameter."""
+    for param in parameters:
+        if param.get("in") == "body":
+            return resolver.deref(param.get("schema"))
+
+    body = resolver.deref(details.get("requestBody"))
+    if isinstance(body, dict):
+        for media_type, media in (body.get("content") or {}).items():
+            if "json" in media_type and isinstance(media, dict):
+                return resolver.deref(media.get("schema"))
+    return None
+
+
+def _schema_type(schema: Any) -> str:
+    if not isinstance(schema, dict):
+        return "string"
+    if "type" in schema:
+        schema_type = schema["type"]
+        # OpenAPI 3.1 allows a list like ["string", "null"]
+        if isinstance(schema_type, list):
+            schema_type = next((t for t in schema_type if t != "null"), "string")
+        return schema_type
+    if "properties" in schema:
+        return "object"
+    return "string"
+
+
+def compile_operation(path: str, method: str, details: Dict[str, Any],
+                      path_item: Dict[str, Any], resolver: RefResolver) -> Dict[str, Any]:
+    """Compiles one OpenAPI operation into the plain-dict form the bridge builds tools from."""
+    op_id = details.get("operationId")
+    if not op_id:
+        clean_path = path.replace(
+            "/", "_").replace("{", "").replace("}", "")
+        op_id = f"{method}{clean_path}"
+
+    # building a rich description for better semantic search
+    base_description = details.get("summary") or details.get(
+        "description") or "No description."
+
+    # path-level parameters apply to every operation, operation-level ones override them
+    merged: Dict[tuple, Dict[str, Any]] = {}
+    for param in (path_item.get("parameters") or []) + (details.get("parameters") or []):
+        param = resolver.deref(param)
+        if isinstance(param, dict) and param.get("name"):
+            merged[(param.get("name"), param.get("in"))] = param
+    parameters = list(merged.values())
+
+    params = []
+    params_info = []
+    for param in parameters:
+        location = param.get("in", "")
+        # 'body' becomes body_fields below; formData params stay, the handler sends them as a form
+        if location in ("body", "cookie"):
+            continue
+        schema = resolver.deref(param.get("schema")) or param
+        params.append({
+            "name": param["name"],
+            "in": location,
+            "required": bool(param.get("required", False)),
+            "type": _schema_type(schema),
+        })
+        if location == "path":
+            params_info.append(
+                f"Uses {param['name']} parameter ({param.get('description', '')})")
+
+    description = base_description
+    if params_info:
+        description = f"{base_description}. {'. '.join(params_info)}."
+
+    body_fields = []
+    body_mode = None
+    body_schema = _body_schema(details, parameters, resolver)
+    if isinstance(body_schema, dict):
+        properties = body_schema.get("properties")
+        taken = {p["name"] for p in params}
+        if isinstance(properties, dict) and properties:
+            body_mode = "fields"
+            required = set(body_schema.get("required") or [])
+            for name, prop in properties.items():
+                if name in taken:
+                    continue
+                body_fields.append({
+                    "name": name,
+                    "required": name in required,
+                    "type": _schema_type(resolver.deref(prop)),
+                })
+        else:
+            # arrays / free-form bodies are passed through as a single 'body' argument
+            body_mode = "raw"
+            body_fields.append({
+                "name": "body",
+                "required": True,
+                "type": _schema_type(body_schema),
+            })
+
+    return {
+        "op_id": op_id,
+        "method": method,
+        "path": path,
+        "description": description,
+        "params": params,
+        "body_mode": body_mode,
+        "body_fields": body_fields,
+        "response_schema": _response_schema(details, resolver),
+    }
+
+
+def compile_spec(spec: Dict[str, Any]) -> Dict[str, Any]:
+    """Compiles a parsed spec into its intermediate representation."""
+    resolver = RefResolver(spec)
+    operations = []
+
+    for path, path_item in (spec.get("paths") or {}).items():
+        path_item = resolver.deref(path_item)
+        if not isinstance(path_item, dict):
+            continue
+        for method, details in path_item.items():
+            if method.lower() not in HTTP_METHODS or not isinstance(details, dict):
+                continue
+            operations.append(compile_operation(
+                path, method.lower(), details, path_item, resolver))
+
+    return {"version": IR_VERSION, "base_url": _base_url(spec), "operations": operations}
+
+
+def _compile_text(text: str) -> Dict[str, Any]:
+    """Process-pool entry point: parse + compile, only the (small) IR is sent back."""
+    return compile_spec(parse_spec_text(text))
+
+
+def _get_pool() -> ProcessPoolExecutor:
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ProcessPoolExecutor(max_workers=SPEC_PARSE_WORKERS)
+        return _pool
+
+
+def shutdown_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown(cancel_futures=True)
+            _pool = None
+
+
+def _ir_path(digest: str) -> str:
+    return os.path.join(SPEC_IR_DIR, f"{digest}.v{IR_VERSION}.json")
+
+
+def _write_atomic(path: str, write):
+    os.makedirs(SPEC_IR_DIR, exist_ok=True)
+    # unique per writer: workers compiling the same spec must not share a temp file
+    fd, tmp_path = tempfile.mkstemp(dir=SPEC_IR_DIR, suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            write(f)
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+
+
+def _write_ir(path: str, compiled: Dict[str, Any]):
+    _write_atomic(path, lambda f: f.write(json.dumps(compiled).encode()))
+
+
+def load_compiled_spec(text: str) -> Dict[str, Any]:
+    """
+    Returns the compiled operations of a spec document.
+    Cached on disk by content hash, so re-registering an unchanged spec
+    skips parsing entirely. Large specs are parsed in a worker process.
+    """
+    digest = hashlib.sha256(text.encode()).hexdigest()
+    path = _ir_path(digest)
+
+    if os.path.exists(path):
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                compiled = json.load(f)
+            logger.info(
+                f"Using compiled spec {digest[:12]} ({len(compiled['operations'])} operations)")
+            compiled["key"] = digest
+            return compiled
+        except (OSError, ValueError, KeyError) as e:
+            logger.warning(f"Ignoring unreadable compiled spec {path}: {e}")
+
+    if len(text) >= SPEC_PROCESS_POOL_MIN_BYTES:
+        logger.info(f"Parsing {len(text)} byte spec in worker process...")
+        compiled = _get_pool().submit(_compile_text, text).result()
+    else:
+        compiled = _compile_text(text)
+
+    compiled["key"] = digest
+    _write_ir(path, compiled)
+    return compiled
+
+
+def _ops_path(key: str) -> str:
+    return os.path.join(SPEC_IR_DIR, f"{key}.v{IR_VERSION}.ops")
+
+
+def _index_path(key: str) -> str:
+    return os.path.join(SPEC_IR_DIR, f"{key}.v{IR_VERSION}.index.json")
+
+
+def ensure_ir(compiled: Dict[str, Any]) -> str:
+    """
+    Key for load_operation. Writes the operations of a compiled spec one
+    per line plus an offset table, unless this host already has them, so
+    a single operation can be read back without parsing the whole spec.
+    """
+    key = compiled.get("key")
+    if not key:
+        # IR read from the database by an older release
+        key = hashlib.sha256(json.dumps(compiled, sort_keys=True).encode()).hexdigest()
+        compiled["key"] = key
+    if os.path.exists(_index_path(key)):
+        return key
+
+    offsets: Dict[str, List[int]] = {}
+
+    def write_ops(f):
+        position = 0
+        for op in compiled["operations"]:
+            line = json.dumps(op).encode() + b"\n"
+            offsets[op["op_id"]] = [position, len(line)]
+            f.write(line)
+            position += len(line)
+
+    _write_atomic(_ops_path(key), write_ops)
+    # written last: an index on disk means the operations are complete
+    index = {"base_url": compiled["base_url"], "offsets": offsets}
+    _write_atomic(_index_path(key), lambda f: f.write(json.dumps(index).encode()))
+    return key
+
+
+@lru_cache(maxsize=SPEC_IR_CACHE_SIZE)
+def _ir_index(key: str) -> Tuple[str, Dict[str, List[int]]]:
+    with open(_index_path(key), "r", encoding="utf-8") as f:
+        index = json.load(f)
+    return index["base_url"], index["offsets"]
+
+
+def load_operation(key: str, op_id: str) -> Tuple[str, Dict[str, Any]]:
+    """(base_url, compiled operation) of one operation, read from its line of the IR."""
+    base_url, offsets = _ir_index(key)
+    start, length = offsets[op_id]
+    with open(_ops_path(key), "rb") as f:
+        f.seek(start)
+        return base_url, json.loads(f.read(length))
@@ -1,80 +1,361 @@
 from app.utils.logger import get_logger
 import os
+import logging
 from dotenv import load_dotenv
 import json
-from typing import List, Dict, Any
-from langchain_google_genai import GoogleGenerativeAIEmbeddings
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Callable, List, Dict, Any, Optional, Set, Tuple, Union
 from langchain_chroma import Chroma
 from langchain_core.documents import Document
 from langchain_core.tools import StructuredTool
+from app.services.embeddings import CachedEmbeddings, build_embeddings, EMBEDDING_BACKEND
+from app.services.lexical_index import BM25Index, reciprocal_rank_fusion
+from app.services.result_shaper import stored_result_tool
 
 load_dotenv()
 
 logger = get_logger("Tool_Registry")
 
+# 'hybrid' (BM25 + vector, fused with RRF), 'vector' or 'lexical'
+SEARCH_MODE = os.getenv("TOOL_SEARCH_MODE", "hybrid").lower()
+RRF_K = int(os.getenv("RRF_K", "60"))
+# built StructuredTools kept around; only the few retrieved per turn are ever needed
+TOOL_CACHE_SIZE = int(os.getenv("TOOL_CACHE_SIZE", "256"))
+CHROMA_PERSIST_DIR = os.getenv("CHROMA_PERSIST_DIR", "./chroma_db")
+# shared Chroma server; required when several workers/pods serve the API
+CHROMA_HOST = os.getenv("CHROMA_HOST")
+CHROMA_PORT = int(os.getenv("CHROMA_PORT", "8000"))
+
+
+class OperationRecord:
+    """
+    What the registry keeps per operation: enough for indexing and
+    retrieval, plus a factory that builds the StructuredTool (args model,
+    HTTP handler) the first time the tool is actually offered to the LLM.
+    """
+    __slots__ = ("name", "connection_id", "description",
+                 "arg_names", "content_hash", "factory")
+
+    def __init__(self, name: str, connection_id: str, description: str,
+                 arg_names: Tuple[str, ...], content_hash: str,
+                 factory: Callable[[], StructuredTool]):
+        self.name = name
+        self.connection_id = connection_id
+        self.description = description
+        self.arg_names = arg_names
+        self.content_hash = content_hash
+        self.factory = factory
+
+    @classmethod
+    def from_tool(cls, tool: StructuredTool) -> "OperationRecord":
+        """Wraps an already built tool (e.g. tools not generated from a spec)."""
+        payload = json.dumps(
+            {"name": tool.name, "description": tool.description, "schema": tool.args},
+            sort_keys=True,
+            default=str
+        )
+        return cls(
+            name=tool.name,
+            connection_id=(tool.metadata or {}).get("connection_id", "default"),
+            description=tool.description or "",
+            arg_names=tuple(tool.args.keys()),
+            content_hash=hashlib.sha256(payload.encode()).hexdigest(),
+            factory=lambda: tool
+        )
+
 
 class ToolRegistry:
     def __init__(self):
 
-        self.embeddings = GoogleGenerativeAIEmbeddings(
-            model="models/text-embedding-004",
-            google_api_key=os.getenv("GOOGLE_API_KEY"),
-            task_type="semantic_similarity"
-        )
+        # query embeddings are cached, document embeddings are batched
+        self.embeddings = CachedEmbeddings(build_embeddings(EMBEDDING_BACKEND))
 
-        self.vector_store = Chroma(
-            collection_name="agent_tools",
-            embedding_function=self.embeddings,
-            persist_directory="./chroma_db"
-        )
+        # vectors of different backends don't mix, so each gets its own collection
+        collection_name = "agent_tools"
+        if EMBEDDING_BACKEND != "google":
+            collection_name = f"agent_tools_{EMBEDDING_BACKEND}"
+
+        if CHROMA_HOST:
+            import chromadb
+            self.vector_store = Chroma(
+                collection_name=collection_name,
+                embedding_function=self.embeddings,
+                client=chromadb.HttpClient(host=CHROMA_HOST, port=CHROMA_PORT)
+            )
+        else:
+            self.vector_store = Chroma(
+                collection_name=collection_name,
+                embedding_function=self.embeddings,
+                persist_directory=CHROMA_PERSIST_DIR
+            )
+
+        # connection_id -> Integration.version loaded into this process
+        self.versions: Dict[str, int] = {}
+
+        # compact operation table; tools are materialized from it on demand
+        self._operations: Dict[str, OperationRecord] = {}
+        self._materialized: "OrderedDict[str, StructuredTool]" = OrderedDict()
+        self._materialize_lock = threading.Lock()
 
-        self._tool_map: Dict[str, StructuredTool] = {}
+        # in-process BM25 over tool name, description and parameter names
+        self.lexical_index = BM25Index()
 
-    def register_tools(self, tools: List[StructuredTool]):
+        self._builtin_tools: Dict[str, StructuredTool] = {
+            stored_result_tool.name: stored_result_tool
+        }
+
+    def register_tools(self, tools: List[Union[OperationRecord, StructuredTool]],
+                       prune: bool = True) -> Dict[str, int]:
         """
-        Takes a list of LangChain/MCP tools, indexes them, and stores them.
+        Takes a list of operation records (or built LangChain/MCP tools),
+        indexes them, and stores them.
+        Indexing is incremental per integration: every tool has a stable
+        document id (integration + operationId) and a content hash, so only
+        new or changed tools are embedded. With prune=True, operations that
+        disappeared from the integration are deleted from the index.
         """
+        stats = {"added": 0, "updated": 0, "unchanged": 0, "removed": 0}
+
         if not tools:
             logger.warning("No tools provided to register.")
-            return
+            return stats
+
+        by_integration: Dict[str, List[OperationRecord]] = {}
+        for tool in tools:
+            record = tool if isinstance(
+                tool, OperationRecord) else OperationRecord.from_tool(tool)
+            by_integration.setdefault(record.connection_id, []).append(record)
+
+        for integration, group in by_integration.items():
+            for key, value in self._sync_integration(integration, group, prune).items():
+                stats[key] += value
+
+        logger.info(
+            f"Index sync complete: {stats['added']} added, {stats['updated']} updated, "
+            f"{stats['unchanged']} unchanged, {stats['removed']} removed.")
+        return stats
+
+    def _sync_integration(self, integration: str, tools: List[OperationRecord], prune: bool) -> Dict[str, int]:
+        """Diffs one integration's tools against the index and applies the changes."""
+        stats = {"added": 0, "updated": 0, "unchanged": 0, "removed": 0}
+
+        # only look up the ids of this batch, so chunked ingestion stays linear
+        existing = self.vector_store.get(
+            ids=[self._doc_id(integration, t.name) for t in tools], include=["metadatas"])
+        existing_meta = dict(zip(existing["ids"], existing["metadatas"]))
 
         documents = []
-        new_tools_count = 0
+        ids = []
 
         for tool in tools:
-            self._tool_map[tool.name] = tool
+            self._operations[tool.name] = tool
+            # a re-registered operation must be rebuilt from its new record
+            self._evict(tool.name)
+            self.lexical_index.add(tool.name, self._lexical_text(tool))
+
+            doc_id = self._doc_id(integration, tool.name)
+            content_hash = tool.content_hash
+
+            previous = existing_meta.get(doc_id)
+            if previous and previous.get("content_hash") == content_hash:
+                stats["unchanged"] += 1
+                continue
+
+            stats["updated" if previous else "added"] += 1
 
             doc_content = f"Tool Name: {tool.name}\nDescription: {tool.description}"
 
             documents.append(Document(
                 page_content=doc_content,
-                metadata={"tool_name": tool.name}
+                metadata={
+                    "tool_name": tool.name,
+                    "integration": integration,
+                    "content_hash": content_hash
+                }
             ))
-            new_tools_count += 1
+            ids.append(doc_id)
 
         if documents:
-            logger.info(f"Indexing {len(documents)} tools into Vector DB...")
-            self.vector_store.add_documents(documents)
+            logger.info(
+                f"Indexing {len(documents)} tools for {integration} into Vector DB...")
+            # Chroma upserts on existing ids, so changed tools replace their old vector
+            self.vector_store.add_documents(documents, ids=ids)
             logger.info("Indexing complete.")
 
+        if prune:
+            stats["removed"] += self.prune_integration(
+                integration, {t.name for t in tools})
+
+        # documents indexed before stable ids existed (random ids, no integration)
+        legacy = self.vector_store.get(
+            where={"tool_name": {"$in": [t.name for t in tools]}}, include=["metadatas"])
+        legacy_ids = [
+            doc_id for doc_id, meta in zip(legacy["ids"], legacy["metadatas"])
+            if "integration" not in (meta or {})
+        ]
+
+        if legacy_ids:
+            self.vector_store.delete(ids=legacy_ids)
+            stats["removed"] += len(legacy_ids)
+
+        return stats
+
+    def load_operations(self, integration: str, records: List[OperationRecord]):
+        """
+        Replaces the in-memory operations of an integration without touching
+        the vector store: used when another worker already indexed them.
+        """
+        keep = {record.name for record in records}
+        stale = [name for name, record in self._operations.items()
+                 if record.connection_id == integration and name not in keep]
+
+        for name in stale:
+            del self._operations[name]
+            self._evict(name)
+            self.lexical_index.remove(name)
+
+        for record in records:
+            self._operations[record.name] = record
+            self._evict(record.name)
+            self.lexical_index.add(record.name, self._lexical_text(record))
+
+        logger.info("Loaded %d operations of %s (%d removed)",
+                    len(records), integration, len(stale))
+
+    def prune_integration(self, integration: str, keep: Set[str]) -> int:
+        """
+        Deletes the indexed tools of an integration whose names are not in
+        'keep' (operations removed from the spec). Returns how many were removed.
+        """
+        existing = self.vector_store.get(
+            where={"integration": integration}, include=["metadatas"])
+        existing_meta = dict(zip(existing["ids"], existing["metadatas"]))
+
+        keep_ids = {self._doc_id(integration, name) for name in keep}
+        stale_ids = [doc_id for doc_id in existing_meta if doc_id not in keep_ids]
+
+        for doc_id in stale_ids:
+            tool_name = existing_meta[doc_id].get("tool_name")
+            record = self._operations.get(tool_name)
+            if record is not None and record.connection_id == integration:
+                del self._operations[tool_name]
+                self._evict(tool_name)
+                self.lexical_index.remove(tool_name)
+
+        if stale_ids:
+            self.vector_store.delete(ids=stale_ids)
+        return len(stale_ids)
+
+    @staticmethod
+    def _lexical_text(record: OperationRecord) -> str:
+        return " ".join([record.name, record.description, *record.arg_names])
+
+    @staticmethod
+    def _doc_id(integration: str, tool_name: str) -> str:
+        return f"{integration}:{tool_name}"
+
+    def _materialize(self, name: str) -> Optional[StructuredTool]:
+        """Returns the built tool of an operation, building it on first use (LRU-bounded)."""
+        with self._materialize_lock:
+            tool = self._materialized.get(name)
+            if tool is not None:
+                self._materialized.move_to_end(name)
+                return tool
+
+        record = self._operations.get(name)
+        if record is None:
+            return None
+
+        tool = record.factory()
+        # lets the agent cache bound models per tool version
+        tool.metadata = {**(tool.metadata or {}),
+                         "content_hash": record.content_hash}
+
+        with self._materialize_lock:
+            self._materialized[name] = tool
+            while len(self._materialized) > TOOL_CACHE_SIZE:
+                self._materialized.popitem(last=False)
+        return tool
+
+    def _evict(self, name: str):
+        with self._materialize_lock:
+            self._materialized.pop(name, None)
+
+    def operation_count(self) -> int:
+        return len(self._operations)
+
+    def operations(self, integrations: Optional[Set[str]] = None) -> List[OperationRecord]:
+        """Registered operations, optionally only those of the given integrations."""
+        records = list(self._operations.values())
+        if integrations:
+            records = [r for r in records if r.connection_id in integrations]
+        return records
+
     def search_tools(self, query: str, k: int = 5) -> List[StructuredTool]:
         """
-        Semantic search: 'Add user' -> finds 'create_contact'
+        Hybrid search: 'Add user' -> finds 'create_contact' (vector),
+        'getPetById' -> finds getPetById (lexical)
         """
-        logger.info(f"Searching tools for query: '{query}'")
+        logger.info("Searching tools for query: '%s'", query)
 
-        results = self.vector_store.similarity_search(query, k=k)
+        vector_names = []
+        if SEARCH_MODE != "lexical":
+            try:
+                results = self.vector_store.similarity_search(query, k=k)
+                vector_names = [doc.metadata["tool_name"] for doc in results]
+            except Exception as e:
+                logger.warning("Vector search failed, using lexical only: %s", e)
 
-        found_tools = []
-        seen_names = set()
+        return self._fuse(query, vector_names, k)
+
+    async def asearch_tools(self, query: str, k: int = 5) -> List[StructuredTool]:
+        """
+        Async variant of search_tools, used by the agent graph so the
+        embedding call does not block the event loop.
+        """
+        logger.info("Searching tools for query: '%s'", query)
 
-        for doc in results:
-            tool_name = doc.metadata["tool_name"]
+        vector_names = []
+        if SEARCH_MODE != "lexical":
+            try:
+                results = await self.vector_store.asimilarity_search(query, k=k)
+                vector_names = [doc.metadata["tool_name"] for doc in results]
+            except Exception as e:
+                logger.warning("Vector search failed, using lexical only: %s", e)
 
-            if tool_name not in seen_names and tool_name in self._tool_map:
-                found_tools.append(self._tool_map[tool_name])
-                seen_names.add(tool_name)
+        return self._fuse(query, vector_names, k)
 
-        logger.info(
-            f"Found {len(found_tools)} relevant tools: {[t.name for t in found_tools]}")
+    def get_tools(self, names: List[str]) -> List[StructuredTool]:
+        """Looks registered tools (and builtins) up by name, skipping unknown ones."""
+        tools = []
+        for name in names:
+            tool = self._builtin_tools.get(name) or self._materialize(name)
+            if tool is not None:
+                tools.append(tool)
+        return tools
+
+    def builtin_tool_names(self) -> List[str]:
+        """Tools offered on every turn without retrieval (not indexed)."""
+        return list(self._builtin_tools)
+
+    def _fuse(self, query: str, vector_names: List[str], k: int) -> List[StructuredTool]:
+        """Merges vector and BM25 rankings (reciprocal rank fusion) into tools."""
+        rankings = [vector_names]
+        if SEARCH_MODE != "vector":
+            rankings.append(
+                [name for name, _ in self.lexical_index.search(query, k=k)])
+
+        found_tools = []
+        for tool_name in reciprocal_rank_fusion(rankings, k=RRF_K):
+            tool = self._materialize(tool_name)
+            if tool is not None:
+                found_tools.append(tool)
+            if len(found_tools) == k:
+                break
+
+        if logger.isEnabledFor(logging.INFO):
+            logger.info("Found %d relevant tools: %s",
+                        len(found_tools), [t.name for t in found_tools])
         return found_tools
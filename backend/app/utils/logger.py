@@ -1,9 +1,115 @@
-import logging
+import os
 import sys
+import json
+import queue
+import random
+import logging
+import logging.handlers
+from typing import Dict, Optional
 
 # Configure the logging format
 # Format: [Time] [Level] [Module]: Message
 LOG_FORMAT = "[%(asctime)s] [%(levelname)s] [%(name)s]: %(message)s"
+LOG_DATE_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+# 'json' (one object per line) or 'text' (LOG_FORMAT)
+LOG_OUTPUT = os.getenv("LOG_OUTPUT", "json").lower()
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+# longer messages (e.g. upstream error bodies) are cut in the formatter
+LOG_MAX_MESSAGE_CHARS = int(os.getenv("LOG_MAX_MESSAGE_CHARS", "2000"))
+# fraction of INFO/DEBUG records kept per logger, e.g. "MCP_Bridge=0.1,Tool_Registry=0.25"
+LOG_SAMPLE_RATES = os.getenv("LOG_SAMPLE_RATES", "")
+LOG_QUEUE_SIZE = int(os.getenv("LOG_QUEUE_SIZE", "10000"))
+
+# every logger handed out by get_logger, so configure_logging can rewire them
+_loggers: Dict[str, logging.Logger] = {}
+_listener: Optional[logging.handlers.QueueListener] = None
+
+
+def _truncate(message: str) -> str:
+    if len(message) <= LOG_MAX_MESSAGE_CHARS:
+        return message
+    return f"{message[:LOG_MAX_MESSAGE_CHARS]}... [truncated {len(message) - LOG_MAX_MESSAGE_CHARS} chars]"
+
+
+class TextFormatter(logging.Formatter):
+    def __init__(self):
+        super().__init__(LOG_FORMAT, datefmt=LOG_DATE_FORMAT)
+
+    def formatMessage(self, record: logging.LogRecord) -> str:
+        record.message = _truncate(record.message)
+        return super().formatMessage(record)
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line: ts, level, logger, message (+ exc)."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": self.formatTime(record, LOG_DATE_FORMAT),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": _truncate(record.getMessage()),
+        }
+        if record.exc_info:
+            entry["exc"] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str, ensure_ascii=False)
+
+
+class SamplingFilter(logging.Filter):
+    """
+    Keeps only a fraction of the INFO/DEBUG records of noisy loggers.
+    Warnings and errors always pass.
+    """
+
+    def __init__(self, rates: Dict[str, float]):
+        super().__init__()
+        self.rates = rates
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        rate = self.rates.get(record.name)
+        if rate is None or record.levelno >= logging.WARNING:
+            return True
+        return random.random() < rate
+
+
+class LazyQueueHandler(logging.handlers.QueueHandler):
+    """
+    Enqueues the record as is: message formatting (%-args), truncation and
+    JSON encoding happen in the listener thread, not on the caller's path.
+    """
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        return record
+
+    def enqueue(self, record: logging.LogRecord):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            # never block a request on logging
+            pass
+
+
+def _parse_rates(raw: str) -> Dict[str, float]:
+    rates = {}
+    for item in raw.split(","):
+        name, _, value = item.partition("=")
+        if name.strip() and value.strip():
+            try:
+                rates[name.strip()] = max(0.0, min(1.0, float(value)))
+            except ValueError:
+                pass
+    return rates
+
+
+def _stream_handler() -> logging.Handler:
+    handler = logging.StreamHandler(sys.stdout)
+    handler.setFormatter(JsonFormatter() if LOG_OUTPUT == "json" else TextFormatter())
+    return handler
+
+
+# until configure_logging runs (scripts, benchmarks) records are written directly
+_handler: logging.Handler = _stream_handler()
 
 
 def get_logger(name: str) -> logging.Logger:
@@ -13,13 +119,51 @@ def get_logger(name: str) -> logging.Logger:
     logger = logging.getLogger(name)
 
     # Only add handler if not already added (prevents duplicate logs)
-    if not logger.handlers:
-        handler = logging.StreamHandler(sys.stdout)
-        formatter = logging.Formatter(LOG_FORMAT, datefmt="%Y-%m-%d %H:%M:%S")
-        handler.setFormatter(formatter)
-        logger.addHandler(handler)
-
-        # Set default level (INFO for production, DEBUG for dev)
-        logger.setLevel(logging.INFO)
+    if name not in _loggers:
+        logger.addHandler(_handler)
+        logger.setLevel(LOG_LEVEL)
+        logger.propagate = False
+        _loggers[name] = logger
 
     return logger
+
+
+def configure_logging():
+    """
+    Switches every app logger to the non-blocking pipeline: records go to a
+    bounded queue and a QueueListener thread formats and writes them.
+    Called once at startup; idempotent.
+    """
+    global _handler, _listener
+    if _listener is not None:
+        return
+
+    log_queue: queue.Queue = queue.Queue(maxsize=LOG_QUEUE_SIZE)
+    queue_handler = LazyQueueHandler(log_queue)
+    rates = _parse_rates(LOG_SAMPLE_RATES)
+    if rates:
+        queue_handler.addFilter(SamplingFilter(rates))
+
+    _listener = logging.handlers.QueueListener(
+        log_queue, _stream_handler(), respect_handler_level=True)
+    _listener.start()
+
+    previous, _handler = _handler, queue_handler
+    for logger in _loggers.values():
+        logger.removeHandler(previous)
+        logger.addHandler(queue_handler)
+
+
+def shutdown_logging():
+    """Flushes the queue and stops the listener thread (on shutdown)."""
+    global _handler, _listener
+    if _listener is None:
+        return
+
+    _listener.stop()
+    _listener = None
+
+    previous, _handler = _handler, _stream_handler()
+    for logger in _loggers.values():
+        logger.removeHandler(previous)
+        logger.addHandler(_handler)
@@ -0,0 +1,116 @@
+import os
+import time
+from contextlib import contextmanager, nullcontext
+from typing import Any, Dict, Iterator, Optional, Tuple
+
+from app.utils.logger import get_logger
+
+logger = get_logger("Metrics")
+
+try:
+    import prometheus_client
+    from prometheus_client import Counter, Histogram
+    PROMETHEUS_AVAILABLE = True
+except ImportError:
+    prometheus_client = None
+    PROMETHEUS_AVAILABLE = False
+
+try:
+    from opentelemetry import trace
+    OTEL_AVAILABLE = True
+except ImportError:
+    trace = None
+    OTEL_AVAILABLE = False
+
+# spans are only created when asked for; exporters are configured through
+# the standard OTEL_* variables of the OpenTelemetry SDK
+OTEL_ENABLED = os.getenv("OTEL_ENABLED", "false").lower() == "true"
+
+# LLM calls and upstream APIs are much slower than the prometheus defaults assume
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5,
+                   1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+
+class _NoopMetric:
+    """Stands in for a metric when prometheus_client is not installed."""
+
+    def labels(self, *args, **kwargs) -> "_NoopMetric":
+        return self
+
+    def observe(self, value: float):
+        pass
+
+    def inc(self, value: float = 1):
+        pass
+
+
+def _histogram(name: str, description: str, labels: Tuple[str, ...] = ()):
+    if not PROMETHEUS_AVAILABLE:
+        return _NoopMetric()
+    return Histogram(name, description, labels, buckets=LATENCY_BUCKETS)
+
+
+def _counter(name: str, description: str, labels: Tuple[str, ...] = ()):
+    if not PROMETHEUS_AVAILABLE:
+        return _NoopMetric()
+    return Counter(name, description, labels)
+
+
+NODE_DURATION = _histogram(
+    "agent_node_duration_seconds", "Duration of one agent graph node", ("node",))
+TOOL_CALL_DURATION = _histogram(
+    "tool_call_duration_seconds", "Duration of a generated tool handler (upstream API call)",
+    ("integration", "operation"))
+UPSTREAM_RESPONSES = _counter(
+    "upstream_responses_total", "Upstream API responses by status code ('error' for failed requests)",
+    ("integration", "status"))
+AUTH_HEADERS_DURATION = _histogram(
+    "auth_headers_duration_seconds", "Time to get the auth headers of an integration", ("cache",))
+PERSISTENCE_DURATION = _histogram(
+    "chat_persistence_duration_seconds", "Time to bulk-insert a batch of chat messages")
+LLM_TOKENS = _counter(
+    "llm_tokens_total", "Tokens reported by the chat model", ("node", "type"))
+PLAN_CACHE_LOOKUPS = _counter(
+    "plan_cache_lookups_total", "Plan cache lookups (hit, miss, fallback to the LLM)", ("result",))
+PLAN_CACHE_SAVED_SECONDS = _counter(
+    "plan_cache_saved_llm_seconds_total", "Estimated LLM latency saved by plan cache hits")
+
+_tracer = trace.get_tracer("integration-agent") if OTEL_AVAILABLE and OTEL_ENABLED else None
+
+if OTEL_ENABLED and not OTEL_AVAILABLE:
+    logger.warning(
+        "OTEL_ENABLED is set but the 'opentelemetry-api' package is missing, spans are disabled")
+
+
+def span(name: str, **attributes: Any):
+    """OpenTelemetry span (a no-op context when tracing is disabled)."""
+    if _tracer is None:
+        return nullcontext()
+    return _tracer.start_as_current_span(name, attributes=attributes)
+
+
+@contextmanager
+def timed(histogram, span_name: Optional[str] = None, **labels: str) -> Iterator[None]:
+    """Observes the duration of the block on 'histogram' and opens an optional span."""
+    start = time.perf_counter()
+    with span(span_name, **labels) if span_name else nullcontext():
+        try:
+            yield
+        finally:
+            metric = histogram.labels(**labels) if labels else histogram
+            metric.observe(time.perf_counter() - start)
+
+
+def record_token_usage(node: str, message: Any):
+    """Counts the tokens of an AIMessage, if the model reported usage."""
+    usage: Dict[str, int] = getattr(message, "usage_metadata", None) or {}
+    for kind in ("input_tokens", "output_tokens"):
+        if usage.get(kind):
+            LLM_TOKENS.labels(node=node, type=kind.split("_")[0]).inc(usage[kind])
+
+
+def render() -> Tuple[bytes, str]:
+    """Body and content type of the /metrics endpoint."""
+    if not PROMETHEUS_AVAILABLE:
+        return b"# prometheus_client is not installed\n", "text/plain; charset=utf-8"
+    return prometheus_client.generate_latest(), prometheus_client.CONTENT_TYPE_LATEST
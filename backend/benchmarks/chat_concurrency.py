@@ -0,0 +1,89 @@
+"""
+Concurrency benchmark for POST /api/chat.
+
+Runs the real FastAPI app and LangGraph agent in-process with the Gemini
+client and the tool search replaced by stubs that simulate network
+latency with asyncio.sleep. If the endpoint is non-blocking, requests per
+second grow with the number of concurrent clients; a blocking endpoint
+stays flat at roughly 1 / latency.
+
+Usage (from backend/):
+    python -m benchmarks.chat_concurrency --latency 0.2 --requests 64
+"""
+import argparse
+import asyncio
+import os
+import sys
+import tempfile
+import time
+
+# Offline configuration, must be set before the app is imported
+os.environ.setdefault("DATABASE_URL", "sqlite:///" + os.path.join(
+    tempfile.gettempdir(), "agent_bench.db"))
+os.environ.setdefault("GOOGLE_API_KEY", "benchmark-key")
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import httpx  # noqa: E402
+from langchain_core.messages import AIMessage  # noqa: E402
+
+from app.core import agent  # noqa: E402
+from app.core.database import create_db_and_tables  # noqa: E402
+from app.main import app  # noqa: E402
+
+
+def install_stubs(latency: float):
+    """Replaces the remote calls of the agent with sleeping stubs."""
+
+    class SleepingLLM:
+        def bind_tools(self, tools):
+            return self
+
+        async def ainvoke(self, messages):
+            await asyncio.sleep(latency)
+            return AIMessage(content="ok")
+
+    async def fake_search(query, k=5):
+        await asyncio.sleep(latency / 4)
+        return []
+
+    agent.set_llm(SleepingLLM())
+    agent.registry.asearch_tools = fake_search
+
+
+async def run_level(client: httpx.AsyncClient, concurrency: int, total: int) -> float:
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def one(i: int):
+        async with semaphore:
+            resp = await client.post(
+                "/api/chat", json={"message": f"hello {i}", "thread_id": f"bench-{i}"})
+            resp.raise_for_status()
+
+    start = time.perf_counter()
+    await asyncio.gather(*(one(i) for i in range(total)))
+    return total / (time.perf_counter() - start)
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--latency", type=float, default=0.2,
+                        help="simulated LLM latency in seconds")
+    parser.add_argument("--requests", type=int, default=64,
+                        help="requests per concurrency level")
+    parser.add_argument("--levels", default="1,2,4,8,16,32")
+    args = parser.parse_args()
+
+    install_stubs(args.latency)
+    create_db_and_tables()
+
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+        print(f"{'clients':>8} {'req/s':>10}")
+        for level in [int(x) for x in args.levels.split(",")]:
+            rps = await run_level(client, level, args.requests)
+            print(f"{level:>8} {rps:>10.2f}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,258 @@
+"""
+Offline end-to-end benchmark of integration ingestion and chat.
+
+Everything runs on one machine:
+  - a stub API (stdlib HTTP server in a thread) serving synthetic OpenAPI
+    specs of configurable size and canned JSON responses for every operation
+  - a deterministic fake chat model that calls the first retrieved tool with
+    placeholder arguments, then answers with the tool result
+  - the local 'hashing' embedding backend instead of Google embeddings
+
+It drives POST /api/integrations (waiting for the ingestion jobs) and
+POST /api/chat at the given concurrency through the real FastAPI app and
+reports p50/p95/p99 latency, throughput and process RSS per stage.
+
+Usage (from backend/):
+    python -m benchmarks.e2e --integrations 3 --operations 500 --requests 200 --concurrency 16
+"""
+import argparse
+import asyncio
+import json
+import os
+import re
+import shutil
+import statistics
+import sys
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Offline configuration, must be set before the app is imported
+WORK_DIR = tempfile.mkdtemp(prefix="agent_e2e_")
+os.environ["DATABASE_URL"] = "sqlite:///" + os.path.join(WORK_DIR, "agent.db")
+os.environ["EMBEDDING_BACKEND"] = "hashing"
+os.environ["CHROMA_PERSIST_DIR"] = os.path.join(WORK_DIR, "chroma_db")
+os.environ["SPEC_CACHE_DIR"] = os.path.join(WORK_DIR, "spec_cache")
+os.environ.setdefault("GOOGLE_API_KEY", "benchmark-key")
+# every chat turn should reach the (scripted) LLM; the prompts only differ in
+# tokens the plan cache treats as slots
+os.environ["PLAN_CACHE_ENABLED"] = "false"
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import httpx  # noqa: E402
+from langchain_core.messages import AIMessage, ToolMessage  # noqa: E402
+
+from app.core import agent  # noqa: E402
+from app.core.database import create_db_and_tables  # noqa: E402
+from app.main import app  # noqa: E402
+
+
+def make_spec(index: int, operations: int, base_url: str) -> dict:
+    """Synthetic spec: 'operations' GET/POST pairs over numbered resources."""
+    paths = {}
+    for i in range(operations // 2):
+        resource = f"resource{i}"
+        paths[f"/{resource}/{{id}}"] = {
+            "get": {
+                "operationId": f"get{resource.title()}Api{index}",
+                "summary": f"Retrieve a {resource} by id",
+                "parameters": [{"name": "id", "in": "path", "required": True,
+                                "schema": {"type": "integer"}}],
+                "responses": {"200": {"description": "OK", "content": {"application/json": {
+                    "schema": {"$ref": "#/components/schemas/Item"}}}}},
+            },
+            "post": {
+                "operationId": f"update{resource.title()}Api{index}",
+                "summary": f"Update a {resource}",
+                "parameters": [{"name": "id", "in": "path", "required": True,
+                                "schema": {"type": "integer"}}],
+                "requestBody": {"content": {"application/json": {
+                    "schema": {"$ref": "#/components/schemas/Item"}}}},
+                "responses": {"200": {"description": "OK"}},
+            },
+        }
+    return {
+        "openapi": "3.0.0",
+        "info": {"title": f"Stub API {index}", "version": "1.0"},
+        "servers": [{"url": f"{base_url}/api{index}"}],
+        "paths": paths,
+        "components": {"schemas": {"Item": {"type": "object", "required": ["id"], "properties": {
+            "id": {"type": "integer"}, "name": {"type": "string"}, "status": {"type": "string"}}}}},
+    }
+
+
+def start_stub_api(operations: int, latency: float) -> ThreadingHTTPServer:
+    """Serves /specs/<n>.json and canned responses for every other path."""
+    specs = {}
+
+    class Handler(BaseHTTPRequestHandler):
+        def log_message(self, *args):
+            pass
+
+        def _send(self, payload):
+            body = json.dumps(payload).encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_GET(self):
+            match = re.fullmatch(r"/specs/(\d+)\.json", self.path)
+            if match:
+                index = int(match.group(1))
+                if index not in specs:
+                    base_url = f"http://127.0.0.1:{self.server.server_port}"
+                    specs[index] = make_spec(index, operations, base_url)
+                return self._send(specs[index])
+            time.sleep(latency)
+            self._send({"id": 1, "name": "stub item", "status": "available", "path": self.path})
+
+        def do_POST(self):
+            length = int(self.headers.get("Content-Length") or 0)
+            self.rfile.read(length)
+            time.sleep(latency)
+            self._send({"id": 1, "updated": True})
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+class ScriptedLLM:
+    """
+    Deterministic stand-in for the chat model: on a user turn it calls the
+    first bound tool with placeholder arguments, after a tool result it
+    answers with that result.
+    """
+
+    def __init__(self, latency: float, tools=None):
+        self.latency = latency
+        self.tools = [t for t in (tools or []) if t.name != "get_stored_result"]
+
+    def bind_tools(self, tools):
+        return ScriptedLLM(self.latency, tools)
+
+    async def ainvoke(self, messages, *args, **kwargs):
+        await asyncio.sleep(self.latency)
+        last = messages[-1]
+        if isinstance(last, ToolMessage) or not self.tools:
+            return AIMessage(content=f"Done: {str(last.content)[:200]}")
+
+        tool = self.tools[0]
+        schema = tool.args_schema.model_json_schema() if tool.args_schema else {}
+        args = {}
+        for name in schema.get("required", []):
+            prop = schema.get("properties", {}).get(name, {})
+            types = [prop.get("type")] + [p.get("type") for p in prop.get("anyOf", [])]
+            args[name] = 1 if "integer" in types or "number" in types else "1"
+
+        return AIMessage(content="", tool_calls=[{
+            "name": tool.name, "args": args, "id": f"call_{time.monotonic_ns()}"}])
+
+
+def rss_mb() -> float:
+    """Resident set size of this process (Linux)."""
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return float("nan")
+
+
+def percentiles(samples):
+    if len(samples) < 2:
+        value = samples[0] if samples else float("nan")
+        return value, value, value
+    cuts = statistics.quantiles(samples, n=100, method="inclusive")
+    return cuts[49], cuts[94], cuts[98]
+
+
+def report(stage: str, latencies, elapsed: float):
+    p50, p95, p99 = percentiles([x * 1000 for x in latencies])
+    throughput = len(latencies) / elapsed if elapsed else float("nan")
+    print(f"{stage:<12} {len(latencies):>6} {p50:>10.1f} {p95:>10.1f} {p99:>10.1f} "
+          f"{throughput:>10.2f} {rss_mb():>10.1f}")
+
+
+async def ingest(client: httpx.AsyncClient, spec_base: str, index: int) -> float:
+    start = time.perf_counter()
+    resp = await client.post("/api/integrations", json={
+        "name": f"Stub {index}", "spec_url": f"{spec_base}/specs/{index}.json", "api_key": "stub-key"})
+    resp.raise_for_status()
+    job_id = resp.json()["job_id"]
+
+    while True:
+        job = (await client.get(f"/api/integrations/jobs/{job_id}")).json()
+        if job["status"] == "failed":
+            raise RuntimeError(f"Ingestion of stub {index} failed: {job['error']}")
+        if job["status"] == "completed":
+            return time.perf_counter() - start
+        await asyncio.sleep(0.05)
+
+
+async def chat(client: httpx.AsyncClient, total: int, concurrency: int, integrations: int, operations: int):
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies = []
+
+    async def one(i: int):
+        resource = i % max(operations // 2, 1)
+        message = f"Retrieve resource{resource} with id 1 from api{i % integrations}"
+        async with semaphore:
+            start = time.perf_counter()
+            resp = await client.post(
+                "/api/chat", json={"message": message, "thread_id": f"e2e-{i}"})
+            resp.raise_for_status()
+            latencies.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(one(i) for i in range(total)))
+    return latencies, time.perf_counter() - start
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--integrations", type=int, default=3)
+    parser.add_argument("--operations", type=int, default=500,
+                        help="operations per synthetic spec")
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--llm-latency", type=float, default=0.05,
+                        help="simulated LLM latency per call in seconds")
+    parser.add_argument("--api-latency", type=float, default=0.01,
+                        help="simulated upstream API latency in seconds")
+    args = parser.parse_args()
+
+    server = start_stub_api(args.operations, args.api_latency)
+    spec_base = f"http://127.0.0.1:{server.server_port}"
+    agent.set_llm(ScriptedLLM(args.llm_latency))
+    create_db_and_tables()
+
+    print(f"{'stage':<12} {'count':>6} {'p50 ms':>10} {'p95 ms':>10} {'p99 ms':>10} "
+          f"{'per s':>10} {'RSS MB':>10}")
+    report("startup", [], 0)
+
+    transport = httpx.ASGITransport(app=app)
+    try:
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+            start = time.perf_counter()
+            ingest_latencies = await asyncio.gather(
+                *(ingest(client, spec_base, i) for i in range(args.integrations)))
+            report("ingestion", list(ingest_latencies), time.perf_counter() - start)
+
+            latencies, elapsed = await chat(
+                client, args.requests, args.concurrency, args.integrations, args.operations)
+            report("chat", latencies, elapsed)
+    finally:
+        server.shutdown()
+        shutil.rmtree(WORK_DIR, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,148 @@
+"""
+Benchmark of spec loading for large OpenAPI documents.
+
+Public specs (Stripe, GitHub) can't be downloaded in every environment, so
+the fixtures are synthetic specs of the same order of size: many paths,
+shared components referenced through $ref chains, JSON and YAML variants.
+
+Timed per fixture:
+  - yaml.SafeLoader (what the bridge used to do) vs CSafeLoader vs json
+  - cold compile (parse + $ref resolution + operation compilation)
+  - warm load from the on-disk compiled IR
+
+Usage (from backend/):
+    python -m benchmarks.spec_parsing --paths 1500 --schemas 600
+"""
+import argparse
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import yaml  # noqa: E402
+
+from app.services import spec_loader  # noqa: E402
+
+
+def make_spec(paths: int, schemas: int) -> dict:
+    components = {}
+    for i in range(schemas):
+        properties = {
+            "id": {"type": "string"},
+            "created": {"type": "integer"},
+            "livemode": {"type": "boolean"},
+            "metadata": {"type": "object", "additionalProperties": {"type": "string"}},
+        }
+        for j in range(12):
+            properties[f"field_{j}"] = {"type": "string", "description": f"Field {j} of schema {i}"}
+        if i > 0:
+            # nested references, like expandable objects in Stripe's spec
+            properties["parent"] = {"$ref": f"#/components/schemas/Schema{i - 1}"}
+            properties["related"] = {"type": "array", "items": {
+                "$ref": f"#/components/schemas/Schema{(i * 7) % i}"}}
+        components[f"Schema{i}"] = {"type": "object", "required": ["id"], "properties": properties}
+
+    components["List"] = {
+        "type": "object",
+        "properties": {
+            "data": {"type": "array", "items": {"$ref": "#/components/schemas/Schema0"}},
+            "has_more": {"type": "boolean"},
+        },
+    }
+
+    spec_paths = {}
+    for i in range(paths):
+        schema_ref = {"$ref": f"#/components/schemas/Schema{i % schemas}"}
+        spec_paths[f"/v1/resource{i}/{{id}}"] = {
+            "parameters": [{"$ref": "#/components/parameters/Id"}],
+            "get": {
+                "operationId": f"GetResource{i}",
+                "summary": f"Retrieve resource {i}",
+                "parameters": [{"$ref": "#/components/parameters/Expand"}],
+                "responses": {"200": {"description": "OK", "content": {
+                    "application/json": {"schema": schema_ref}}}},
+            },
+            "post": {
+                "operationId": f"UpdateResource{i}",
+                "summary": f"Update resource {i}",
+                "requestBody": {"content": {"application/json": {"schema": schema_ref}}},
+                "responses": {"200": {"$ref": "#/components/responses/Ok"}},
+            },
+        }
+
+    return {
+        "openapi": "3.0.0",
+        "info": {"title": "Synthetic", "version": "1.0"},
+        "servers": [{"url": "https://api.example.com"}],
+        "paths": spec_paths,
+        "components": {
+            "schemas": components,
+            "parameters": {
+                "Id": {"name": "id", "in": "path", "required": True, "schema": {"type": "string"}},
+                "Expand": {"name": "expand", "in": "query", "schema": {"type": "array", "items": {"type": "string"}}},
+            },
+            "responses": {"Ok": {"description": "OK", "content": {
+                "application/json": {"schema": {"$ref": "#/components/schemas/List"}}}}},
+        },
+    }
+
+
+def timed(fn, repeat: int = 1):
+    best = None
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best * 1000, result
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--paths", type=int, default=1500)
+    parser.add_argument("--schemas", type=int, default=600)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    spec = make_spec(args.paths, args.schemas)
+    fixtures = {
+        "json": json.dumps(spec),
+        "yaml": yaml.dump(spec, Dumper=getattr(yaml, "CSafeDumper", yaml.SafeDumper), sort_keys=False),
+    }
+
+    ir_dir = tempfile.mkdtemp(prefix="spec_ir_")
+    spec_loader.SPEC_IR_DIR = ir_dir
+    # keep everything in-process so the timings compare like with like
+    spec_loader.SPEC_PROCESS_POOL_MIN_BYTES = float("inf")
+
+    print(f"libyaml available: {spec_loader.LIBYAML_AVAILABLE}")
+    try:
+        for name, text in fixtures.items():
+            print(f"\n{name}: {len(text) / 1024 / 1024:.1f} MB, {args.paths * 2} operations")
+
+            if name == "yaml":
+                ms, _ = timed(lambda: yaml.load(text, Loader=yaml.SafeLoader), 1)
+                print(f"  yaml.SafeLoader parse      {ms:10.1f} ms")
+                if spec_loader.LIBYAML_AVAILABLE:
+                    ms, _ = timed(lambda: yaml.load(text, Loader=yaml.CSafeLoader), args.repeat)
+                    print(f"  yaml.CSafeLoader parse     {ms:10.1f} ms")
+            else:
+                ms, _ = timed(lambda: json.loads(text), args.repeat)
+                print(f"  json.loads parse           {ms:10.1f} ms")
+
+            ms, compiled = timed(lambda: spec_loader.load_compiled_spec(text), 1)
+            print(f"  cold compile (parse+$ref)  {ms:10.1f} ms  ({len(compiled['operations'])} operations)")
+
+            ms, _ = timed(lambda: spec_loader.load_compiled_spec(text), args.repeat)
+            print(f"  warm load (compiled IR)    {ms:10.1f} ms")
+    finally:
+        shutil.rmtree(ir_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
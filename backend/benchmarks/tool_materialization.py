@@ -0,0 +1,89 @@
+"""
+Memory and time per operation when ingesting a large spec.
+
+"before": every operation is built eagerly (pydantic args model, handler
+closure, StructuredTool) and registered on FastMCP, what register_tools
+used to do. "after": only OperationRecords are created from the compiled
+spec, which is then dropped, so the figure is what the records keep
+alive; tools are built on first use, measured here for the k=5 tools
+retrieval offers per turn (reading the operations back from the IR file).
+The spec is a synthetic one (see benchmarks/spec_parsing.py), nothing is
+embedded or sent over the network.
+
+Usage (from backend/):
+    python -m benchmarks.tool_materialization --paths 2500
+"""
+import argparse
+import gc
+import json
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+# compiled specs go to a scratch directory, not the app's spec cache
+os.environ.setdefault("SPEC_IR_DIR", tempfile.mkdtemp(prefix="bench_ir_"))
+
+from mcp.server.fastmcp import FastMCP  # noqa: E402
+
+from app.services import spec_loader  # noqa: E402
+from app.services.mcp_bridge import OpenAPIMCPBridge  # noqa: E402
+from benchmarks.spec_parsing import make_spec  # noqa: E402
+
+
+def measure(label: str, fn, count: int):
+    gc.collect()
+    tracemalloc.start()
+    start = time.perf_counter()
+    kept = fn()
+    elapsed = time.perf_counter() - start
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    print(f"{label:<28} {elapsed * 1000:10.1f} ms  {current / 1024 / 1024:8.1f} MB"
+          f"  {current / max(count, 1) / 1024:8.2f} KB/op  (peak {peak / 1024 / 1024:.1f} MB)")
+    return kept
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--paths", type=int, default=2500)
+    parser.add_argument("--schemas", type=int, default=300)
+    parser.add_argument("--k", type=int, default=5)
+    args = parser.parse_args()
+
+    text = json.dumps(make_spec(args.paths, args.schemas))
+    # compiled once up front, the runs below read the IR file
+    compiled = spec_loader.load_compiled_spec(text)
+    operations = compiled["operations"]
+    base_url = compiled["base_url"]
+    count = len(operations)
+    print(f"{count} operations\n")
+
+    def eager():
+        bridge = OpenAPIMCPBridge("Bench", "http://localhost/spec.json", "bench")
+        # the bridge only creates its FastMCP server in start(), which also runs it
+        mcp = FastMCP("Bench")
+        tools = []
+        for op in operations:
+            tool = bridge._build_tool(op, base_url)
+            mcp.tool(name=tool.name, description=tool.description)(tool.coroutine)
+            tools.append(tool)
+        return bridge, mcp, tools
+
+    def lazy():
+        bridge = OpenAPIMCPBridge("Bench", "http://localhost/spec.json", "bench")
+        return bridge.load_compiled(spec_loader.load_compiled_spec(text))
+
+    before = measure("before (eager tools)", eager, count)
+    del before, eager, compiled, operations
+
+    records = measure("after (operation records)", lazy, count)
+    measure(f"after + materialize k={args.k}",
+            lambda: [r.factory() for r in records[:args.k]], args.k)
+
+
+if __name__ == "__main__":
+    main()
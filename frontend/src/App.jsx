@@ -1,6 +1,6 @@
 import React, { useState } from 'react';
 import { Send, Plus, Server, Bot, User, Terminal } from 'lucide-react';
-import { addIntegration, sendMessage } from './api';
+import { addIntegration, sendMessage, getThreadId } from './api';
 
 function App()
 {
@@ -47,7 +47,7 @@ function App()
     try
     {
       // call API
-      const data = await sendMessage(userMsg.content);
+      const data = await sendMessage(userMsg.content, getThreadId());
 
       // add Assistant Response
       const botMsg = {
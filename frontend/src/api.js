@@ -15,10 +15,42 @@ export const addIntegration = async (name, specUrl, apiKey) =>
         spec_url: specUrl,
         api_key: apiKey || null,
     });
-    return response.data;
+    return waitForIngestion(response.data.job_id);
+};
+
+// Ingestion runs as a background job, poll until it is finished
+const waitForIngestion = async (jobId, intervalMs = 1000) =>
+{
+    for (;;)
+    {
+        const { data: job } = await api.get(`/integrations/jobs/${jobId}`);
+        if (job.status === 'completed')
+        {
+            return { ...job, tools_count: job.operations_parsed };
+        }
+        if (job.status === 'failed')
+        {
+            const error = new Error(job.error || 'Ingestion failed');
+            error.response = { data: { detail: job.error } };
+            throw error;
+        }
+        await new Promise((resolve) => setTimeout(resolve, intervalMs));
+    }
+};
+
+// One conversation per browser tab, so sessions never share a thread
+export const getThreadId = () =>
+{
+    let threadId = sessionStorage.getItem('threadId');
+    if (!threadId)
+    {
+        threadId = crypto.randomUUID();
+        sessionStorage.setItem('threadId', threadId);
+    }
+    return threadId;
 };
 
-export const sendMessage = async (message, threadId = "default") =>
+export const sendMessage = async (message, threadId = getThreadId()) =>
 {
     const response = await api.post('/chat', {
         message,